@@ -181,6 +181,151 @@ def boundary2d_irreg(bound_loc, xi, yi):
 
   return bound_loc 
 
+def boundary2d_sides(bound_loc):
+  """
+  Identify the sides of each grid block that are reservoir boundaries,
+  from the boundary codes (the digits of the code are the boundary sides)
+
+  Input:
+
+  bound_loc = the boundary location codes as passed by 'boundary2d_location' 
+              or 'boundary2d_irreg' (NaN for INACTIVE BLOCKS)
+
+  Output:
+
+  sides = True if side 1 (west), 2 (east), 3 (south), 4 (north) of the block 
+          is a boundary (3D array, xi x yi x 4)
+  """
+  import numpy as np
+
+  code = np.where(bound_loc == bound_loc, bound_loc, 0).astype(int)
+  digits = np.stack([code % 10, (code // 10) % 10, code // 100], axis=-1)
+
+  sides = np.stack([np.any(digits == side, axis=-1) for side in [1, 2, 3, 4]], axis=-1)
+  return sides
+
+def boundary2d_grid(bound_loc, west_boundary, east_boundary, south_boundary, north_boundary):
+  """
+  Set up the TYPE and VALUE of boundary at each side of each grid block,
+  for the whole grid at once
+
+  Input:
+
+  bound_loc = the boundary location codes (2D array)
+  west_boundary, east_boundary, south_boundary, north_boundary = 
+  boundary dictionaries as passed by 'read_input'. LOC is either 'all' or the 
+  coordinates of the boundary blocks
+
+  Output:
+
+  boundary_grid = boundary information of the whole grid (as Python dictionary format)
+  contains:
+  * type (boundary type at side 1, 2, 3, 4 of each block, '' if the side is 
+    not a boundary. 3D array, xi x yi x 4)
+  * value (boundary value at side 1, 2, 3, 4 of each block, 0 if the side is
+    not a boundary. 3D array, xi x yi x 4)
+  """
+  import numpy as np
+
+  xi, yi = bound_loc.shape
+  sides = boundary2d_sides(bound_loc)
+
+  bound_type = np.full((xi, yi, 4), '', dtype=object)
+  bound_value = np.zeros((xi, yi, 4))
+
+  boundaries = [west_boundary, east_boundary, south_boundary, north_boundary]
+
+  for k in range(4):
+    bound_dict = boundaries[k]
+
+    if np.all(bound_dict['loc'] == 'all'):
+      # all boundary blocks in this side have the same boundary
+      bound_type[:,:,k][sides[:,:,k]] = str(bound_dict['type'])
+      bound_value[:,:,k][sides[:,:,k]] = bound_dict['value']
+    else:
+      # boundary of the specified block coordinates
+      loc = np.array(bound_dict['loc']).astype(int).reshape(-1, 2)
+      xsc, ysc = loc[:,0] - 1, loc[:,1] - 1
+      bound_type[xsc,ysc,k] = np.array(bound_dict['type']).astype(str)
+      bound_value[xsc,ysc,k] = bound_dict['value']
+
+      # the specified blocks must be located at this side
+      bound_type[:,:,k][~sides[:,:,k]] = ''
+      bound_value[:,:,k][~sides[:,:,k]] = 0
+
+  boundary_grid = {'type': bound_type, 'value': bound_value}
+  return boundary_grid
+
+def boundary3d_grid(shape, west_boundary, east_boundary, south_boundary, north_boundary,
+                    top_boundary=None, bottom_boundary=None):
+  """
+  Set up the TYPE and VALUE of boundary at each side of each grid block,
+  for the whole grid at once
+  3D reservoir (regular, layers from top to bottom)
+
+  The sides of each block are 1 (west), 2 (east), 3 (south), 4 (north), 
+  5 (top), and 6 (bottom)
+
+  Input:
+
+  shape = number of blocks in x, y, and z (xi, yi, zi)
+  west_boundary, east_boundary, south_boundary, north_boundary = 
+  boundary dictionaries as passed by 'read_input'. LOC is either 'all' or the 
+  coordinates of the boundary blocks, (x, y) for all layers or (x, y, z)
+  top_boundary, bottom_boundary = boundary dictionaries of the top and bottom
+  of the reservoir, LOC is 'all' or the (x, y) coordinates. Default is no flow
+
+  Output:
+
+  boundary_grid = boundary information of the whole grid (as Python dictionary format)
+  contains:
+  * type (boundary type at side 1 to 6 of each block, '' if the side is 
+    not a boundary. 4D array, xi x yi x zi x 6)
+  * value (boundary value at side 1 to 6 of each block, 0 if the side is
+    not a boundary. 4D array, xi x yi x zi x 6)
+  """
+  import numpy as np
+
+  xi, yi, zi = shape
+
+  # sides of the blocks at the edge of the grid
+  i, j, l = np.meshgrid(np.arange(xi), np.arange(yi), np.arange(zi), indexing='ij')
+  sides = np.stack([i == 0, i == xi - 1, j == 0, j == yi - 1, l == 0, l == zi - 1], axis=-1)
+
+  bound_type = np.full((xi, yi, zi, 6), '', dtype=object)
+  bound_value = np.zeros((xi, yi, zi, 6))
+
+  no_flow = {'type': 'no_flow', 'value': 0, 'loc': 'all'}
+  boundaries = [west_boundary, east_boundary, south_boundary, north_boundary,
+                top_boundary or no_flow, bottom_boundary or no_flow]
+
+  for k in range(6):
+    bound_dict = boundaries[k]
+
+    if np.all(bound_dict['loc'] == 'all'):
+      # all boundary blocks in this side have the same boundary
+      bound_type[...,k][sides[...,k]] = str(bound_dict['type'])
+      bound_value[...,k][sides[...,k]] = bound_dict['value']
+    else:
+      # boundary of the specified block coordinates, (x, y) for all layers
+      loc = np.array(bound_dict['loc']).astype(int)
+      loc = loc.reshape(-1, loc.shape[-1])
+      xsc, ysc = loc[:,0] - 1, loc[:,1] - 1
+      zsc = loc[:,2] - 1 if loc.shape[1] == 3 else slice(None)
+      btype = np.array(bound_dict['type']).astype(str)
+      bvalue = np.asarray(bound_dict['value'], dtype='float64')
+      if loc.shape[1] == 2:
+        btype, bvalue = np.broadcast_to(btype, len(loc))[:,np.newaxis], np.broadcast_to(bvalue, len(loc))[:,np.newaxis]
+      bound_type[xsc,ysc,zsc,k] = btype
+      bound_value[xsc,ysc,zsc,k] = bvalue
+
+      # the specified blocks must be located at this side
+      bound_type[...,k][~sides[...,k]] = ''
+      bound_value[...,k][~sides[...,k]] = 0
+
+  boundary_grid = {'type': bound_type, 'value': bound_value}
+  return boundary_grid
+
 def boundary_flow2d_constant_pressuregrad(bound_loc, value, potential_term, kx, ky, dx, dy, dz, mu, B):
   
   import numpy as np
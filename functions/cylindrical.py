@@ -36,7 +36,7 @@ def transmissibility2d_boundary_cylindrical(bound_type, bound_loc, dr, dz, Vb, k
   if bound_type=='constant_pressure':
     if bound_loc=='bottom' or bound_loc=='upper':
       # calculate area of grid in r-direction      
-      Az = dv / dz
+      Az = Vb / dz
       # transmissibility      
       T = .001127 * (kz * Az) / (mu * B * 0.5 * dz)
     if bound_loc=='east':
@@ -229,6 +229,18 @@ def trans_r_plus(dz_now, dz_next, dtheta, alpha_tg, kh_now, kh_next, mu, B):
   T_r_plus = G_trans_r_plus / (mu * B)
   return T_r_plus
   
+def trans_well_cylindrical(dz, dtheta, alpha_tg, kh, mu, B, skin=0):
+  """
+  Calculate transmissibility between the WELL (inner boundary at rw) and the 
+  first cylindrical grid block, the half-block part of 'trans_r_min', with skin
+  """
+  import numpy as np
+  # transmissibility geometric factor
+  G_trans_w = (.001127 * dtheta * dz * kh) / (np.log(alpha_tg * np.log(alpha_tg) / (alpha_tg - 1)) + skin)
+  # calculate transmissibility
+  T_w = G_trans_w / (mu * B)
+  return T_w
+
 def horizontal_permeability(kx, ky):
   """
   Calculate horizontal permeability using geometric mean
@@ -66,6 +66,47 @@ def fill_active_blocks(prop_in, x):
   
   return prop_out
 
+def active_cell_map(x):
+  """
+  Create the map of ACTIVE BLOCKS (ACTNUM-style), once from the meshgrid 
+  of 'create_irregular_grid'. The ACTIVE BLOCKS are numbered in compressed 
+  order (0, 1, 2, ...) following 'block_index', skipping the INACTIVE BLOCKS
+
+  Input:
+
+  x = mesh in x-direction, NaN for INACTIVE BLOCKS (2D array)
+
+  Output:
+
+  actnum = 1 for ACTIVE, 0 for INACTIVE BLOCKS (2D array)
+  active_index = index of block in the compressed numbering, -1 for INACTIVE BLOCKS (2D array)
+  block_active = block index (minus 1) of each ACTIVE BLOCK (1D array), to scatter
+                 the solution back to the whole grid (see 'scatter_active_blocks')
+  """
+  import numpy as np
+
+  xi, yi = x.shape
+  actnum = (x == x).astype(int)
+
+  block_active = np.where(actnum.reshape(-1, order='F') == 1)[0]
+
+  active_index = np.full(xi * yi, -1)
+  active_index[block_active] = np.arange(len(block_active))
+  active_index = active_index.reshape((xi, yi), order='F')
+
+  return actnum, active_index, block_active
+
+def scatter_active_blocks(prop_in, block_active, xi, yi):
+  """
+  Set up the property of the whole grid from the property of the ACTIVE BLOCKS
+  (in compressed numbering, see 'active_cell_map'). INACTIVE BLOCKS are NaN
+  """
+  import numpy as np
+
+  prop_out = np.full(xi * yi, np.nan)
+  prop_out[block_active] = prop_in
+  return prop_out.reshape((xi, yi), order='F')
+
 def source1d(q, xsc, xi):
   """
   Create source grid for 1D rectangular reservoir
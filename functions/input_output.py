@@ -5,9 +5,179 @@ Codes for input-output of PyReSim
 @email: ign.nuwara97@gmail.com
 """
 
+# names of the columns of the RESERVOIR INPUT table, and their keys in 'reservoir_input'
+DECK_COLUMNS = {'NX': 'xi', 'NY': 'yi', 'NZ': 'zi', 'DX': 'dx', 'DY': 'dy', 'DZ': 'dz', 
+                'KX': 'kx', 'KY': 'ky', 'KZ': 'kz', 'PORO': 'poro', 'RHO': 'rho', 
+                'CPORE': 'cpore', 'MU': 'mu', 'B': 'B', 'CFLUID': 'cfluid'}
+
+def read_deck(filepath):
+  """
+  Read the keywords of an input file (TXT file, format of 'input/template.txt') 
+  in one pass
+
+  The file is read at once and split into blocks at the blank lines. A dashed 
+  line, a name, and a dashed line are the header of a section (e.g. WELL INPUT, 
+  WEST). Other blocks are a keyword (the first line) and its data (the next lines). 
+  A keyword line of several names with one value each in the data (e.g. NX NY NZ 
+  DX ...) is a table. The data are kept as text, converted with 'deck_values'
+
+  Input:
+
+  filepath = path to the input file (TXT format)
+
+  Output:
+
+  deck = keywords of each section (as Python dictionary format), 
+         {section: {keyword: data}}, where the data of a table are under 'table', 
+         as {name: value}
+  """
+  import re
+
+  with open(filepath) as f:
+    text = f.read()
+
+  deck, section = {'': {}}, ''
+  for block in re.split(r'\n[ \t\r]*\n', text):
+    block = block.strip()
+
+    while block.startswith('-'):
+      # section header, a dashed line, the name, and a dashed line
+      _, _, block = block.partition('\n')
+      name, _, rest = block.partition('\n')
+      if name.startswith('-'):
+        # section without name
+        section, block = '', rest
+      else:
+        section = name.strip()
+        _, _, block = rest.partition('\n')
+      deck.setdefault(section, {})
+      block = block.strip()
+
+    if block == '':
+      continue
+
+    keyword, _, data = block.partition('\n')
+    names = keyword.split()
+    if len(names) > 1 and '\n' not in data and len(data.split()) == len(names):
+      # one row of values
+      deck[section]['table'] = dict(zip(names, data.split()))
+    else:
+      deck[section][' '.join(names)] = data
+
+  return deck
+
+def deck_values(data, dtype=float):
+  """
+  Convert the data of a keyword (from 'read_deck') to an array. The values 
+  are separated by commas, spaces, or new lines
+
+  Input:
+
+  data = data of the keyword (string)
+  dtype = float or str
+
+  Output:
+
+  values = values (1D array, or 0D array if there is one value, as 'np.loadtxt')
+  """
+  import numpy as np
+
+  if dtype is str:
+    values = np.array(data.replace(',', ' ').split())
+  else:
+    # a malformed value raises a ValueError (np.fromstring stops there silently)
+    values = np.array(data.replace(',', ' ').split(), dtype=float)
+
+  if values.size == 1:
+    return values.reshape(())
+  return values
+
+def deck_array(data, shape, dirname='', dtype='float64'):
+  """
+  Convert the data of a property keyword (from 'read_deck') to the array of 
+  each block, x first, then y (and z)
+
+  The data can also be a binary file of the property, as FILE, the file name 
+  (relative to the input file), and the type of the values of a raw file 
+  (default float64), e.g.
+
+  KX
+  FILE kx.npy
+
+  PORO
+  FILE poro.bin float32
+
+  The file is opened with 'np.memmap' (read only), so its values are read from 
+  the disk when they are used, without a copy in memory. A raw file is the 
+  values of the blocks without header, x first (Fortran order); an NPY file 
+  has the shape of the grid, or the blocks in Fortran order (1D)
+
+  Input:
+
+  data = data of the keyword (string)
+  shape = number of blocks, (xi, yi) or (xi, yi, zi)
+  dirname = directory of the input file
+  dtype = type of the values of a raw file, if not given after the file name
+
+  Output:
+
+  values = property of each block (array of the shape of the grid, memory-mapped 
+           if given as a file)
+  """
+  import os
+
+  names = data.split()
+  if len(names) == 0 or names[0] != 'FILE':
+    return deck_values(data).reshape(shape, order='F')
+
+  dtype = names[2] if len(names) > 2 else dtype
+  return memmap_array(os.path.join(dirname, names[1]), shape, dtype)
+
+def memmap_array(path, shape=None, dtype='float64'):
+  """
+  Open a binary file of a property of each block with 'np.memmap' (read only). 
+  An NPY file (shape from its header), or a raw file of the given shape and 
+  type, x first (Fortran order)
+  """
+  import numpy as np
+
+  if path.endswith('.npy'):
+    values = np.load(path, mmap_mode='r')
+    if shape is None:
+      return values
+  else:
+    values = np.memmap(path, dtype=dtype, mode='r', shape=tuple(shape), order='F')
+
+  if values.size != np.prod(shape):
+    raise ValueError('{} has {} values, the grid has {} blocks'.format(path, values.size, 
+                                                                       np.prod(shape)))
+  if values.shape != tuple(shape):
+    # view of the blocks in Fortran order, not a copy
+    values = values.reshape(shape, order='F')
+  return values
+
+def deck_files(filepath):
+  """
+  Paths of the binary files of the properties given as FILE in an input file 
+  (see 'deck_array'), e.g. to hash the model with its files
+  """
+  import os
+
+  dirname = os.path.dirname(filepath)
+  files = []
+  for keywords in read_deck(filepath).values():
+    for keyword, data in keywords.items():
+      names = data.split() if isinstance(data, str) else []
+      if len(names) > 1 and names[0] == 'FILE':
+        files.append(os.path.join(dirname, names[1]))
+  return files
+
 def read_input(filepath):
   """
-  Read input data (TXT file)
+  Read input data (TXT file, format of 'input/template.txt')
+
+  The file is read once with 'read_deck', and the keywords are looked up by 
+  name, so the blocks of the file can move (e.g. lines added)
 
   Input:
 
@@ -18,6 +188,14 @@ def read_input(filepath):
   reservoir_input = reservoir data input (as Python dictionary format)
   contains:
   xi, yi, dx, dy, dz, kx, ky, kz, poro, rho, cpore, mu, B
+  (zi and kz only for 3D reservoir, where dz is the thickness of each layer)
+  A property can also be given for each block, as a keyword after the table of 
+  RESERVOIR INPUT (e.g. KX, then xi x yi values, x first, then y), which replaces 
+  the value of the table with an array (1D, 2D, or 3D, as the grid). For large 
+  grids, the keyword can refer to a binary file (raw or NPY), which is memory-mapped 
+  (see 'deck_array'). ACTNUM (1 for active, 0 for inactive blocks) and DEPTH (ft) 
+  can be given in the same way, as 'actnum' and 'depth' of the reservoir input 
+  (2D reservoir)
 
   west_boundary, east_boundary, south_boundary, north_boundary = 
   reservoir boundary information (as Python dictionary format)
@@ -37,34 +215,50 @@ def read_input(filepath):
   * value (value of the operating conditions: 'constant_fbhp' in psi, 'constant_pressuregrad' in psi/ft, 'constant_rate' in STB/D)
 
   """
+  import os
   import numpy as np
 
-  # reservoir input
-  prop = np.loadtxt(filepath, max_rows=1, skiprows=12)
-  xi, yi, zi = (prop[0]).astype(int), (prop[1]).astype(int), (prop[2]).astype(int)
-  dx, dy, dz = prop[3], prop[4], prop[5]
-  kx, ky, kz, poro, rho = prop[6], prop[7], prop[8], prop[9], prop[10]
-  cpore, mu, B, cfluid = prop[11], prop[12], prop[13], prop[14]
+  deck = read_deck(filepath)
+  dirname = os.path.dirname(filepath)
+
+  # reservoir input, the table with NX (and the property keywords of its section)
+  section = [name for name in deck if 'NX' in deck[name].get('table', {})][0]
+  table = deck[section]['table']
+  prop = {key: np.float64(table[name]) for name, key in DECK_COLUMNS.items()}
+  xi, yi, zi = [prop[key].astype(int) for key in ('xi', 'yi', 'zi')]
+  prop['xi'], prop['yi'], prop['zi'] = xi, yi, zi
+
+  shape = tuple(n for n in (xi, yi, zi) if n != 0)
+  for name, key in DECK_COLUMNS.items():
+    if name in deck[section] and key not in ('xi', 'yi', 'zi'):
+      # property of each block
+      prop[key] = deck_array(deck[section][name], shape, dirname)
+
+  # well input
+  well_input = deck['WELL INPUT']
+  well_name = deck_values(well_input['WELLNAME'], dtype=str)
+  well_xsc = deck_values(well_input['BLOCK COORD X'])
+  well_ysc = deck_values(well_input['BLOCK COORD Y'])
+  well_rw = deck_values(well_input['RADIUS'])
+  well_skin = deck_values(well_input['SKIN'])
+  well_condition = deck_values(well_input['COND'], dtype=str)
+  well_value = deck_values(well_input['VALUE'])
+  well_config = deck_values(well_input['CONFIG'])
+
+  def boundary(side, loc=True):
+    # reservoir boundary of a side
+    bound = {'type': deck_values(deck[side]['TYPE'], dtype=str),
+             'value': deck_values(deck[side]['VALUE'])}
+    if loc:
+      bound['loc'] = deck_values(deck[side]['LOC'], dtype=str)
+    return bound
 
   if yi==0 and zi==0:
     # reservoir is 1D
 
     ## create reservoir input dictionary
-    reservoir_input = {'xi': xi, 'dx': dx, 'dy': dy, 'dz': dz, 'kx': kx, 
-                       'poro': poro, 'rho': rho, 'cpore': cpore, 
-                       'mu': mu, 'B': B, 'cfluid': cfluid}
-
-    # well input
-    skiprow_wells = np.array([22,25,28,31,37,40])
-    wells = []
-    for i in range(len(skiprow_wells)):
-      well = np.loadtxt(filepath, max_rows=1, skiprows=skiprow_wells[i], delimiter=',')
-      wells.append(well)
-
-    well_xsc, well_rw, well_skin, well_value, well_config = wells[0], wells[2], wells[3], wells[4], wells[5]
-    
-    well_name = np.loadtxt(filepath, max_rows=1, skiprows=19, delimiter=',', dtype=np.str) 
-    well_condition = np.loadtxt(filepath, max_rows=1, skiprows=34, delimiter=',', dtype=np.str)
+    reservoir_input = {key: prop[key] for key in ('xi', 'dx', 'dy', 'dz', 'kx', 'poro', 
+                                                  'rho', 'cpore', 'mu', 'B', 'cfluid')}
 
     well_loc = well_xsc.tolist()
 
@@ -77,56 +271,30 @@ def read_input(filepath):
             'well_value': well_value,
             'well_config': well_config}
 
-    # reservoir boundary
-    skiprow_type = np.array([54, 67])
-    skiprow_value = np.array([57, 70])
-
-    btype = []; bvalue = []
-    for i in range(len(skiprow_type)):
-      type = np.loadtxt(filepath, max_rows=1, skiprows=skiprow_type[i], dtype=np.str)
-      value = np.loadtxt(filepath, max_rows=1, skiprows=skiprow_value[i])
-      # loc = np.loadtxt(filepath, max_rows=1, skiprows=skiprow_loc[i], dtype=np.str)
-      btype.append(type); bvalue.append(value)
-
-    west_type, east_type = btype[0], btype[1]
-    west_value, east_value = bvalue[0], bvalue[1]
-
     ## create reservoir boundary information
-
-    east_boundary = {"type": east_type,
-                      "value": east_value}
-
-    west_boundary = {"type": west_type,
-                      "value": west_value} 
+    west_boundary, east_boundary = boundary('WEST', loc=False), boundary('EAST', loc=False)
 
     return reservoir_input, well, west_boundary, east_boundary 
 
-  if yi!=0 and zi==0:
-    # reservoir is 2D
+  if yi!=0:
+    # reservoir is 2D, or 3D (zi layers, the wells are completed in all layers)
 
     ## create reservoir input dictionary
-    reservoir_input = {'xi': xi, 'yi': yi, 'dx': dx, 'dy': dy, 'dz': dz, 'kx': kx, 
-                        'ky': ky, 'poro': poro, 'rho': rho, 'cpore': cpore, 
-                        'mu': mu, 'B': B, 'cfluid': cfluid}
-
-    # well input
-    skiprow_wells = np.array([22,25,28,31,37,40])
-    wells = []
-    for i in range(len(skiprow_wells)):
-      well = np.loadtxt(filepath, max_rows=1, skiprows=skiprow_wells[i], delimiter=',')
-      wells.append(well)
-
-    well_xsc, well_ysc, well_rw, well_skin, well_value, well_config = wells[0], wells[1], wells[2], wells[3], wells[4], wells[5]
-    well_name = np.loadtxt(filepath, max_rows=1, skiprows=19, delimiter=',', dtype=np.str) 
-    well_condition = np.loadtxt(filepath, max_rows=1, skiprows=34, delimiter=',', dtype=np.str)
+    reservoir_input = {key: prop[key] for key in ('xi', 'yi', 'dx', 'dy', 'dz', 'kx', 'ky', 
+                                                  'poro', 'rho', 'cpore', 'mu', 'B', 'cfluid')}
+
+    if zi!=0:
+      reservoir_input['zi'], reservoir_input['kz'] = zi, prop['kz']
+    else:
+      # map of active blocks and depth of each block
+      if 'ACTNUM' in deck[section]:
+        reservoir_input['actnum'] = deck_array(deck[section]['ACTNUM'], shape, dirname, 'int8')
+      if 'DEPTH' in deck[section]:
+        reservoir_input['depth'] = deck_array(deck[section]['DEPTH'], shape, dirname)
 
     ## merge the xsc and ysc well coordinates into one coordinate
-    well_loc = np.zeros((len(well_xsc),2))
-    for i in range(len(well_xsc)):
-      well_loc[i] = [well_xsc[i], well_ysc[i]]
-
-    well_loc = well_loc.astype(int)
-    well_loc = well_loc.tolist()
+    well_loc = np.stack([np.atleast_1d(well_xsc), np.atleast_1d(well_ysc)], axis=-1)
+    well_loc = well_loc.astype(int).tolist()
 
     ## create well information dictionary
     well = {'well_name': well_name,
@@ -137,39 +305,9 @@ def read_input(filepath):
             'well_value': well_value,
             'well_config': well_config}
 
-    # reservoir boundary
-    skiprow_type = np.array([54, 67, 80, 93])
-    skiprow_value = np.array([57, 70, 83, 96])
-    skiprow_loc = np.array([51, 64, 77, 90])
-
-    btype = []; bvalue = []; bloc = []
-    for i in range(len(skiprow_type)):
-      type = np.loadtxt(filepath, max_rows=1, skiprows=skiprow_type[i], dtype=np.str)
-      value = np.loadtxt(filepath, max_rows=1, skiprows=skiprow_value[i])
-      loc = np.loadtxt(filepath, max_rows=1, skiprows=skiprow_loc[i], dtype=np.str)      
-      btype.append(type); bvalue.append(value); bloc.append(loc)
-
-    west_type, east_type, south_type, north_type = btype[0], btype[1], btype[2], btype[3]
-    west_value, east_value, south_value, north_value = bvalue[0], bvalue[1], bvalue[2], bvalue[3]
-    west_loc, east_loc, south_loc, north_loc = bloc[0], bloc[1], bloc[2], bloc[3]
-
     ## create reservoir boundary information
-
-    east_boundary = {"type": east_type,
-                      "value": east_value,
-                      "loc": east_loc}
-
-    west_boundary = {"type": west_type,
-                      "value": west_value,
-                      "loc": west_loc}
-
-    north_boundary = {"type": north_type,
-                      "value": north_value,
-                      "loc": north_loc}
-
-    south_boundary = {"type": south_type,
-                      "value": south_value,
-                      "loc": south_loc}   
+    west_boundary, east_boundary = boundary('WEST'), boundary('EAST')
+    south_boundary, north_boundary = boundary('SOUTH'), boundary('NORTH')
 
     return reservoir_input, well, west_boundary, east_boundary, south_boundary, north_boundary 
 
@@ -188,11 +326,23 @@ def read_input(filepath):
 #     # reservoir grid is 2D
 #     return x, y, depth  
 
-def read_depth(filepath):
+def read_depth(filepath, shape=None, dtype='float64'):
   """
   Read from depth data
+
+  The depth data is a table of x, y, and depth (TXT file), or the depth of 
+  each block as a binary file, an NPY file or a raw file of the given shape 
+  (x first, Fortran order), which is memory-mapped (see 'deck_array')
+
+  Output:
+
+  z_array = x, (y,) and depth of the table, or the depth of each block (binary file)
   """
   import numpy as np
+
+  if filepath.endswith('.npy') or shape is not None:
+    return memmap_array(filepath, shape, dtype)
+
   data = np.loadtxt(filepath, skiprows=1)
   x, y, z = data[:,0], data[:,1], data[:,2]
   
@@ -203,3 +353,395 @@ def read_depth(filepath):
     # reservoir grid is 2D
     z_array = np.array([x, y, z])    
   return z_array
+
+# keywords of the ECLIPSE decks that are read by 'read_eclipse'. Grid properties 
+# (one value of each block), and keywords of records
+ECLIPSE_ARRAYS = {'DX': 'float64', 'DY': 'float64', 'DZ': 'float64', 'TOPS': 'float64', 
+                  'PERMX': 'float64', 'PERMY': 'float64', 'PERMZ': 'float64', 
+                  'PORO': 'float64', 'ACTNUM': 'int8'}
+ECLIPSE_RECORDS = {'WELSPECS': [('name', str), ('group', str), ('i', int), ('j', int), 
+                                 ('depth', float), ('phase', str)],
+                   'COMPDAT': [('name', str), ('i', int), ('j', int), ('k_upper', int), 
+                               ('k_lower', int), ('status', str), ('table', int), 
+                               ('factor', float), ('diameter', float), ('kh', float), 
+                               ('skin', float)],
+                   'WCONPROD': [('name', str), ('status', str), ('control', str), 
+                                ('orat', float), ('wrat', float), ('grat', float), 
+                                ('lrat', float), ('resv', float), ('bhp', float)]}
+
+def _eclipse_lines(filepath):
+  """
+  Lines of an ECLIPSE deck without the comments and blank lines, one at a time.
+  The INCLUDE files are streamed in place (relative to the including file)
+  """
+  import os
+  import re
+
+  with open(filepath) as f:
+    include = None
+    for line in f:
+      line = line.split('--')[0].strip()
+      if line == '':
+        continue
+
+      if include is not None:
+        # file name of INCLUDE, until '/'
+        include = include + ' ' + line
+        if '/' in re.sub(r"'[^']*'", '', include):
+          name = re.findall(r"'([^']*)'|(\S+)", include.split(' /')[0].strip())[0]
+          name = name[0] or name[1]
+          yield from _eclipse_lines(os.path.join(os.path.dirname(filepath), name))
+          include = None
+        continue
+
+      if line.split()[0].upper() == 'INCLUDE':
+        include = ''
+        continue
+
+      yield line
+
+def _eclipse_tokens(line):
+  """
+  Tokens of a record line until '/' (quotes removed, 'n*' expanded to n None and 
+  'n*value' to n values), and whether the record ends on this line
+  """
+  import re
+
+  tokens, end = [], False
+  for quoted, token in re.findall(r"'([^']*)'|([^\s']+)", line):
+    if token == '':
+      tokens.append(quoted)
+      continue
+    if '/' in token:
+      token, end = token.split('/')[0], True
+    if '*' in token:
+      n, _, value = token.partition('*')
+      tokens.extend([value or None] * int(n))
+    elif token != '':
+      tokens.append(token)
+    if end:
+      break
+  return tokens, end
+
+def _eclipse_array(lines, out, chunk):
+  """
+  Fill the values of a grid property keyword (until '/') into the preallocated
+  array. Lines without repeat counts are parsed together in chunks of text, 
+  so the memory is bounded by the chunk and the array. A malformed value 
+  raises a ValueError
+
+  Output:
+
+  n = number of values filled
+  """
+  import numpy as np
+
+  buffer, n = [], 0
+
+  def flush(n):
+    values = np.array(' '.join(buffer).split(), dtype=float)
+    # values beyond the array are counted, not filled
+    out[n:n + len(values)] = values[:max(len(out) - n, 0)]
+    buffer.clear()
+    return n + len(values)
+
+  size = 0
+  for line in lines:
+    end = '/' in line
+    line = line.split('/')[0]
+    if '*' in line:
+      # repeat counts, e.g. 90*1000, expanded as slices of the array
+      n, size = flush(n), 0
+      for token in line.split():
+        count, _, value = token.rpartition('*')
+        count = int(count) if count else 1
+        if value != '':
+          out[n:n + count] = float(value)
+        n = n + count
+    else:
+      buffer.append(line)
+      size = size + len(line)
+      if size > chunk:
+        n, size = flush(n), 0
+    if end:
+      break
+
+  return flush(n)
+
+def read_eclipse(filepath, chunk=2**20):
+  """
+  Read an ECLIPSE deck (DATA file), the subset of RUNSPEC, GRID, and SCHEDULE 
+  keywords used by PyReSim: DIMENS, DX, DY, DZ, TOPS, PERMX, PERMY, PERMZ, PORO, 
+  ACTNUM, WELSPECS, COMPDAT, and WCONPROD. Other keywords are skipped
+
+  The deck is streamed line by line (with the INCLUDE files). The grid 
+  properties are filled straight into preallocated arrays, with the repeat 
+  counts (N*value) expanded as slices, so keywords of millions of values are 
+  read in bounded memory
+
+  Input:
+
+  filepath = path to the ECLIPSE deck (DATA file)
+  chunk = size of the text parsed at once (character)
+
+  Output:
+
+  deck = ECLIPSE deck (as Python dictionary format)
+  contains:
+  * title, dimens (NX, NY, NZ)
+  * dx, dy, dz, tops, permx, permy, permz, poro, actnum (grid property of each 
+    block, 3D array NX x NY x NZ, or None if not in the deck. Defaulted values 
+    (n*) are 0. TOPS of the top layer only are extended to the other layers with DZ. 
+    A keyword with another number of values than NX*NY*NZ raises a ValueError)
+  * welspecs, compdat, wconprod (records, list of Python dictionary with the 
+    items of ECLIPSE_RECORDS. The defaulted items are None, the schedule of 
+    WCONPROD is in the order of the deck)
+  """
+  import numpy as np
+
+  deck = {'title': None, 'dimens': None}
+  deck.update({keyword.lower(): None for keyword in ECLIPSE_ARRAYS})
+  deck.update({keyword.lower(): [] for keyword in ECLIPSE_RECORDS})
+
+  lines = _eclipse_lines(filepath)
+  for line in lines:
+    keyword = line.split()[0].upper()
+    if len(line.split()) > 1 or not keyword[0].isalpha():
+      # records of a keyword that is skipped
+      continue
+
+    if keyword == 'TITLE':
+      deck['title'] = next(lines)
+
+    elif keyword == 'DIMENS':
+      tokens, end = _eclipse_tokens(next(lines))
+      deck['dimens'] = tuple(int(n) for n in tokens[:3])
+
+    elif keyword in ECLIPSE_ARRAYS:
+      if deck['dimens'] is None:
+        raise ValueError('DIMENS must be given before {}'.format(keyword))
+      nx, ny, nz = deck['dimens']
+      out = np.full(nx * ny * nz, np.nan) if keyword == 'TOPS' else \
+            np.zeros(nx * ny * nz, dtype=ECLIPSE_ARRAYS[keyword])
+      n = _eclipse_array(lines, out, chunk)
+      if n != nx * ny * nz and not (keyword == 'TOPS' and n == nx * ny):
+        raise ValueError('{} has {} values, NX*NY*NZ is {}'.format(keyword, n, nx * ny * nz))
+      deck[keyword.lower()] = out.reshape((nx, ny, nz), order='F')
+
+    elif keyword in ECLIPSE_RECORDS:
+      items = ECLIPSE_RECORDS[keyword]
+      for line in lines:
+        tokens, end = _eclipse_tokens(line)
+        if tokens == [] and end:
+          # empty record, end of the keyword
+          break
+        # items after the last token are defaulted
+        tokens = tokens + [None] * (len(items) - len(tokens))
+        record = {item: None if token is None else dtype(token.replace('D', 'E') if dtype is float else token)
+                  for (item, dtype), token in zip(items, tokens)}
+        deck[keyword.lower()].append(record)
+
+    elif keyword == 'END':
+      break
+
+  if deck['tops'] is not None and np.any(np.isnan(deck['tops'])):
+    # TOPS of the top layer, the layers below are on top of each other
+    if deck['dz'] is None:
+      raise ValueError('TOPS of the top layer only needs DZ for the layers below')
+    dz = np.broadcast_to(deck['dz'], deck['tops'].shape)
+    for k in range(1, deck['tops'].shape[2]):
+      deck['tops'][:,:,k] = deck['tops'][:,:,k-1] + dz[:,:,k-1]
+
+  return deck
+
+def results_create(path, shape, well_names, chunk=64):
+  """
+  Create an on-disk results store, where the pressure of each timestep and 
+  the rate and FBHP of the wells are appended as soon as they are solved
+
+  The store is a directory of chunks. Each chunk holds 'chunk' timesteps: 
+  the pressure (chunk, xi, yi) as a NPY file where each timestep is contiguous, 
+  and the time, rate, and FBHP as columnar NPY files (one row of each well). 
+  The chunks are memory-mapped, so only the chunk being written is in memory
+
+  Input:
+
+  path = directory of the results store (created if it does not exist)
+  shape = shape of the pressure of one timestep, e.g. (xi, yi)
+  well_names = names of the wells (in the order of the rates)
+  chunk = number of timesteps of each chunk
+
+  Output:
+
+  store = results store (as Python dictionary format), to be passed to 
+          'results_append' and 'results_close'
+  """
+  import os
+  import json
+
+  os.makedirs(path, exist_ok=True)
+
+  store = {'path': path, 'shape': tuple(int(n) for n in shape), 
+           'wells': [str(name) for name in well_names], 
+           'chunk': int(chunk), 'n': 0, 'arrays': None}
+
+  with open(os.path.join(path, 'results.json'), 'w') as f:
+    json.dump({key: store[key] for key in ('shape', 'wells', 'chunk', 'n')}, f)
+
+  return store
+
+def _results_chunk(path, c, column):
+  """
+  File of a column of a chunk of the results store
+  """
+  import os
+  return os.path.join(path, '{}_{:05d}.npy'.format(column, c))
+
+def _results_flush(store):
+  """
+  Write the arrays of the current chunk and the number of timesteps to disk
+  """
+  import os
+  import json
+
+  if store['arrays'] is not None:
+    for array in store['arrays'].values():
+      array.flush()
+
+  with open(os.path.join(store['path'], 'results.json'), 'w') as f:
+    json.dump({key: store[key] for key in ('shape', 'wells', 'chunk', 'n')}, f)
+
+def results_append(store, t, p_sol, q_well=None, fbhp_well=None):
+  """
+  Append the solution of a timestep to the results store
+
+  Input:
+
+  store = results store (from 'results_create')
+  t = time of the timestep (day)
+  p_sol = pressure solution (array of the shape of the store)
+  q_well, fbhp_well = rate (STB/D) and FBHP (psi) of each well (NaN if not given)
+  """
+  import numpy as np
+  from numpy.lib.format import open_memmap
+
+  chunk, n_wells = store['chunk'], len(store['wells'])
+  c, k = divmod(store['n'], chunk)
+
+  if k == 0:
+    # the previous chunk is full, start a new chunk
+    if store['arrays'] is not None:
+      _results_flush(store)
+    path = store['path']
+    store['arrays'] = {
+      'pressure': open_memmap(_results_chunk(path, c, 'pressure'), mode='w+', 
+                              dtype='float64', shape=(chunk,) + store['shape']),
+      'time': open_memmap(_results_chunk(path, c, 'time'), mode='w+', 
+                          dtype='float64', shape=(chunk,)),
+      'rate': open_memmap(_results_chunk(path, c, 'rate'), mode='w+', 
+                          dtype='float64', shape=(n_wells, chunk)),
+      'fbhp': open_memmap(_results_chunk(path, c, 'fbhp'), mode='w+', 
+                          dtype='float64', shape=(n_wells, chunk))}
+
+  arrays = store['arrays']
+  arrays['pressure'][k] = p_sol
+  arrays['time'][k] = t
+  arrays['rate'][:, k] = np.nan if q_well is None else q_well
+  arrays['fbhp'][:, k] = np.nan if fbhp_well is None else fbhp_well
+
+  store['n'] = store['n'] + 1
+
+def results_close(store):
+  """
+  Write the remaining timesteps of the results store to disk
+  """
+  _results_flush(store)
+  store['arrays'] = None
+
+def results_open(path):
+  """
+  Open a results store for reading
+
+  Nothing but the time of the timesteps is read. The pressure and the well 
+  rate and FBHP are read lazily ('results_pressure', 'results_well'), 
+  so only the requested timestep or well is read from disk
+
+  Input:
+
+  path = directory of the results store
+
+  Output:
+
+  results = results store (as Python dictionary format), contains:
+  * shape, wells, chunk, n (number of timesteps)
+  * time (time of the timesteps, day)
+  """
+  import os
+  import json
+  import numpy as np
+
+  with open(os.path.join(path, 'results.json')) as f:
+    results = json.load(f)
+
+  results['path'] = path
+  results['shape'] = tuple(results['shape'])
+
+  n, chunk = results['n'], results['chunk']
+  n_chunks = -(-n // chunk)
+  time = [np.load(_results_chunk(path, c, 'time'), mmap_mode='r') for c in range(n_chunks)]
+  results['time'] = np.concatenate(time)[:n] if n_chunks > 0 else np.empty(0)
+
+  return results
+
+def results_pressure(results, k=None, t=None):
+  """
+  Read the pressure of a timestep from a results store
+
+  Input:
+
+  results = results store (from 'results_open')
+  k = index of the timestep, OR
+  t = time (day), the timestep at or just before the time is read
+
+  Output:
+
+  p_sol = pressure solution of the timestep (memory-mapped array)
+  """
+  import numpy as np
+
+  if k is None:
+    k = np.searchsorted(results['time'], t * (1 + 1e-9), side='right') - 1
+  if k < 0:
+    k = k + results['n']
+  if not 0 <= k < results['n']:
+    raise IndexError('Timestep {} is out of the {} timesteps of the results'.format(k, results['n']))
+
+  c, k = divmod(int(k), results['chunk'])
+  return np.load(_results_chunk(results['path'], c, 'pressure'), mmap_mode='r')[k]
+
+def results_well(results, well_name, column='rate'):
+  """
+  Read the history of a well from a results store
+
+  Input:
+
+  results = results store (from 'results_open')
+  well_name = name of the well
+  column = 'rate' (STB/D) or 'fbhp' (psi)
+
+  Output:
+
+  time = time of the timesteps (day)
+  value = rate or FBHP of the well at each timestep
+  """
+  import numpy as np
+
+  i = results['wells'].index(str(well_name))
+
+  n, chunk = results['n'], results['chunk']
+  n_chunks = -(-n // chunk)
+  value = [np.load(_results_chunk(results['path'], c, column), mmap_mode='r')[i] 
+           for c in range(n_chunks)]
+  value = np.concatenate(value)[:n] if n_chunks > 0 else np.empty(0)
+
+  return results['time'], value
@@ -0,0 +1,256 @@
+"""
+Stencil kernels of the whole grid: inter-block transmissibilities, potential
+term, and accumulation term
+
+The kernels are compiled with Numba if it is installed (one fused loop over the
+blocks, without temporary arrays), otherwise the same kernels run as NumPy array
+operations. Both backends give the same values (bit for bit) as the per-block
+functions 'transmissibility2d', 'trans_r_min', 'trans_r_plus', 'potential_term2d',
+and the accumulation term of 'lhs_coeffs2d_grid'
+
+@author: Yohanes Nuwara
+@email: ign.nuwara97@gmail.com
+"""
+
+# compiled kernels, compiled at the first call of the 'numba' backend
+_NUMBA_KERNELS = {}
+
+def kernel_backend(backend=None):
+  """
+  Backend of the stencil kernels
+
+  Input:
+
+  backend = 'numba', 'numpy', or None ('numba' if Numba is installed, otherwise 'numpy')
+
+  Output:
+
+  backend = 'numba' or 'numpy'
+  """
+  if backend is None:
+    try:
+      import numba
+      return 'numba'
+    except ImportError:
+      return 'numpy'
+
+  if backend not in ('numba', 'numpy'):
+    raise ValueError("Kernel backend must be 'numba' or 'numpy', not {}".format(backend))
+  return backend
+
+def _numba_kernel(name):
+  """
+  Compile the loop of a kernel with Numba (cached on disk)
+  """
+  if name not in _NUMBA_KERNELS:
+    import numba
+    loops = {'transmissibility2d': _transmissibility2d_loop,
+             'transmissibility_radial': _transmissibility_radial_loop,
+             'potential2d': _potential2d_loop}
+    if name == 'accumulation':
+      # elementwise kernel, broadcasts the inputs as a ufunc
+      _NUMBA_KERNELS[name] = numba.vectorize(['float64(float64, float64, float64, float64, float64)'],
+                                             cache=True)(_accumulation)
+    else:
+      _NUMBA_KERNELS[name] = numba.njit(cache=True)(loops[name])
+  return _NUMBA_KERNELS[name]
+
+def _grid_arrays(shape, *values):
+  """
+  Broadcast the grid properties (float or array) to the grid, without copy
+  """
+  import numpy as np
+  return [np.broadcast_to(np.asarray(v, dtype='float64'), shape) for v in values]
+
+def _transmissibility2d_loop(dx, dy, dz, kx, ky, mu, B, T_array):
+  xi, yi = T_array.shape[0], T_array.shape[1]
+  for j in range(yi):
+    for i in range(xi):
+      # as 'transmissibility2d'
+      Tx = .001127 * (kx[i,j] * (dy[i,j] * dz[i,j])) / (mu[i,j] * B[i,j] * dx[i,j])
+      Ty = .001127 * (ky[i,j] * (dx[i,j] * dz[i,j])) / (mu[i,j] * B[i,j] * dy[i,j])
+      T_array[i,j,0] = Tx
+      T_array[i,j,1] = Tx
+      T_array[i,j,2] = Ty
+      T_array[i,j,3] = Ty
+
+def _transmissibility_radial_loop(c_min, c_plus, dtheta, dz, kh, mu, B, T_min, T_plus):
+  nr, nz = T_min.shape[0], T_min.shape[1]
+  for k in range(nz):
+    for i in range(nr):
+      # the previous and next rings, the ring itself at the inner and outer rings
+      i_prev, i_next = max(i - 1, 0), min(i + 1, nr - 1)
+      # as 'trans_r_min' and 'trans_r_plus'
+      G_min = (.001127 * dtheta) / (c_min / (dz[i,k] * kh[i,k]) + c_plus / (dz[i_prev,k] * kh[i_prev,k]))
+      G_plus = (.001127 * dtheta) / (c_plus / (dz[i,k] * kh[i,k]) + c_min / (dz[i_next,k] * kh[i_next,k]))
+      T_min[i,k] = G_min / (mu[i,k] * B[i,k])
+      T_plus[i,k] = G_plus / (mu[i,k] * B[i,k])
+
+def _potential2d_loop(gamma, T_array, z_array, sides, potential):
+  xi, yi = z_array.shape[0], z_array.shape[1]
+  for j in range(yi):
+    for i in range(xi):
+      # as 'potential_term2d', the sides in the order of T_array. No neighbor 
+      # at the boundary sides (the block itself at the edge of the grid)
+      Z = z_array[i,j]
+      dZ1 = 0. if sides[i,j,0] else z_array[max(i - 1, 0),j] - Z
+      dZ2 = 0. if sides[i,j,1] else z_array[min(i + 1, xi - 1),j] - Z
+      dZ3 = 0. if sides[i,j,2] else z_array[i,max(j - 1, 0)] - Z
+      dZ4 = 0. if sides[i,j,3] else z_array[i,min(j + 1, yi - 1)] - Z
+      term = T_array[i,j,0] * dZ1
+      term = term + T_array[i,j,1] * dZ2
+      term = term + T_array[i,j,2] * dZ3
+      term = term + T_array[i,j,3] * dZ4
+      potential[i,j] = gamma * term
+
+def _accumulation(Vb, poro, ct, B, timestep):
+  return (Vb * poro * ct) / (5.614583 * B * timestep)
+
+def stencil_transmissibility2d(shape, dx, dy, dz, kx, ky, mu, B, backend=None):
+  """
+  Calculate the inter-block transmissibilities (Tx_min, Tx_plus, Ty_min, Ty_plus)
+  of the whole grid, as 'transmissibility2d' of each block
+  2D reservoir
+
+  Input:
+
+  shape = number of blocks (xi, yi)
+  dx, dy, dz, kx, ky, mu, B = grid properties (float or 2D array)
+  backend = 'numba', 'numpy', or None (see 'kernel_backend')
+
+  Output:
+
+  T_array = transmissibilities of each block (3D array, xi x yi x 4)
+  """
+  import numpy as np
+
+  dx, dy, dz, kx, ky, mu, B = _grid_arrays(shape, dx, dy, dz, kx, ky, mu, B)
+
+  if kernel_backend(backend) == 'numba':
+    T_array = np.empty(tuple(shape) + (4,))
+    _numba_kernel('transmissibility2d')(dx, dy, dz, kx, ky, mu, B, T_array)
+    return T_array
+
+  Tx = .001127 * (kx * (dy * dz)) / (mu * B * dx)
+  Ty = .001127 * (ky * (dx * dz)) / (mu * B * dy)
+  return np.stack([Tx, Tx, Ty, Ty], axis=-1)
+
+def stencil_transmissibility_radial(dz, kh, mu, B, alpha_tg, dtheta=None, backend=None):
+  """
+  Calculate the transmissibilities in r- and r+ direction of all cylindrical grid
+  blocks, as 'trans_r_min' and 'trans_r_plus' with the properties of the
+  previous and next rings
+
+  Input:
+
+  dz, kh, mu, B = grid properties of the rings (1D array, nr, or 2D array, nr x nz)
+  alpha_tg = logarithmic spacing constant (from 'calculate_bulk_cylindrical')
+  dtheta = angle of the grid blocks (default is 2π, full circle)
+  backend = 'numba', 'numpy', or None (see 'kernel_backend')
+
+  Output:
+
+  T_min, T_plus = transmissibilities of each block (same shape as the grid properties).
+  At the inner and outer ring, the ring itself is taken as the previous and next ring
+  """
+  import numpy as np
+
+  if dtheta is None:
+    dtheta = 2 * np.pi
+
+  shape = np.broadcast(*[np.asarray(v) for v in (dz, kh, mu, B)]).shape
+  dz, kh, mu, B = _grid_arrays(shape, dz, kh, mu, B)
+
+  # geometric constants of the logarithmic spacing, with numpy's log (as 'trans_r_min')
+  c_min = np.log(alpha_tg * np.log(alpha_tg) / (alpha_tg - 1))
+  c_plus = np.log((alpha_tg - 1) / np.log(alpha_tg))
+
+  if kernel_backend(backend) == 'numba':
+    grid = [v.reshape(shape[0], -1) for v in (dz, kh, mu, B)]
+    T_min, T_plus = np.empty(grid[0].shape), np.empty(grid[0].shape)
+    _numba_kernel('transmissibility_radial')(float(c_min), float(c_plus), float(dtheta),
+                                             *grid, T_min, T_plus)
+    return T_min.reshape(shape), T_plus.reshape(shape)
+
+  dzkh = dz * kh
+  dzkh_prev = np.concatenate([dzkh[:1], dzkh[:-1]])
+  dzkh_next = np.concatenate([dzkh[1:], dzkh[-1:]])
+
+  T_min = ((.001127 * dtheta) / (c_min / dzkh + c_plus / dzkh_prev)) / (mu * B)
+  T_plus = ((.001127 * dtheta) / (c_plus / dzkh + c_min / dzkh_next)) / (mu * B)
+  return T_min, T_plus
+
+def stencil_potential2d(rho, T_array, z_array, sides, backend=None):
+  """
+  Calculate the potential term of the whole grid, as 'potential_term2d' of each
+  block, over the sides that are not boundary sides (as 'potential_term3d')
+  2D reservoir
+
+  Potential term = γ * ((T1 * ΔZ1) + (T2 * ΔZ2) + (T3 * ΔZ3) + (T4 * ΔZ4))
+
+  Input:
+
+  rho = fluid density (lbm/ft3)
+  T_array = transmissibilities of each block (3D array, xi x yi x 4)
+  z_array = depth of grid blocks, positive downward (2D array)
+  sides = True at the boundary sides of each block (3D array, xi x yi x 4), 
+          e.g. boundary_grid['type'] != ''
+  backend = 'numba', 'numpy', or None (see 'kernel_backend')
+
+  Output:
+
+  potential = potential term of each block (2D array)
+  """
+  import numpy as np
+
+  gamma = .21584E-3 * rho * 32.174
+  z = np.asarray(z_array, dtype='float64')
+  T_array = np.asarray(T_array, dtype='float64')
+  xi, yi = z.shape
+  sides = np.asarray(sides, dtype=bool)
+
+  if kernel_backend(backend) == 'numba':
+    potential = np.zeros((xi, yi))
+    _numba_kernel('potential2d')(float(gamma), T_array, z, sides, potential)
+    return potential
+
+  # depth difference to the neighbor at side 1 to 4 (0 at the edge of the grid)
+  dZ = np.zeros((xi, yi, 4))
+  dZ[1:,:,0] = z[:-1] - z[1:]
+  dZ[:-1,:,1] = z[1:] - z[:-1]
+  dZ[:,1:,2] = z[:,:-1] - z[:,1:]
+  dZ[:,:-1,3] = z[:,1:] - z[:,:-1]
+  dZ = np.where(sides, 0., dZ)
+
+  term = T_array[...,0] * dZ[...,0]
+  term = term + T_array[...,1] * dZ[...,1]
+  term = term + T_array[...,2] * dZ[...,2]
+  term = term + T_array[...,3] * dZ[...,3]
+  return gamma * term
+
+def accumulation_term(Vb, poro, ct, B, timestep, backend=None):
+  """
+  Calculate the accumulation term Vb * poro * ct / (5.614583 * B * Δt) of
+  the whole grid, the coefficient of p in the LHS and of the previous pressure
+  in the RHS (slightly compressible)
+
+  Input:
+
+  Vb, poro, ct, B = bulk volume (ft3), porosity, total compressibility (1/psi),
+                    FVF (float or array)
+  timestep = time increment (day)
+  backend = 'numba', 'numpy', or None (see 'kernel_backend')
+
+  Output:
+
+  accumulation = accumulation term (float, or array of the shape of the grid properties)
+  """
+  import numpy as np
+
+  if all(np.ndim(v) == 0 for v in (Vb, poro, ct, B)):
+    # homogeneous, nothing to fuse
+    return _accumulation(Vb, poro, ct, B, timestep)
+
+  if kernel_backend(backend) == 'numba':
+    return _numba_kernel('accumulation')(Vb, poro, ct, B, timestep)
+  return _accumulation(np.asarray(Vb, dtype='float64'), poro, ct, B, timestep)
@@ -0,0 +1,198 @@
+"""
+Codes for caching the parsed and preprocessed models (input data, grid, wells,
+boundaries, transmissibilities, potential term) as binary files
+
+A model is stored as one NPZ file in the cache directory, named by the hash of
+the input files, the other inputs (e.g. depth, initial pressure), and the source
+code of the preprocessing. Any change of the input or the code gives a new key,
+so a stale model is never loaded. The least recently used models are removed
+when the cache directory is larger than its size limit
+
+@author: Yohanes Nuwara
+@email: ign.nuwara97@gmail.com
+"""
+
+# default cache directory and its size limit (byte)
+MODEL_CACHE_DIR = '~/.cache/pyresim'
+MODEL_CACHE_SIZE = 2**30
+
+def model_cache_key(filepaths=(), arrays=(), modules=()):
+  """
+  Key of a model, the SHA-256 hash of the contents of the input files, the
+  other inputs, and the source code of the preprocessing
+
+  Input:
+
+  filepaths = input files (e.g. the input deck and the depth data)
+  arrays = other inputs (arrays, numbers, lists, or None)
+  modules = names of the modules of the preprocessing (e.g. 'transmissibility'),
+            their source code is the code version of the model
+
+  Output:
+
+  key = hash (hex string)
+  """
+  import hashlib
+  import importlib
+  import numpy as np
+
+  h = hashlib.sha256()
+
+  for filepath in filepaths:
+    with open(filepath, 'rb') as f:
+      for block in iter(lambda: f.read(2**20), b''):
+        h.update(block)
+
+  for a in arrays:
+    if a is None:
+      h.update(b'None')
+      continue
+    a = np.asarray(a)
+    if a.dtype == object:
+      a = a.astype(str)
+    h.update(str((a.dtype.str, a.shape)).encode())
+    h.update(np.ascontiguousarray(a).tobytes())
+
+  for name in modules:
+    with open(importlib.import_module(name).__file__, 'rb') as f:
+      h.update(f.read())
+
+  return h.hexdigest()
+
+def _model_flatten(obj, name, arrays, meta):
+  """
+  Flatten the nested dictionaries, tuples, and lists of a model to arrays
+  """
+  import numpy as np
+
+  if isinstance(obj, dict):
+    meta[name] = ['dict', list(obj.keys())]
+    for key, value in obj.items():
+      _model_flatten(value, name + '/' + key, arrays, meta)
+  elif isinstance(obj, tuple):
+    meta[name] = ['tuple', len(obj)]
+    for i, value in enumerate(obj):
+      _model_flatten(value, name + '/' + str(i), arrays, meta)
+  elif obj is None:
+    meta[name] = ['none']
+  else:
+    a = np.asarray(obj)
+    kind = 'list' if isinstance(obj, list) else 'scalar' if a.ndim == 0 and not \
+           isinstance(obj, np.ndarray) else 'array'
+    if a.dtype == object:
+      # object arrays of strings (boundary types), stored as strings
+      meta[name] = [kind, 'object']
+      a = a.astype(str)
+    else:
+      meta[name] = [kind]
+    arrays[name] = np.asarray(a)
+
+def _model_unflatten(name, arrays, meta):
+  """
+  Rebuild a model flattened by '_model_flatten'
+  """
+  kind = meta[name][0]
+
+  if kind == 'dict':
+    return {key: _model_unflatten(name + '/' + key, arrays, meta) for key in meta[name][1]}
+  if kind == 'tuple':
+    return tuple(_model_unflatten(name + '/' + str(i), arrays, meta) for i in range(meta[name][1]))
+  if kind == 'none':
+    return None
+
+  a = arrays[name]
+  if meta[name][1:] == ['object']:
+    a = a.astype(object)
+  if kind == 'list':
+    return a.tolist()
+  if kind == 'scalar':
+    return a[()]
+  return a
+
+def model_cache_load(key, cache_dir=MODEL_CACHE_DIR):
+  """
+  Load a model from the cache
+
+  Input:
+
+  key = key of the model (from 'model_cache_key')
+  cache_dir = cache directory
+
+  Output:
+
+  model = model (as stored with 'model_cache_save'), or None if not in the cache
+  """
+  import os
+  import json
+  import numpy as np
+
+  filepath = os.path.join(os.path.expanduser(cache_dir), key + '.npz')
+  if not os.path.exists(filepath):
+    return None
+
+  with np.load(filepath) as data:
+    arrays = {name: data[name] for name in data.files}
+  meta = json.loads(str(arrays.pop('__meta__')))
+
+  # the access time for the LRU eviction
+  os.utime(filepath)
+
+  return _model_unflatten('model', arrays, meta)
+
+def model_cache_save(key, model, cache_dir=MODEL_CACHE_DIR, max_size=MODEL_CACHE_SIZE):
+  """
+  Store a model in the cache as an NPZ file, then remove the least recently
+  used models until the cache directory is within its size limit
+
+  Input:
+
+  key = key of the model (from 'model_cache_key')
+  model = model (nested dictionaries and tuples of arrays, lists, numbers,
+          strings, or None)
+  cache_dir = cache directory
+  max_size = size limit of the cache directory (byte)
+
+  Output:
+
+  filepath = path of the NPZ file
+  """
+  import os
+  import json
+  import numpy as np
+
+  cache_dir = os.path.expanduser(cache_dir)
+  os.makedirs(cache_dir, exist_ok=True)
+
+  arrays, meta = {}, {}
+  _model_flatten(model, 'model', arrays, meta)
+  arrays['__meta__'] = np.array(json.dumps(meta))
+
+  # written to a temporary file first, so a model is never read half-written
+  filepath = os.path.join(cache_dir, key + '.npz')
+  temp = os.path.join(cache_dir, key + '.{}.tmp.npz'.format(os.getpid()))
+  np.savez(temp, **arrays)
+  os.replace(temp, filepath)
+
+  model_cache_evict(cache_dir, max_size, keep=filepath)
+  return filepath
+
+def model_cache_evict(cache_dir=MODEL_CACHE_DIR, max_size=MODEL_CACHE_SIZE, keep=None):
+  """
+  Remove the least recently used models until the cache directory is within
+  its size limit (byte). The model 'keep' (path) is not removed
+  """
+  import os
+
+  cache_dir = os.path.expanduser(cache_dir)
+  files = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir)
+           if name.endswith('.npz') and '.tmp.' not in name]
+  files = sorted(files, key=os.path.getmtime)
+
+  size = sum(os.path.getsize(f) for f in files)
+  for f in files:
+    if size <= max_size:
+      break
+    if f == keep:
+      continue
+    size = size - os.path.getsize(f)
+    os.remove(f)
@@ -21,9 +21,15 @@ def potential_term2d(rho, T, Zx_min, Zx_plus, Zy_min, Zy_plus, Z):
 
   Potential term = γ * ((T1 * ΔZ1) + (T2 * ΔZ2) + (T3 * ΔZ3) + (T4 * ΔZ4))
 
+  The per-block RHS of the 2D notebooks ('rhs_constant2d_welltype') subtracts 
+  this term. The simulators take the depth Z positive downward (as 1D and 3D), 
+  so the flow from a neighbor is T * ((p_l - p) - γ * (Z_l - Z)), and the term is 
+  added to the RHS ('rhs_constant2d_grid')
+
   Input:
 
   T = transmissibility array (T1, T2, T3, T4)
+  Zx_min, Zx_plus, Zy_min, Zy_plus, Z = depth of the neighbors and of the block
   """
   import numpy as np
   
@@ -31,3 +37,33 @@ def potential_term2d(rho, T, Zx_min, Zx_plus, Zy_min, Zy_plus, Z):
   potential_term = T * np.array([Zx_min - Z, Zx_plus - Z, Zy_min - Z, Zy_plus - Z])
   potential_term = gamma * np.sum(potential_term)
   return potential_term
+
+def potential_term3d(rho, T_array, z_array, sides):
+  """
+  Calculate potential term of the whole grid at once in 3D reservoir
+
+  Potential term = γ * Σ (Tk * ΔZk), over the sides k = 1 to 6 of each block 
+  that are not boundary sides. The depth Z is positive downward (as 'potential_term2d')
+
+  Input:
+
+  T_array = transmissibility array of each block (from 'transmissibility3d_grid')
+  z_array = depth of grid blocks (3D array)
+  sides = True at the boundary sides of each block (4D array, xi x yi x zi x 6)
+  """
+  import numpy as np
+
+  gamma = .21584E-3 * rho * 32.174
+
+  # depth difference to the neighbor at side 1 to 6 (0 at the edge of the grid)
+  z = np.asarray(z_array, dtype='float64')
+  dZ = np.zeros(z.shape + (6,))
+  dZ[1:,:,:,0] = z[:-1] - z[1:]
+  dZ[:-1,:,:,1] = z[1:] - z[:-1]
+  dZ[:,1:,:,2] = z[:,:-1] - z[:,1:]
+  dZ[:,:-1,:,3] = z[:,1:] - z[:,:-1]
+  dZ[:,:,1:,4] = z[:,:,:-1] - z[:,:,1:]
+  dZ[:,:,:-1,5] = z[:,:,1:] - z[:,:,:-1]
+
+  potential_term = gamma * np.sum(np.where(sides, 0, T_array * dZ), axis=-1)
+  return potential_term
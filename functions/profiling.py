@@ -0,0 +1,133 @@
+"""
+Codes for profiling the phases of the simulation (assembly, factorization,
+solve, well post-processing) and exporting the timeline
+
+A profile is a list where an event (as Python dictionary format) is appended
+at the end of each phase, as the 'solver_report' of the simulators. Recording
+an event is a clock reading and a list append, so the profile can be left on
+
+@author: Yohanes Nuwara
+@email: ign.nuwara97@gmail.com
+"""
+
+def profile_phase(profile, name, **args):
+  """
+  Context manager recording the wall time of a phase in the profile
+
+  with profile_phase(profile, 'solve', time=t):
+    p_sol = ...
+
+  Input:
+
+  profile = list where the event is appended, or None (nothing is recorded)
+  name = name of the phase, e.g. 'read_input', 'assemble', 'factorize', 'solve', 'wells'
+  args = other information of the phase, e.g. time (day), iterations, nbytes
+         (size of the arrays of the phase, byte). The returned dictionary can
+         be updated inside the phase
+
+  Output:
+
+  event = event of the phase (as Python dictionary format), contains:
+  * name, start (second, from time.perf_counter), duration (second), args
+  """
+  from contextlib import contextmanager, nullcontext
+
+  if profile is None:
+    return nullcontext(args)
+
+  @contextmanager
+  def phase():
+    import time
+    event = {'name': name, 'start': time.perf_counter(), 'duration': None, 'args': args}
+    try:
+      yield args
+    finally:
+      event['duration'] = time.perf_counter() - event['start']
+      profile.append(event)
+
+  return phase()
+
+def array_nbytes(*arrays):
+  """
+  Size of numpy arrays, scipy sparse matrices, or LU factorizations (byte)
+  """
+  import numpy as np
+
+  nbytes = 0
+  for a in arrays:
+    if a is None:
+      continue
+    if isinstance(a, dict):
+      nbytes = nbytes + array_nbytes(*a.values())
+    elif isinstance(a, (tuple, list)):
+      nbytes = nbytes + array_nbytes(*a)
+    elif hasattr(a, 'L') and hasattr(a, 'U'):
+      # sparse LU factorization (scipy.sparse.linalg.splu)
+      nbytes = nbytes + array_nbytes(a.L, a.U, a.perm_r, a.perm_c)
+    elif hasattr(a, 'indptr'):
+      # sparse matrix (CSR, CSC)
+      nbytes = nbytes + a.data.nbytes + a.indices.nbytes + a.indptr.nbytes
+    elif isinstance(a, np.ndarray):
+      nbytes = nbytes + a.nbytes
+  return int(nbytes)
+
+def profile_summary(profile):
+  """
+  Summary of the profile: the number of events, the total, mean, and maximum
+  wall time (second), and the total iterations and peak array size (byte) of each phase
+
+  Output:
+
+  summary = summary of each phase (as Python dictionary format)
+  """
+  summary = {}
+  for event in profile:
+    s = summary.setdefault(event['name'], {'count': 0, 'total': 0., 'max': 0.})
+    s['count'] = s['count'] + 1
+    s['total'] = s['total'] + event['duration']
+    s['max'] = max(s['max'], event['duration'])
+    if 'iterations' in event['args']:
+      s['iterations'] = s.get('iterations', 0) + event['args']['iterations']
+    if 'nbytes' in event['args']:
+      s['peak_nbytes'] = max(s.get('peak_nbytes', 0), event['args']['nbytes'])
+
+  for s in summary.values():
+    s['mean'] = s['total'] / s['count']
+  return summary
+
+def profile_chrome_trace(profile, filepath=None):
+  """
+  Export the profile as a Chrome trace (JSON timeline), which can be opened
+  in chrome://tracing or https://ui.perfetto.dev
+
+  Input:
+
+  profile = list of events (from 'profile_phase')
+  filepath = path of the JSON file, or None (not written)
+
+  Output:
+
+  trace = Chrome trace (as Python dictionary format)
+  """
+  import os
+  import json
+  import threading
+
+  t0 = min((event['start'] for event in profile), default=0.)
+  pid, tid = os.getpid(), threading.get_ident()
+
+  def value(v):
+    # numpy scalars to Python numbers
+    return v.item() if hasattr(v, 'item') else v
+
+  events = [{'name': event['name'], 'ph': 'X', 'pid': pid, 'tid': tid,
+             'ts': (event['start'] - t0) * 1e6, 'dur': event['duration'] * 1e6,
+             'args': {key: value(v) for key, v in event['args'].items()}}
+            for event in profile]
+  trace = {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+  if filepath is not None:
+    with open(filepath, 'w') as f:
+      json.dump(trace, f)
+
+  return trace
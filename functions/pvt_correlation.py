@@ -272,3 +272,100 @@ def waterfvf(temp, p):
   Vwt = (-1.001E-2) + (1.33391E-4 * temp) + (5.50654E-7 * temp**2)
   Bw = (1 + Vwt) * (1 + Vwp)
   return(Bw)
+
+"""
+PVT TABLES (for the compressible simulation)
+"""
+
+def gas_pvt_table(temp, sg, x_h2s=0, x_co2=0, pressure=None):
+  """
+  Tabulate the gas PVT properties over a range of pressure
+
+  Input:
+
+  temp = temperature in Fahrenheit
+  sg, x_h2s, x_co2 = gas specific gravity, mole fraction of H2S and CO2
+  pressure = pressure points of the table (psia). Default 14.7 to 10,000 psia
+
+  Output:
+
+  pvt = PVT table (as Python dictionary format)
+  contains: p (psia), B (RB/scf), mu (cp), rho (lbm/ft3)
+  """
+  import numpy as np
+
+  if pressure is None:
+    pressure = np.linspace(14.7, 10000, 200)
+
+  B, mu, rho = [], [], []
+  for p in pressure:
+    P_pc, T_pc, P_pr, T_pr = gas_pseudoprops(temp, p, sg, x_h2s, x_co2)
+    rho_pr, z = gas_zfactor(T_pr, P_pr)
+    rhogas = gas_density(temp, p, sg, z)
+    B.append(gas_fvf(z, temp, p) / 5.614583) # res ft3/scf to RB/scf
+    mu.append(gas_mu(temp, rhogas, sg))
+    rho.append(rhogas)
+
+  pvt = {'p': np.array(pressure, dtype='float64'), 'B': np.array(B), 
+         'mu': np.array(mu), 'rho': np.array(rho)}
+  return pvt
+
+def liquid_pvt_table(B, mu, rho, cfluid, p_ref, pressure=None):
+  """
+  Tabulate the PVT properties of a liquid of constant compressibility
+
+  B = B_ref * exp(-c (p - p_ref)), rho = rho_ref * exp(c (p - p_ref)), constant mu
+
+  Input:
+
+  B, mu, rho = FVF (RB/STB), viscosity (cp), and density (lbm/ft3) at p_ref
+  cfluid = fluid compressibility (1/psi)
+  p_ref = reference pressure (psia)
+  pressure = pressure points of the table (psia). Default 14.7 to 10,000 psia
+
+  Output:
+
+  pvt = PVT table (as Python dictionary format)
+  contains: p (psia), B (RB/STB), mu (cp), rho (lbm/ft3)
+  """
+  import numpy as np
+
+  if pressure is None:
+    pressure = np.linspace(14.7, 10000, 200)
+  pressure = np.array(pressure, dtype='float64')
+
+  pvt = {'p': pressure, 
+         'B': B * np.exp(-cfluid * (pressure - p_ref)), 
+         'mu': np.full(len(pressure), mu, dtype='float64'),
+         'rho': rho * np.exp(cfluid * (pressure - p_ref))}
+  return pvt
+
+def pvt_properties(pvt, pressure):
+  """
+  Interpolate the PVT properties and their derivatives to pressure 
+  from the PVT table (linear interpolation, the derivatives are the slopes 
+  of the table)
+
+  Input:
+
+  pvt = PVT table (from 'gas_pvt_table' or 'liquid_pvt_table')
+  pressure = pressure (float or array)
+
+  Output:
+
+  B, mu, rho = PVT properties at pressure
+  dB, dmu, drho = derivatives of the PVT properties to pressure
+  """
+  import numpy as np
+
+  p = pvt['p']
+  k = np.clip(np.searchsorted(p, pressure) - 1, 0, len(p) - 2)
+
+  props = []
+  for prop in ['B', 'mu', 'rho']:
+    y = pvt[prop]
+    slope = (y[k + 1] - y[k]) / (p[k + 1] - p[k])
+    props.append((y[k] + slope * (pressure - p[k]), slope))
+
+  (B, dB), (mu, dmu), (rho, drho) = props
+  return B, mu, rho, dB, dmu, drho
@@ -200,6 +200,11 @@ def rhs_constant2d_welltype(boundary_dict, well_dict, potential_term,
 
   potential_term = potential calculated using 'potential1d', 'potential2d', and 'potential3d'
   (for grid with ELEVATION only. If there's no ELEVATION, potential_term = 0)
+
+  N.b.: this per-block RHS of the 2D notebooks subtracts the potential term (and 
+  includes it in the flow of constant pressure gradient boundaries), as it always 
+  has. The simulators use 'rhs_constant2d_grid', where the depth is positive 
+  downward as in the 1D and 3D simulation, and the potential term is added
   """ 
   
   import numpy as np
@@ -271,6 +276,120 @@ def rhs_constant2d_welltype(boundary_dict, well_dict, potential_term,
     rhs = rhs - (rhs_term * p_initial)
     return rhs 
 
+def lhs_coeffs2d_grid(bound_loc, well_table, T_array, mu, B, 
+                      solver='slicomp', reservoir_input=None, timestep=1):
+  """
+  Calculate the Left-hand side (LHS) coefficients of p+, p-, and p
+  of the whole grid at once (vectorized 'lhs_coeffs2d_welltype')
+  2D reservoir
+
+  Input:
+
+  bound_loc = the boundary location codes, NaN for INACTIVE BLOCKS (2D array)
+  well_table = well table (from 'well_table')
+  T_array = transmissibilities of each block (from 'transmissibility2d_grid')
+
+  Output:
+
+  px_min, px_plus, py_min, py_plus, p = coefficients of each block (2D arrays).
+  The coefficients of the boundary sides are 0
+  """
+  import numpy as np
+  from boundary import boundary2d_sides
+  from wellblock import well_source_terms
+  from kernels import accumulation_term
+
+  xi, yi = bound_loc.shape
+  sides = boundary2d_sides(bound_loc)
+
+  " Well term "
+  A, q = well_source_terms(well_table, xi * yi)
+  A = A.reshape((xi, yi), order='F')
+
+  " Calculate coefficients "
+  coeffs = np.where(sides, 0, T_array)
+  px_min, px_plus, py_min, py_plus = [coeffs[:,:,k] for k in range(4)]
+  p = -(A + np.sum(T_array, axis=2))
+
+  " SOLVER "
+  if solver=='slicomp':
+    Vb = reservoir_input['dx'] * reservoir_input['dy'] * reservoir_input['dz']
+    ct = reservoir_input['cpore'] + reservoir_input['cfluid']
+    rhs_term = accumulation_term(Vb, reservoir_input['poro'], ct, reservoir_input['B'], timestep)
+
+    # modify coefficient of p
+    p = p - rhs_term
+
+  p = np.broadcast_to(p, (xi, yi))
+  return px_min, px_plus, py_min, py_plus, p
+
+def rhs_constant2d_grid(boundary_grid, well_table, potential, 
+                        dx, dy, dz, kx, ky, mu, B, solver='slicomp',
+                        p_initial=None, reservoir_input=None, 
+                        timestep=1):
+  """
+  Calculate the Right-hand side (RHS) constants of the whole grid at once 
+  (vectorized 'rhs_constant2d_welltype')
+  2D reservoir
+
+  Unlike the per-block 'rhs_constant2d_welltype' of the notebooks, the depth is 
+  positive downward (as the 1D and 3D simulation): the potential term is added, 
+  and the gradient of constant pressure gradient boundaries is of the potential.
+  Both are the same for a reservoir without elevation
+
+  Input:
+
+  boundary_grid = boundary information of the whole grid (from 'boundary2d_grid')
+  with the boundary transmissibilities 'T' (3D array, xi x yi x 4)
+  well_table = well table (from 'well_table')
+  potential = potential term of each block (2D array)
+  p_initial = pressure of the previous timestep (2D array), for 'slicomp'
+
+  Output:
+
+  rhs = RHS constants of each block (2D array)
+  """
+  import numpy as np
+  from wellblock import well_source_terms
+  from kernels import accumulation_term
+
+  bound_type = boundary_grid['type']
+  bound_value = boundary_grid['value']
+  bound_T = boundary_grid['T']
+
+  " Transmissibility term "
+  # flow at constant pressure gradient boundaries. Negative at the west and 
+  # south sides (1, 3), positive at the east and north sides (2, 4). The gradient 
+  # is of the potential (p - γZ), so a zero gradient is no flow
+  Ax, Ay = dy * dz, dx * dz
+  Tx_grad = .001127 * (kx * Ax) / (mu * B)
+  Ty_grad = .001127 * (ky * Ay) / (mu * B)
+  T_grad = np.stack(np.broadcast_arrays(-Tx_grad, Tx_grad, -Ty_grad, Ty_grad), axis=-1)
+  grad_term = T_grad * bound_value
+
+  rhs1 = np.where(bound_type == 'constant_pressure', bound_T * bound_value, 0)
+  rhs1 = np.where(bound_type == 'constant_pressuregrad', grad_term, rhs1)
+  rhs1 = np.where(bound_type == 'constant_rate', bound_value, rhs1)
+  rhs1 = np.sum(rhs1, axis=2)
+
+  " Well term "
+  xi, yi = potential.shape
+  _, A = well_source_terms(well_table, xi * yi)
+  A = A.reshape((xi, yi), order='F')
+
+  # calculate RHS constants. The depth is positive downward, so the flow from 
+  # the neighbors is T * ((p_l - p) - γ * (Z_l - Z)), as in the 1D and 3D simulation
+  rhs = -(rhs1 + A) + potential
+
+  if solver=='slicomp':
+    # add term 
+    Vb = reservoir_input['dx'] * reservoir_input['dy'] * reservoir_input['dz']
+    ct = reservoir_input['cpore'] + reservoir_input['cfluid']
+    rhs_term = accumulation_term(Vb, reservoir_input['poro'], ct, reservoir_input['B'], timestep)
+    rhs = rhs - (rhs_term * p_initial)
+
+  return rhs
+
 def fill2d_lhs_mat(bound_loc, block_index, xi, lhs_mat, px_min, px_plus, py_min, py_plus, p):
   """
   Fill the LHS coefficients into 2D matrix 
@@ -374,6 +493,63 @@ def fill2d_lhs_mat(bound_loc, block_index, xi, lhs_mat, px_min, px_plus, py_min,
 
   return lhs_mat  
 
+def fill1d_lhs_band(bound_loc, block_index, lhs_band, p_plus, p_min, p):
+  """
+  Fill the LHS coefficients into the diagonals of tridiagonal LHS matrix 
+  For 1D reservoir (only the three diagonals are stored, see 'solve_tridiagonal')
+
+  Input:
+
+  bound_loc = location of block ('west', 'east', or None for interior blocks)
+  block_index = index of grid block (1, 2, 3, ...)
+  lhs_band = empty LHS diagonals (2D array, 3 x xi, created before simulation)
+  p_plus, p_min, p = coefficients of LHS
+
+  Output:
+
+  lhs_band = LHS diagonals have been filled with the LHS coefficients
+  """
+  import numpy as np
+
+  i = block_index - 1
+
+  # main diagonal
+  lhs_band[1, i] = np.squeeze(p)
+
+  if bound_loc != 'east':
+    # upper diagonal (coefficient of p+)
+    lhs_band[0, i + 1] = np.squeeze(p_plus)
+  if bound_loc != 'west':
+    # lower diagonal (coefficient of p-)
+    lhs_band[2, i - 1] = np.squeeze(p_min)
+
+  return lhs_band
+
+def solve_tridiagonal(lhs_band, rhs_mat):
+  """
+  Solve the pressure of 1D reservoir, where the LHS matrix is tridiagonal 
+  and stored as its three diagonals only. Time and memory grow linearly 
+  with the number of grid blocks
+
+  Input:
+
+  lhs_band = diagonals of LHS matrix (2D array, 3 x xi) as filled by 'fill1d_lhs_band'
+             [0] upper diagonal (p+), first element unused
+             [1] main diagonal (p)
+             [2] lower diagonal (p-), last element unused
+  rhs_mat = RHS matrix (xi x 1)
+
+  Output:
+
+  p_sol = pressure solution (1D array)
+  """
+  import numpy as np
+  from scipy.linalg import solve_banded
+
+  rhs_mat = np.asarray(rhs_mat, dtype='float64').reshape(len(lhs_band[1]), -1)
+  p_sol = solve_banded((1, 1), lhs_band, rhs_mat)
+  return p_sol.T.reshape(-1)
+
 def fill2d_rhs_mat(block_index, rhs_mat, rhs):
   """
   Fill the RHS constants into 2D matrix 
@@ -395,14 +571,149 @@ def fill2d_rhs_mat(block_index, rhs_mat, rhs):
   rhs_mat[i,0] = rhs
   return rhs_mat
 
-def solve_pressure_irregular2d(lhs_mat, rhs_mat, x):
+def lhs_fingerprint(lhs_mat):
+  """
+  Fingerprint of the values of the LHS matrix (shape, number of nonzeros, 
+  and a hash of the entries), so a cached factorization or preconditioner is 
+  not reused for a matrix that has changed under the same key
+  """
+  import hashlib
+  import numpy as np
+  from scipy.sparse import issparse
+
+  h = hashlib.blake2b(digest_size=16)
+  if issparse(lhs_mat):
+    lhs_mat = lhs_mat.tocsr()
+    for a in (lhs_mat.data, lhs_mat.indices, lhs_mat.indptr):
+      h.update(np.ascontiguousarray(a).tobytes())
+    nnz = lhs_mat.nnz
+  else:
+    lhs_mat = np.ascontiguousarray(lhs_mat, dtype='float64')
+    h.update(lhs_mat.tobytes())
+    nnz = np.count_nonzero(lhs_mat)
+  return (lhs_mat.shape, nnz, h.hexdigest())
+
+def _cache_store(cache, key, entry, cache_size):
+  """
+  Store an entry (factorization or preconditioner) in the cache, after removing 
+  the oldest entries if the cache is full (first in, first out)
+  """
+  cache.pop(key, None)
+  while len(cache) >= cache_size:
+    cache.pop(next(iter(cache)))
+  cache[key] = entry
+
+def factorize_lhs(lhs_mat, cache=None, key=None, cache_size=4, fingerprint=None):
+  """
+  LU factorization of the LHS matrix, so the pressure can be solved for 
+  many RHS (forward/back substitution only) without refactorizing the same matrix
+
+  Input:
+
+  lhs_mat = LHS matrix (dense numpy array or scipy sparse matrix). Rows that are 
+            all ZERO (INACTIVE BLOCKS) are left out of the factorization
+  cache = dictionary of factorizations to be reused over the timesteps (optional)
+  key = key of the LHS matrix in the cache, e.g. (xi, yi, well conditions, timestep).
+        When the key changes (well control or timestep changes), the LHS matrix
+        is refactorized. The factorization of a key is also checked against the 
+        fingerprint of the matrix ('lhs_fingerprint'), and refactorized if the 
+        matrix has changed (e.g. new properties) under the same key
+  cache_size = maximum number of factorizations and preconditioners kept in the 
+               cache (as 'solve_pressure_iterative2d', the oldest is removed first)
+  fingerprint = fingerprint of the LHS matrix ('lhs_fingerprint'), if already 
+                calculated when the matrix is assembled. Hashing the matrix is 
+                O(nnz), so the simulators calculate it once per assembly
+
+  Output:
+
+  lu = factorization (dictionary of the LU factors and the mask of ACTIVE BLOCKS)
+  """
+  import numpy as np
+  from scipy.sparse import issparse
+
+  if cache is not None:
+    if fingerprint is None:
+      fingerprint = lhs_fingerprint(lhs_mat)
+    if key in cache and cache[key]['fingerprint'] == fingerprint:
+      return cache[key]
+    cache.pop(key, None)
+
+  if issparse(lhs_mat):
+    from scipy.sparse.linalg import splu
+
+    # rows of sparse LHS matrix without any entry are the inactive blocks
+    lhs_mat = lhs_mat.tocsr()
+    active = lhs_mat.getnnz(axis=1) > 0
+    lu = {'sparse': True, 'active': active, 
+          'lu': splu(lhs_mat[active][:, active].tocsc())}
+  else:
+    from scipy.linalg import lu_factor
+
+    active = ~np.all(lhs_mat == 0, axis=1)
+    lu = {'sparse': False, 'active': active,
+          'lu': lu_factor(lhs_mat[np.ix_(active, active)])}
+
+  if cache is not None:
+    # remove the oldest factorization if the cache is full
+    lu['fingerprint'] = fingerprint
+    _cache_store(cache, key, lu, cache_size)
+
+  return lu
+
+def solve_factorized(lu, rhs_mat):
+  """
+  Solve the pressure from the LU factorization (from 'factorize_lhs') and RHS matrix
+
+  Output:
+
+  p_sol = pressure solution of the ACTIVE BLOCKS (1D array)
+  """
+  import numpy as np
+
+  rhs_mat = np.asarray(rhs_mat, dtype='float64').reshape(len(lu['active']), -1)
+  rhs_mat = rhs_mat[lu['active']]
+
+  if lu['sparse']:
+    p_sol = lu['lu'].solve(rhs_mat)
+  else:
+    from scipy.linalg import lu_solve
+    p_sol = lu_solve(lu['lu'], rhs_mat)
+
+  return p_sol.T.reshape(-1)
+
+def solve_pressure_irregular2d(lhs_mat, rhs_mat, x, cache=None, key=None, block_active=None, 
+                               fingerprint=None):
   """
   Process the LHS and RHS matrix, solve the matrix to get pressure solution,
   and set up new pressure solution matrix including the INACTIVE BLOCKS
-  (N.b.: have np.linalg.inv inside)
+  (dense matrix without cache is solved with np.linalg.solve)
+
+  lhs_mat can be a dense matrix (from 'fill2d_lhs_mat') or a scipy sparse 
+  matrix (from 'lhs_mat2d_sparse'), which is solved with a sparse LU factorization
+
+  cache, key = factorization cache and key of the LHS matrix (see 'factorize_lhs').
+  If given, the LHS matrix is factorized once and reused over the timesteps, 
+  as long as the matrix is the same ('lhs_fingerprint')
+  fingerprint = fingerprint of the LHS matrix, if already calculated
+
+  block_active = block index of ACTIVE BLOCKS (from 'active_cell_map'). If given, 
+  LHS and RHS matrix are in the compressed numbering of ACTIVE BLOCKS, and the 
+  solution is scattered back to the whole grid with this index
   """
   import numpy as np
-  from gridding import fill_active_blocks
+  from scipy.sparse import issparse
+  from gridding import fill_active_blocks, scatter_active_blocks
+
+  if issparse(lhs_mat) or cache is not None:
+    # solve the pressure from the (cached) LU factorization
+    lu = factorize_lhs(lhs_mat, cache, key, fingerprint=fingerprint)
+    p_sol = solve_factorized(lu, rhs_mat)
+
+    # set up pressure matrix including the INACTIVE BLOCKS
+    if block_active is not None:
+      return scatter_active_blocks(p_sol, block_active, x.shape[0], x.shape[1])
+    p_sol = fill_active_blocks(p_sol, x)
+    return p_sol
 
   # get indexes of the rows from LHS matrix that contain all ZERO (inactive blocks)
   indexes = np.where(np.all(lhs_mat == 0, axis=1))[0]
@@ -423,3 +734,765 @@ def solve_pressure_irregular2d(lhs_mat, rhs_mat, x):
   p_sol = fill_active_blocks(p_sol, x)    
 
   return p_sol
+
+def lhs_mat2d_sparse(bound_loc, px_min, px_plus, py_min, py_plus, p, active_index=None):
+  """
+  Assemble the LHS matrix as a sparse pentadiagonal matrix (CSR format)
+  For 2D reservoir
+
+  The five diagonals are built from the whole-grid arrays in one vectorized 
+  pass, so memory grows with the number of blocks (N) instead of N x N.
+  The ordering of the blocks is the same as 'block_index' (and 'fill2d_lhs_mat')
+
+  Input:
+
+  bound_loc = location of block coded (13, 14, 23, 24, etc.), NaN for INACTIVE BLOCKS (2D array)
+  px_min, px_plus, py_min, py_plus, p = LHS coefficients of each block 
+                                        (2D arrays, from 'lhs_coeffs2d_grid')
+  active_index = index of ACTIVE BLOCKS in compressed numbering (from 'active_cell_map').
+                 If given, the matrix is assembled for the ACTIVE BLOCKS only
+
+  Output:
+
+  lhs_mat = LHS matrix (scipy sparse CSR matrix, N x N). Rows and columns of the 
+            INACTIVE BLOCKS are empty. If 'active_index' is given, the matrix is 
+            N_active x N_active in the compressed numbering
+  """
+  import numpy as np
+  from scipy.sparse import coo_matrix
+  from boundary import boundary2d_sides
+
+  xi, yi = bound_loc.shape
+  active = bound_loc == bound_loc
+  sides = boundary2d_sides(bound_loc)
+
+  # block index (0, 1, 2, ...) in the same order as 'block_index'
+  index = np.arange(xi * yi).reshape((xi, yi), order='F')
+
+  # p coefficient (main diagonal)
+  diag = np.broadcast_to(p, (xi, yi))
+  rows, cols, vals = [index[active]], [index[active]], [diag[active]]
+
+  # px_min (block i-1), px_plus (block i+1), py_min (block i-xi), py_plus (block i+xi)
+  # only for sides that are not boundaries and neighbor blocks that are ACTIVE
+  neighbors = [(px_min, -1, 0, 0), (px_plus, 1, 0, 1), (py_min, 0, -1, 2), (py_plus, 0, 1, 3)]
+
+  for coeff, di, dj, k in neighbors:
+    mask = active & ~sides[:,:,k]
+    neighbor_active = np.zeros((xi, yi), dtype=bool)
+    neighbor_active[max(-di, 0):xi - max(di, 0), max(-dj, 0):yi - max(dj, 0)] = \
+      active[max(di, 0):xi + min(di, 0), max(dj, 0):yi + min(dj, 0)]
+    mask = mask & neighbor_active
+
+    rows.append(index[mask])
+    cols.append(index[mask] + di + dj * xi)
+    vals.append(np.broadcast_to(coeff, (xi, yi))[mask])
+
+  rows, cols, vals = np.concatenate(rows), np.concatenate(cols), np.concatenate(vals)
+  n = xi * yi
+
+  if active_index is not None:
+    # renumber the blocks to the compressed numbering of ACTIVE BLOCKS
+    active_index = active_index.reshape(-1, order='F')
+    rows, cols = active_index[rows], active_index[cols]
+    n = np.sum(active_index >= 0)
+
+  lhs_mat = coo_matrix((vals, (rows, cols)), shape=(n, n)).tocsr()
+  return lhs_mat
+
+def lhs_coeffs3d_grid(boundary_grid, well_table, T_array, 
+                      solver='slicomp', reservoir_input=None, timestep=1):
+  """
+  Calculate the Left-hand side (LHS) coefficients of the neighbors at side 
+  1 to 6 and of p, of the whole grid at once (as 'lhs_coeffs2d_grid')
+  3D reservoir
+
+  Input:
+
+  boundary_grid = boundary information of the whole grid (from 'boundary3d_grid')
+  well_table = well table (from 'well_table')
+  T_array = transmissibilities of each block (from 'transmissibility3d_grid')
+
+  Output:
+
+  coeffs = coefficients of the neighbors at side 1 to 6 of each block 
+           (4D array, xi x yi x zi x 6). The coefficients of the boundary sides are 0
+  p = coefficient of p of each block (3D array)
+  """
+  import numpy as np
+  from wellblock import well_source_terms
+  from kernels import accumulation_term
+
+  shape = T_array.shape[:3]
+  sides = boundary_grid['type'] != ''
+
+  " Well term "
+  A, q = well_source_terms(well_table, np.prod(shape))
+  A = A.reshape(shape, order='F')
+
+  " Calculate coefficients "
+  coeffs = np.where(sides, 0, T_array)
+  p = -(A + np.sum(T_array, axis=-1))
+
+  " SOLVER "
+  if solver=='slicomp':
+    Vb = reservoir_input['dx'] * reservoir_input['dy'] * reservoir_input['dz']
+    ct = reservoir_input['cpore'] + reservoir_input['cfluid']
+    rhs_term = accumulation_term(Vb, reservoir_input['poro'], ct, reservoir_input['B'], timestep)
+
+    # modify coefficient of p
+    p = p - rhs_term
+
+  p = np.broadcast_to(p, shape)
+  return coeffs, p
+
+def rhs_constant3d_grid(boundary_grid, well_table, potential, 
+                        dx, dy, dz, kx, ky, kz, mu, B, solver='slicomp',
+                        p_initial=None, reservoir_input=None, 
+                        timestep=1):
+  """
+  Calculate the Right-hand side (RHS) constants of the whole grid at once 
+  (as 'rhs_constant2d_grid')
+  3D reservoir
+
+  Input:
+
+  boundary_grid = boundary information of the whole grid (from 'boundary3d_grid')
+  with the boundary transmissibilities 'T' (4D array, xi x yi x zi x 6)
+  well_table = well table (from 'well_table')
+  potential = potential term of each block (3D array, from 'potential_term3d')
+  p_initial = pressure of the previous timestep (3D array), for 'slicomp'
+
+  Output:
+
+  rhs = RHS constants of each block (3D array)
+  """
+  import numpy as np
+  from wellblock import well_source_terms
+  from kernels import accumulation_term
+
+  bound_type = boundary_grid['type']
+  bound_value = boundary_grid['value']
+  bound_T = boundary_grid['T']
+
+  " Transmissibility term "
+  # flow at constant pressure gradient boundaries. Negative at the west, south, 
+  # and top sides (1, 3, 5), positive at the east, north, and bottom sides (2, 4, 6).
+  # The gradient is of the potential (p - γZ) normal to the boundary, so a zero 
+  # gradient is no flow, also at the boundary blocks of a layered or tilted reservoir
+  Tx_grad = .001127 * (kx * dy * dz) / (mu * B)
+  Ty_grad = .001127 * (ky * dx * dz) / (mu * B)
+  Tz_grad = .001127 * (kz * dx * dy) / (mu * B)
+  T_grad = np.stack(np.broadcast_arrays(-Tx_grad, Tx_grad, -Ty_grad, Ty_grad, 
+                                        -Tz_grad, Tz_grad), axis=-1)
+  grad_term = T_grad * bound_value
+
+  rhs1 = np.where(bound_type == 'constant_pressure', bound_T * bound_value, 0)
+  rhs1 = np.where(bound_type == 'constant_pressuregrad', grad_term, rhs1)
+  rhs1 = np.where(bound_type == 'constant_rate', bound_value, rhs1)
+  rhs1 = np.sum(rhs1, axis=-1)
+
+  " Well term "
+  shape = potential.shape
+  _, A = well_source_terms(well_table, np.prod(shape))
+  A = A.reshape(shape, order='F')
+
+  # calculate RHS constants. The depth is positive downward, so the flow from 
+  # the neighbors is T * ((p_l - p) - γ * (Z_l - Z)), as in the 1D simulation
+  rhs = -(rhs1 + A) + potential
+
+  if solver=='slicomp':
+    # add term 
+    Vb = reservoir_input['dx'] * reservoir_input['dy'] * reservoir_input['dz']
+    ct = reservoir_input['cpore'] + reservoir_input['cfluid']
+    rhs_term = accumulation_term(Vb, reservoir_input['poro'], ct, reservoir_input['B'], timestep)
+    rhs = rhs - (rhs_term * p_initial)
+
+  return rhs
+
+def lhs_mat3d_sparse(coeffs, p):
+  """
+  Assemble the LHS matrix as a sparse 7-point (heptadiagonal) matrix (CSR format)
+  For 3D reservoir
+
+  The blocks are ordered x first, then y, then z (block i + j * xi + k * xi * yi).
+  The neighbors at side 1 to 6 are the off-diagonals -1, +1, -xi, +xi, -xi*yi, 
+  and +xi*yi. The diagonals are built directly from the coefficient arrays, 
+  without row and column index arrays, so 1M blocks fit in memory
+
+  Input:
+
+  coeffs, p = LHS coefficients of each block (from 'lhs_coeffs3d_grid')
+
+  Output:
+
+  lhs_mat = LHS matrix (scipy sparse CSR matrix, N x N)
+  """
+  import numpy as np
+  from scipy.sparse import diags
+
+  xi, yi, zi = coeffs.shape[:3]
+  n = xi * yi * zi
+
+  def flat(a):
+    # block order (x first, then y, then z)
+    return np.asarray(a, dtype='float64').reshape(-1, order='F')
+
+  offsets, diagonals = [0], [flat(p)]
+
+  # coefficient of the neighbor at the minus side (1, 3, 5) of block m is in 
+  # row m, column m - offset. The plus side (2, 4, 6) in row m, column m + offset.
+  # Boundary sides are 0, so the diagonals do not wrap around the grid
+  for k, offset in [(0, 1), (2, xi), (4, xi * yi)]:
+    if offset >= n:
+      continue
+    offsets = offsets + [-offset, offset]
+    diagonals = diagonals + [flat(coeffs[...,k])[offset:], flat(coeffs[...,k+1])[:-offset]]
+
+  lhs_mat = diags(diagonals, offsets, shape=(n, n), format='csr')
+  lhs_mat.eliminate_zeros()
+  return lhs_mat
+
+def preconditioner2d(lhs_mat, preconditioner='ilu'):
+  """
+  Build the preconditioner of the LHS matrix for the iterative solvers
+  (see 'solve_pressure_iterative2d')
+
+  Input:
+
+  lhs_mat = sparse LHS matrix of the ACTIVE BLOCKS, sign changed to be 
+            positive definite (the diagonal is positive)
+  preconditioner = 'jacobi', 'ilu', 'amg', or None
+
+  * 'jacobi': inverse of the diagonal
+  * 'ilu': incomplete LU factorization with no fill-in, ILU(0)
+  * 'amg': algebraic multigrid. Uses 'pyamg' if installed, otherwise an aggregation 
+           V-cycle (damped Jacobi smoothing, the coarsest blocks solved directly)
+
+  Output:
+
+  M = preconditioner (scipy LinearOperator), None if preconditioner is None
+  """
+  import numpy as np
+  from scipy.sparse import csr_matrix, diags, tril, triu
+  from scipy.sparse.linalg import LinearOperator, splu
+
+  n = lhs_mat.shape[0]
+  lhs_mat = csr_matrix(lhs_mat)
+  diag = lhs_mat.diagonal()
+
+  if preconditioner is None:
+    return None
+
+  if preconditioner == 'jacobi':
+    return LinearOperator((n, n), matvec=lambda r: r / diag)
+
+  if preconditioner == 'ilu':
+    # ILU(0) in diagonal form, M = (D + L) D^-1 (D + U), where L and U are the
+    # strict lower and upper LHS matrix. Equals ILU(0) for 5-point (and 7-point) 
+    # stencils, and stays symmetric for the conjugate gradient
+    lower_mat, upper_T = tril(lhs_mat, -1).tocsr(), triu(lhs_mat, 1).T.tocsr()
+    lower_mat.sort_indices()
+    upper_T.sort_indices()
+
+    # d_i = a_ii - Σ a_ij * a_ji / d_j over the lower neighbors j of block i. 
+    # The blocks are solved level by level (wavefront): a block is ready when 
+    # the d of all its lower neighbors are solved, so each level is one array operation
+    W = csr_matrix((lower_mat.data * upper_T.data, lower_mat.indices, lower_mat.indptr), shape=(n, n))
+    W_T = W.T.tocsr()
+    waiting = np.diff(W.indptr)
+    d = diag.copy()
+    level = np.where(waiting == 0)[0]
+    while level.size > 0:
+      rows = W[level]
+      terms = rows.data / d[rows.indices]
+      d[level] = d[level] - np.bincount(np.repeat(np.arange(level.size), np.diff(rows.indptr)), 
+                                        terms, level.size)
+      # the upper neighbors of this level, ready when all their lower neighbors are solved
+      upper, count = np.unique(W_T[level].indices, return_counts=True)
+      waiting[upper] = waiting[upper] - count
+      level = upper[waiting[upper] == 0]
+
+    # triangular factors are solved by sparse LU without reordering (no fill-in)
+    options = dict(permc_spec='NATURAL', diag_pivot_thresh=0, options=dict(SymmetricMode=True))
+    lower = splu((tril(lhs_mat, -1) + diags(d)).tocsc(), **options)
+    upper = splu((triu(lhs_mat, 1) + diags(d)).tocsc(), **options)
+    return LinearOperator((n, n), matvec=lambda r: upper.solve(d * lower.solve(r)))
+
+  if preconditioner == 'amg':
+    try:
+      import pyamg
+      return pyamg.smoothed_aggregation_solver(lhs_mat).aspreconditioner(cycle='V')
+    except ImportError:
+      pass
+
+    def aggregation(mat):
+      # piecewise-constant prolongation of the aggregates of the blocks of a 
+      # matrix. The roots of the aggregates are a maximal independent set of the 
+      # graph of the neighboring blocks (Luby's algorithm, random weights of a fixed seed)
+      m = mat.shape[0]
+      graph = (mat - diags(mat.diagonal())).tocsr()
+      graph.eliminate_zeros()
+      nonempty = np.diff(graph.indptr) > 0
+
+      def neighbor_max(values):
+        # maximum of the values of the neighbors of each block (-inf if none)
+        out = np.full(m, -np.inf)
+        if graph.nnz > 0:
+          out[nonempty] = np.maximum.reduceat(values[graph.indices], graph.indptr[:-1][nonempty])
+        return out
+
+      weight = np.random.default_rng(0).random(m)
+      state = np.zeros(m, dtype=int)  # 0 undecided, 1 root, -1 not root
+      while np.any(state == 0):
+        undecided = state == 0
+        root = undecided & (weight > neighbor_max(np.where(undecided, weight, -np.inf)))
+        state[root] = 1
+        state[undecided & (neighbor_max(np.where(root, 1., 0.)) > 0)] = -1
+
+      # each root is aggregated with its neighbors, a block next to several 
+      # roots joins the root of the largest number
+      roots = np.where(state == 1)[0]
+      aggregate = np.full(m, -1.)
+      aggregate[roots] = np.arange(roots.size)
+      aggregate = np.where(state == 1, aggregate, neighbor_max(aggregate)).astype(int)
+      return csr_matrix((np.ones(m), (np.arange(m), aggregate)), shape=(m, roots.size))
+
+    # levels of coarser LHS matrices, until the coarsest is solved directly
+    levels = []
+    mat = lhs_mat
+    while True:
+      P = aggregation(mat)
+      levels.append((mat, mat.diagonal(), P))
+      mat = (P.T @ mat @ P).tocsr()
+      if mat.shape[0] <= 2000 or mat.shape[0] > 0.8 * P.shape[0]:
+        break
+    coarse = splu(mat.tocsc())
+    omega = 2 / 3
+
+    def cycle(r, level=0):
+      # V-cycle: pre-smoothing, coarse correction, post-smoothing
+      if level == len(levels):
+        return coarse.solve(r)
+      mat, d, P = levels[level]
+      p = omega * r / d
+      p = p + P @ cycle(P.T @ (r - mat @ p), level + 1)
+      p = p + omega * (r - mat @ p) / d
+      return p
+
+    return LinearOperator((n, n), matvec=cycle)
+
+def solve_pressure_iterative2d(lhs_mat, rhs_mat, x, method='cg', preconditioner='ilu', 
+                               tol=1e-8, maxiter=None, p_guess=None, report=None,
+                               cache=None, key=None, block_active=None, cache_size=4,
+                               fingerprint=None):
+  """
+  Solve the pressure with a Krylov iterative solver, and set up new pressure 
+  solution matrix including the INACTIVE BLOCKS (as 'solve_pressure_irregular2d')
+  For large 2D reservoir, where direct solvers run out of memory
+
+  Input:
+
+  lhs_mat = sparse LHS matrix (from 'lhs_mat2d_sparse')
+  rhs_mat = RHS matrix
+  x = mesh in x-direction (NaN for INACTIVE BLOCKS)
+  method = 'cg' (conjugate gradient, for the symmetric 'incompressible' and 
+           'slicomp' matrix), 'bicgstab', or 'gmres'
+  preconditioner = 'jacobi', 'ilu', 'amg', or None (see 'preconditioner2d')
+  tol = relative tolerance of the residual
+  maxiter = maximum number of iterations
+  p_guess = initial guess of pressure, e.g. pressure of the previous timestep (2D array)
+  report = list where the number of iterations and residual of the solve are appended
+  cache, key = dictionary and key to reuse the preconditioner over the timesteps
+               (rebuilt if the matrix changes under the key, see 'lhs_fingerprint')
+  block_active = block index of ACTIVE BLOCKS, if LHS and RHS matrix are in the 
+                 compressed numbering (see 'solve_pressure_irregular2d')
+  cache_size = maximum number of preconditioners and factorizations kept in the 
+               cache (as 'factorize_lhs', the oldest is removed first)
+  fingerprint = fingerprint of the LHS matrix, if already calculated (as 'factorize_lhs')
+
+  Output:
+
+  p_sol = pressure solution (2D array)
+  """
+  import inspect
+  import numpy as np
+  from scipy.sparse.linalg import cg, bicgstab, gmres
+  from gridding import fill_active_blocks, scatter_active_blocks
+
+  if cache is not None and fingerprint is None:
+    fingerprint = lhs_fingerprint(lhs_mat)
+  if cache is not None and cache.get((key, preconditioner), (None,))[0] == fingerprint:
+    fingerprint, active, A, M = cache[(key, preconditioner)]
+  else:
+    # rows of sparse LHS matrix without any entry are the inactive blocks.
+    # Sign of the LHS matrix is changed, so the matrix is positive definite
+    lhs_mat = lhs_mat.tocsr()
+    active = lhs_mat.getnnz(axis=1) > 0
+    A = -lhs_mat[active][:, active]
+    M = preconditioner2d(A, preconditioner)
+    if cache is not None:
+      _cache_store(cache, (key, preconditioner), (fingerprint, active, A, M), cache_size)
+
+  b = -np.asarray(rhs_mat, dtype='float64').reshape(-1)[active]
+
+  # warm start from the initial guess
+  x0 = None
+  if p_guess is not None:
+    x0 = np.asarray(p_guess, dtype='float64').reshape(-1, order='F')
+    x0 = x0[block_active] if block_active is not None else x0[active]
+
+  iterations = []
+  solvers = {'cg': cg, 'bicgstab': bicgstab, 'gmres': gmres}
+  solve = solvers[method]
+  kwargs = {'x0': x0, 'M': M, 'maxiter': maxiter, 'callback': iterations.append}
+
+  # tolerance is called 'rtol' in newer scipy
+  if 'rtol' in inspect.signature(solve).parameters:
+    kwargs['rtol'] = tol
+  else:
+    kwargs['tol'] = tol
+  if method == 'gmres':
+    kwargs['callback_type'] = 'pr_norm'
+
+  p_sol, info = solve(A, b, atol=0., **kwargs)
+
+  if report is not None:
+    residual = np.linalg.norm(b - A @ p_sol) / np.linalg.norm(b)
+    report.append({'method': method, 'preconditioner': preconditioner, 
+                   'iterations': len(iterations), 'residual': residual, 
+                   'converged': info == 0})
+
+  # set up pressure matrix including the INACTIVE BLOCKS
+  if block_active is not None:
+    return scatter_active_blocks(p_sol, block_active, x.shape[0], x.shape[1])
+  p_sol = fill_active_blocks(p_sol, x)
+  return p_sol
+
+def adaptive_timestep(dt, dp, control, dt_old=None, dp_old=None, converged=True):
+  """
+  Adaptive timestep control of the 'slicomp' and 'compressible' simulation.
+  Accept or reject the timestep, and calculate the size of the next timestep
+
+  The timestep is rejected (and cut) if the Newton iterations did not converge, 
+  or the maximum pressure change is larger than 'dp_max'. The next timestep is 
+  scaled by dp_target / max(ΔP), and by sqrt(lte_target / LTE) where LTE is the 
+  local truncation error estimated from the previous timestep, limited to 
+  [cut, growth] times the timestep.
+
+  The timestep is rounded down to dt_initial * 2^k, so the timesteps take only 
+  a few sizes and the LU factorization of each size is reused from the cache
+
+  Input:
+
+  dt = size of the timestep (day)
+  dp = pressure change of the timestep (1D array)
+  control = timestep control options (as Python dictionary format)
+  contains: dt_initial, dt_min, dt_max (day), dp_target, dp_max (psi), 
+  lte_target (psi, or None), growth, cut
+  dt_old, dp_old = size and pressure change of the previous accepted timestep
+  converged = False if the Newton iterations did not converge
+
+  Output:
+
+  accept = True if the timestep is accepted
+  dt_next = size of the next timestep (day)
+  """
+  import numpy as np
+
+  dp_step = np.max(np.abs(dp)) if len(dp) > 0 else 0.
+
+  # scale of the next timestep from the pressure change
+  factor = control['dp_target'] / dp_step if dp_step > 0 else control['growth']
+
+  # scale from the local truncation error, LTE = dt² / 2 * |d²p/dt²|
+  if control.get('lte_target') is not None and dp_old is not None:
+    lte = dt**2 / (dt + dt_old) * np.max(np.abs(dp / dt - dp_old / dt_old))
+    if lte > 0:
+      factor = min(factor, np.sqrt(control['lte_target'] / lte))
+
+  accept = converged and dp_step <= control['dp_max']
+  if not converged:
+    factor = control['cut']
+  factor = min(max(factor, control['cut']), control['growth'])
+
+  # a timestep at the minimum size can not be cut anymore
+  if dt <= control['dt_min']:
+    accept = True
+
+  # round down to dt_initial * 2^k, within dt_min and dt_max
+  k = np.floor(np.log2(dt * factor / control['dt_initial']) + 1e-9)
+  dt_next = control['dt_initial'] * 2**k
+  dt_next = min(max(dt_next, control['dt_min']), control['dt_max'])
+  return accept, dt_next
+
+def newton_model2d(bound_loc, active_index, boundary_grid, well_table, z_array,
+                   reservoir_input, timestep=1, p_ref=None):
+  """
+  Set up the constant part of the compressible (Newton-Raphson) simulation 
+  in the compressed numbering of ACTIVE BLOCKS: the inter-block faces, the 
+  boundary and well terms, and the sparsity pattern of the Jacobian. 
+  The model is built once, and reused at every Newton iteration and timestep
+  2D reservoir
+
+  The transmissibility is split into the constant geometric factor G and the 
+  mobility 1 / (mu * B), which depends on pressure (see 'newton_system2d')
+
+  Input:
+
+  bound_loc = the boundary location codes, NaN for INACTIVE BLOCKS (2D array)
+  active_index = index of ACTIVE BLOCKS in compressed numbering (from 'active_cell_map')
+  boundary_grid = boundary information of the whole grid (from 'boundary2d_grid')
+  well_table = well table (from 'well_table')
+  z_array = depth of grid blocks (2D array)
+  reservoir_input = reservoir data input as passed by 'read_input'
+  timestep = time increment (day)
+  p_ref = reference pressure of the porosity, e.g. the initial pressure (float or 2D array)
+
+  Output:
+
+  model = compressible model (as Python dictionary format)
+  """
+  import numpy as np
+  from boundary import boundary2d_sides
+  from wellblock import WELL_CONTROL
+  from transmissibility import harmonic_average
+
+  xi, yi = bound_loc.shape
+  dx, dy, dz = reservoir_input['dx'], reservoir_input['dy'], reservoir_input['dz']
+  kx, ky = reservoir_input['kx'], reservoir_input['ky']
+
+  active = bound_loc == bound_loc
+  sides = boundary2d_sides(bound_loc)
+
+  flat_index = active_index.reshape(-1, order='F')
+  block = np.where(flat_index >= 0)[0]
+  n = len(block)
+
+  def compress(prop):
+    # property of the ACTIVE BLOCKS in the compressed numbering
+    return np.broadcast_to(prop, (xi, yi)).reshape(-1, order='F')[block].astype('float64')
+
+  " Inter-block faces "
+
+  # geometric factor of the transmissibility in x and y direction
+  Gx = .001127 * (kx * dy * dz) / dx
+  Gy = .001127 * (ky * dx * dz) / dy
+
+  index = np.arange(xi * yi).reshape((xi, yi), order='F')
+  depth = np.broadcast_to(np.asarray(z_array, dtype='float64'), (xi, yi)).reshape(-1, order='F')
+
+  # faces at the east (2) and north (4) side of each block, between two ACTIVE BLOCKS
+  # the geometric factor of a face is the harmonic average of the two blocks
+  face_a, face_b, face_G = [], [], []
+  for di, dj, k, G in [(1, 0, 1, Gx), (0, 1, 3, Gy)]:
+    neighbor_active = np.zeros((xi, yi), dtype=bool)
+    neighbor_active[:xi - di, :yi - dj] = active[di:, dj:]
+    mask = active & ~sides[:,:,k] & neighbor_active
+
+    G = np.broadcast_to(G, (xi, yi)).reshape(-1, order='F')
+    face_a.append(index[mask])
+    face_b.append(index[mask] + di + dj * xi)
+    face_G.append(harmonic_average(G[face_a[-1]], G[face_b[-1]]))
+
+  face_a, face_b, face_G = np.concatenate(face_a), np.concatenate(face_b), np.concatenate(face_G)
+  face_dz = depth[face_b] - depth[face_a]
+  face_a, face_b = flat_index[face_a], flat_index[face_b]
+
+  " Boundary terms "
+
+  # geometric factor of the boundary at side 1, 2, 3, 4 (half block to the boundary)
+  G_side = np.stack([np.broadcast_to(G, (xi, yi)) for G in [Gx, Gx, Gy, Gy]], axis=-1)
+  sign = np.array([-1, 1, -1, 1])
+
+  bound_type, bound_value = boundary_grid['type'], boundary_grid['value']
+  pressure = bound_type == 'constant_pressure'
+  grad = bound_type == 'constant_pressuregrad'
+  rate = bound_type == 'constant_rate'
+
+  Gb = np.sum(np.where(pressure, 2 * G_side, 0), axis=2)
+  Gb_pb = np.sum(np.where(pressure, 2 * G_side * bound_value, 0), axis=2)
+  Cb = np.sum(np.where(grad, sign * G_side * bound_value, 0), axis=2)
+  qb = np.sum(np.where(rate, bound_value, 0), axis=2)
+
+  " Well terms "
+
+  # wells in the ACTIVE BLOCKS
+  wells = well_table[flat_index[well_table['loc']] >= 0]
+  loc = flat_index[wells['loc']]
+  control, value = wells['control'], wells['value']
+
+  fbhp = control == WELL_CONTROL['constant_fbhp']
+  rate = control == WELL_CONTROL['constant_rate']
+  grad = control == WELL_CONTROL['constant_pressuregrad']
+  C = -(2 * np.pi * .001127 * wells['kh'] * wells['rw'] * wells['h'])
+
+  Jw, Jw_pwf, Cw, qw = np.zeros(n), np.zeros(n), np.zeros(n), np.zeros(n)
+  np.add.at(Jw, loc, np.where(fbhp, wells['Gw'], 0))
+  np.add.at(Jw_pwf, loc, np.where(fbhp, wells['Gw'] * value, 0))
+  np.add.at(Cw, loc, np.where(grad, C * value, 0))
+  np.add.at(qw, loc, np.where(rate, value, 0))
+
+  " Sparsity pattern of the Jacobian (main diagonal, and the two faces) "
+
+  rows = np.concatenate((np.arange(n), face_a, face_b))
+  cols = np.concatenate((np.arange(n), face_b, face_a))
+  order = np.lexsort((cols, rows))
+  indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=n))))
+
+  model = {'n': n, 'face_a': face_a, 'face_b': face_b, 'face_G': face_G, 'face_dz': face_dz,
+           'Gs': compress(Gb) + Jw, 'source': compress(Gb_pb + Cb) + Jw_pwf + Cw, 
+           'rate': compress(qb) + qw,
+           'V': compress(dx * dy * dz) / (5.614583 * timestep), 
+           'poro': compress(reservoir_input['poro']), 'cpore': reservoir_input['cpore'],
+           'p_ref': compress(0 if p_ref is None else p_ref),
+           'order': order, 'indices': cols[order], 'indptr': indptr}
+  return model
+
+def newton_system2d(p, p_old, model, pvt):
+  """
+  Calculate the residual of the flow equations and its analytic Jacobian 
+  for the compressible simulation, where B, mu, and rho depend on pressure
+  2D reservoir
+
+  For the face between block a and b, the flow rate to block a is
+  F = G * (λa + λb) / 2 * (pb - pa - γ (Zb - Za)), λ = 1 / (mu * B),
+  with the depth Z positive downward
+
+  The residual of each block is the sum of the flow from the neighboring blocks, 
+  boundaries, and wells, minus the accumulation 
+  Vb / (5.614583 * Δt) * ((poro / B) - (poro / B)_old), 
+  poro = poro_ref * (1 + cpore * (p - p_ref))
+
+  Input:
+
+  p, p_old = pressure of the ACTIVE BLOCKS at the current iteration, and at the 
+             previous timestep (1D array, compressed numbering)
+  model = compressible model (from 'newton_model2d')
+  pvt = PVT table (e.g. from 'gas_pvt_table' or 'liquid_pvt_table')
+
+  Output:
+
+  R = residual (1D array)
+  J = Jacobian, dR / dp (scipy sparse CSR matrix). Its sparsity pattern is 
+      the pattern of the model, so it is not rebuilt at every iteration
+  """
+  import numpy as np
+  from scipy.sparse import csr_matrix
+  from pvt_correlation import pvt_properties
+
+  n = model['n']
+  a, b = model['face_a'], model['face_b']
+  G, dz = model['face_G'], model['face_dz']
+
+  # mobility and its derivative
+  B, mu, rho, dB, dmu, drho = pvt_properties(pvt, p)
+  lam = 1 / (mu * B)
+  dlam = -(dmu * B + mu * dB) * lam**2
+
+  " Flow between blocks "
+  gamma = .21584E-3 * 32.174
+  dphi = p[b] - p[a] - gamma * 0.5 * (rho[a] + rho[b]) * dz
+  lam_face = 0.5 * (lam[a] + lam[b])
+  F = G * lam_face * dphi
+
+  dF_a = G * (0.5 * dlam[a] * dphi + lam_face * (-1 - gamma * 0.5 * drho[a] * dz))
+  dF_b = G * (0.5 * dlam[b] * dphi + lam_face * (1 - gamma * 0.5 * drho[b] * dz))
+
+  R = np.bincount(a, F, n) - np.bincount(b, F, n)
+  diag = np.bincount(a, dF_a, n) - np.bincount(b, dF_b, n)
+
+  " Boundaries and wells "
+  q = lam * (model['source'] - model['Gs'] * p) + model['rate']
+  dq = dlam * (model['source'] - model['Gs'] * p) - lam * model['Gs']
+
+  " Accumulation "
+  B_old = pvt_properties(pvt, p_old)[0]
+  poro = model['poro'] * (1 + model['cpore'] * (p - model['p_ref']))
+  poro_old = model['poro'] * (1 + model['cpore'] * (p_old - model['p_ref']))
+
+  acc = model['V'] * (poro / B - poro_old / B_old)
+  dacc = model['V'] * (model['poro'] * model['cpore'] / B - poro * dB / B**2)
+
+  R = R + q - acc
+  diag = diag + dq - dacc
+
+  vals = np.concatenate((diag, dF_b, -dF_a))
+  J = csr_matrix((vals[model['order']], model['indices'], model['indptr']), shape=(n, n))
+  return R, J
+
+def solve_pressure_newton2d(p_old, model, pvt, p_guess=None, tol=1e-6, maxiter=20,
+                            dp_max=1000, report=None):
+  """
+  Solve the pressure of one timestep of the compressible simulation 
+  with the Newton-Raphson method
+  2D reservoir
+
+  Each Newton update is limited to 'dp_max' (damping), then shortened by 
+  backtracking until the residual decreases (line search). If the residual 
+  does not decrease after 8 halvings, the iterations stop without convergence 
+  (the timestep is cut by 'adaptive_timestep')
+
+  Input:
+
+  p_old = pressure of the ACTIVE BLOCKS at the previous timestep (1D array, compressed numbering)
+  model = compressible model (from 'newton_model2d')
+  pvt = PVT table (e.g. from 'gas_pvt_table' or 'liquid_pvt_table')
+  p_guess = initial guess of pressure. Default is 'p_old'
+  tol = tolerance of the residual (relative to the residual of the initial guess) 
+        and of the full Newton update (relative to the pressure)
+  maxiter = maximum number of Newton iterations of the timestep
+  dp_max = maximum pressure change of a Newton update (psi)
+  report = list where the number of iterations and residual of the timestep are appended
+
+  Output:
+
+  p = pressure of the ACTIVE BLOCKS (1D array, compressed numbering), the last 
+      iterate of which the residual is reported
+  """
+  import numpy as np
+  from scipy.sparse.linalg import splu
+
+  p_old = np.asarray(p_old, dtype='float64')
+  p = p_old.copy() if p_guess is None else np.asarray(p_guess, dtype='float64').copy()
+
+  R, J = newton_system2d(p, p_old, model, pvt)
+  norm0 = norm = np.linalg.norm(R, np.inf)
+
+  iterations = 0
+  converged = norm0 == 0
+  while not converged and iterations < maxiter:
+    iterations += 1
+
+    # Newton update, damped to the maximum pressure change
+    dp = splu(J.tocsc()).solve(-R)
+    damped = np.max(np.abs(dp)) > dp_max
+    dp = dp * min(1, dp_max / np.max(np.abs(dp)))
+
+    # backtracking line search on the residual (Armijo condition)
+    alpha, accepted = 1, False
+    for k in range(8):
+      R_new, J_new = newton_system2d(p + alpha * dp, p_old, model, pvt)
+      norm_new = np.linalg.norm(R_new, np.inf)
+      if norm_new <= (1 - 1e-4 * alpha) * norm:
+        accepted = True
+        break
+      alpha = alpha / 2
+
+    if not accepted:
+      # no decrease of the residual, p and its residual are kept
+      break
+
+    p = p + alpha * dp
+    R, J, norm = R_new, J_new, norm_new
+
+    # converged if the residual is small, or if the full Newton update is small
+    # (not a step shortened by damping or backtracking)
+    converged = norm <= tol * norm0 or (alpha == 1 and not damped and 
+                                        np.max(np.abs(dp)) <= tol * np.max(np.abs(p)))
+
+  if report is not None:
+    report.append({'method': 'newton', 'iterations': iterations, 
+                   'residual': norm / norm0 if norm0 > 0 else 0., 
+                   'converged': bool(converged)})
+  return p
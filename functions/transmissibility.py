@@ -49,3 +49,112 @@ def transmissibility2d(dx, dy, dz, kx, ky, mu, B):
   Ty_min = .001127 * (ky * Ay) / (mu * B * dy)
   Ty_plus = Ty_min   
   return Tx_min, Tx_plus, Ty_min, Ty_plus
+
+def harmonic_average(T_a, T_b):
+  """
+  Transmissibility between two neighboring blocks, the harmonic average of the 
+  transmissibilities of the two blocks (the two half blocks in series)
+
+  T = 2 * T_a * T_b / (T_a + T_b), exactly T_a if both blocks are the same
+
+  Input:
+
+  T_a, T_b = transmissibilities (or geometric factors) of the two blocks (float or array)
+  """
+  import numpy as np
+
+  with np.errstate(divide='ignore', invalid='ignore'):
+    return np.where(T_a == T_b, T_a, 2 * T_a * T_b / (T_a + T_b))
+
+def transmissibility2d_grid(boundary_grid, dx, dy, dz, kx, ky, mu, B):
+  """
+  Calculate the transmissibilities of each grid block for the whole grid at once
+  (inter-block transmissibilities, and boundary transmissibilities for constant 
+  pressure B.C.)
+  2D reservoir
+
+  Input:
+
+  boundary_grid = boundary information of the whole grid (from 'boundary2d_grid')
+  dx, dy, dz, kx, ky, mu, B = grid properties (float, or 2D array of each block)
+
+  Output:
+
+  T_array = transmissibilities (Tx_min, Tx_plus, Ty_min, Ty_plus) of each block,
+            with the boundary transmissibility at the boundary sides (3D array, xi x yi x 4).
+            For heterogeneous grids, the inter-block transmissibility is the harmonic 
+            average of the two blocks (see 'harmonic_average')
+  """
+  import numpy as np
+  from kernels import stencil_transmissibility2d
+
+  bound_type = boundary_grid['type']
+  xi, yi = bound_type.shape[0], bound_type.shape[1]
+
+  # transmissibilities of each block (as 'transmissibility2d' of each block)
+  T_array = stencil_transmissibility2d((xi, yi), dx, dy, dz, kx, ky, mu, B)
+
+  # inter-block transmissibilities of the faces in x and y direction
+  Tx_face = harmonic_average(T_array[:-1,:,1], T_array[1:,:,0])
+  Ty_face = harmonic_average(T_array[:,:-1,3], T_array[:,1:,2])
+  T_array[:-1,:,1], T_array[1:,:,0] = Tx_face, Tx_face
+  T_array[:,:-1,3], T_array[:,1:,2] = Ty_face, Ty_face
+
+  # boundary transmissibilities. Zero if B.C. is not constant pressure
+  Tx_b = np.broadcast_to(.001127 * (kx * dy * dz) / (mu * B * 0.5 * dx), (xi, yi))
+  Ty_b = np.broadcast_to(.001127 * (ky * dx * dz) / (mu * B * 0.5 * dy), (xi, yi))
+  T_b = np.stack([Tx_b, Tx_b, Ty_b, Ty_b], axis=-1)
+
+  T_array = np.where(bound_type == 'constant_pressure', T_b, T_array)
+  T_array = np.where((bound_type != '') & (bound_type != 'constant_pressure'), 0, T_array)
+
+  return T_array.astype('float64')
+
+def transmissibility3d_grid(boundary_grid, dx, dy, dz, kx, ky, kz, mu, B):
+  """
+  Calculate the transmissibilities of each grid block for the whole grid at once
+  (inter-block transmissibilities, and boundary transmissibilities for constant 
+  pressure B.C.)
+  3D reservoir
+
+  Input:
+
+  boundary_grid = boundary information of the whole grid (from 'boundary3d_grid')
+  dx, dy, dz, kx, ky, kz, mu, B = grid properties (float, or 3D array of each block)
+
+  Output:
+
+  T_array = transmissibilities (Tx_min, Tx_plus, Ty_min, Ty_plus, Tz_min, Tz_plus) 
+            of each block, with the boundary transmissibility at the boundary sides 
+            (4D array, xi x yi x zi x 6). For heterogeneous grids, the inter-block 
+            transmissibility is the harmonic average of the two blocks
+  """
+  import numpy as np
+
+  bound_type = boundary_grid['type']
+  shape = bound_type.shape[:3]
+
+  # transmissibilities of each block
+  Tx_min, Tx_plus, Ty_min, Ty_plus = transmissibility2d(dx, dy, dz, kx, ky, mu, B)
+  Tz = .001127 * (kz * dx * dy) / (mu * B * dz)
+  T = [Tx_min, Tx_plus, Ty_min, Ty_plus, Tz, Tz]
+  T_array = np.stack([np.broadcast_to(t, shape) for t in T], axis=-1)
+
+  # inter-block transmissibilities of the faces in x, y, and z direction
+  Tx_face = harmonic_average(T_array[:-1,:,:,1], T_array[1:,:,:,0])
+  Ty_face = harmonic_average(T_array[:,:-1,:,3], T_array[:,1:,:,2])
+  Tz_face = harmonic_average(T_array[:,:,:-1,5], T_array[:,:,1:,4])
+  T_array[:-1,:,:,1], T_array[1:,:,:,0] = Tx_face, Tx_face
+  T_array[:,:-1,:,3], T_array[:,1:,:,2] = Ty_face, Ty_face
+  T_array[:,:,:-1,5], T_array[:,:,1:,4] = Tz_face, Tz_face
+
+  # boundary transmissibilities. Zero if B.C. is not constant pressure
+  Tx_b = np.broadcast_to(.001127 * (kx * dy * dz) / (mu * B * 0.5 * dx), shape)
+  Ty_b = np.broadcast_to(.001127 * (ky * dx * dz) / (mu * B * 0.5 * dy), shape)
+  Tz_b = np.broadcast_to(.001127 * (kz * dx * dy) / (mu * B * 0.5 * dz), shape)
+  T_b = np.stack([Tx_b, Tx_b, Ty_b, Ty_b, Tz_b, Tz_b], axis=-1)
+
+  T_array = np.where(bound_type == 'constant_pressure', T_b, T_array)
+  T_array = np.where((bound_type != '') & (bound_type != 'constant_pressure'), 0, T_array)
+
+  return T_array.astype('float64')
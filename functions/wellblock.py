@@ -51,3 +51,155 @@ def fraction_wellblock_geometric_factor(dx, dy, kx, ky, s, rw, h, well_config):
 
   Gw = fr * (2 * np.pi * .001127 * kh * h) / (np.log(r_eq / rw) + s)  
   return kh, r_eq, Gw
+
+# codes of the well operating conditions in the well table
+# ('no_flow' as written in some input files, is a shut-in well)
+WELL_CONTROL = {'shutin': 0, 'no_flow': 0, 'constant_fbhp': 1, 'constant_rate': 2, 
+                'constant_pressuregrad': 3}
+
+def well_table(wells, reservoir_input):
+  """
+  Build a compact well table (structured array, one record per well)
+  from the well information of 'read_input'. The table is built once before
+  the simulation, then the well terms are scattered to the grid blocks 
+  with 'well_source_terms'
+
+  Input:
+
+  wells = well information (as Python dictionary format) as passed by 'read_input'
+  reservoir_input = reservoir data input as passed by 'read_input'. The properties
+                    (dx, dy, dz, kx, ky, mu, B) can be float, or an array of each block
+
+  Output:
+
+  table = well table (structured array) with fields:
+  * name (well name)
+  * loc (index of the wellblock, 0, 1, 2, ... in the same order as 'block_index',
+    x first, then y, then z)
+  * Gw (wellblock geometric factor)
+  * mu, B (fluid viscosity and FVF in the wellblock)
+  * rw (well radius in ft), kh (horizontal permeability), h (wellblock thickness)
+  * control (code of the operating condition, see WELL_CONTROL)
+  * value (value of the operating condition)
+  """
+  import numpy as np
+
+  xi = reservoir_input['xi']
+  dx, dy, dz = reservoir_input['dx'], reservoir_input['dy'], reservoir_input['dz']
+  kx = reservoir_input['kx']
+  ky = reservoir_input.get('ky', kx)
+
+  well_name = np.atleast_1d(wells['well_name']).astype(str)
+  well_rw = np.atleast_1d(wells['well_rw']) / 12  # wellbore radius, inch to ft
+  well_skin = np.atleast_1d(wells['well_skin'])
+  well_condition = np.atleast_1d(wells['well_condition']).astype(str)
+  well_value = np.atleast_1d(wells['well_value'])
+  well_config = np.atleast_1d(wells['well_config'])
+
+  # index of the wellblocks. Coordinates (x) in 1D, (x, y) in 2D, or (x, y, z) in 3D
+  well_loc = np.array(wells['well_loc']).astype(int).reshape(len(well_name), -1)
+  loc = well_loc[:,0] - 1
+  if well_loc.shape[1] >= 2:
+    loc = loc + (well_loc[:,1] - 1) * xi
+  if well_loc.shape[1] == 3:
+    loc = loc + (well_loc[:,2] - 1) * xi * reservoir_input['yi']
+
+  dtype = [('name', well_name.dtype), ('loc', int), ('Gw', float), ('mu', float), 
+           ('B', float), ('rw', float), ('kh', float), ('h', float), 
+           ('control', int), ('value', float)]
+  table = np.zeros(len(well_name), dtype=dtype)
+
+  def wellblock(prop):
+    # property of the wellblocks (float, or array of each block in the order of 'block_index')
+    if np.ndim(prop) == 0:
+      return np.full(len(loc), prop, dtype='float64')
+    return np.asarray(prop, dtype='float64').reshape(-1, order='F')[loc]
+
+  dx, dy, dz, kx, ky = [wellblock(prop) for prop in (dx, dy, dz, kx, ky)]
+
+  table['name'], table['loc'] = well_name, loc
+  table['mu'], table['B'] = wellblock(reservoir_input['mu']), wellblock(reservoir_input['B'])
+  table['rw'], table['h'] = well_rw, dz
+  table['control'] = [WELL_CONTROL[k] for k in well_condition]
+  table['value'] = well_value
+
+  # wellblock geometric factor
+  for i in range(len(table)):
+    kh, r_eq, Gw = fraction_wellblock_geometric_factor(dx[i], dy[i], kx[i], ky[i], well_skin[i], 
+                                                       well_rw[i], dz[i], well_config[i])
+    table['kh'][i], table['Gw'][i] = kh, Gw
+
+  return table
+
+def well_source_terms(table, n):
+  """
+  Scatter the well terms of the well table to the grid blocks
+
+  Input:
+
+  table = well table (from 'well_table')
+  n = number of grid blocks
+
+  Output:
+
+  A = well term of the LHS coefficient of p, Gw / (mu * B) for wells in 
+      constant FBHP (1D array, n)
+  q = well term of the RHS constants, Gw / (mu * B) * pwf for wells in 
+      constant FBHP, or the well flow rate (1D array, n)
+  """
+  import numpy as np
+
+  control, value = table['control'], table['value']
+  J = table['Gw'] / (table['mu'] * table['B'])
+
+  fbhp = control == WELL_CONTROL['constant_fbhp']
+  rate = control == WELL_CONTROL['constant_rate']
+  grad = control == WELL_CONTROL['constant_pressuregrad']
+
+  # flow rate of wells in constant pressure gradient
+  q_grad = -(2 * np.pi * .001127 * table['kh'] * table['rw'] * table['h']) / (table['B'] * table['mu']) * value
+
+  A, q = np.zeros(n), np.zeros(n)
+  np.add.at(A, table['loc'], np.where(fbhp, J, 0))
+  np.add.at(q, table['loc'], np.select([fbhp, rate, grad], [J * value, value, q_grad], 0))
+  return A, q
+
+def well_rates(table, p_block, lam=None):
+  """
+  Calculate the rate and FBHP of the wells after the pressure has been solved
+  (as 'solution_well2d', for the well table)
+
+  If well condition:
+  * 'constant_fbhp': rate estimated from FBHP, FBHP = FBHP
+  * 'constant_rate': rate = rate, FBHP estimated from rate
+  * 'constant_pressuregrad': rate from the pressure gradient, FBHP is NaN
+  * 'shutin': rate = 0, FBHP equals to the solved wellblock pressure
+
+  Input:
+
+  table = well table (from 'well_table')
+  p_block = solved pressure of the wellblocks (1D array, in the order of the table)
+  lam = mobility 1 / (mu * B) of the wellblocks. Default from mu and B of the table
+
+  Output:
+
+  rate = well rate (STB/D, negative for production)
+  fbhp = well FBHP (psi)
+  """
+  import numpy as np
+
+  if lam is None:
+    lam = 1 / (table['mu'] * table['B'])
+
+  control, value = table['control'], table['value']
+  J = table['Gw'] * lam
+
+  fbhp = control == WELL_CONTROL['constant_fbhp']
+  rate = control == WELL_CONTROL['constant_rate']
+  grad = control == WELL_CONTROL['constant_pressuregrad']
+
+  q_grad = -(2 * np.pi * .001127 * table['kh'] * table['rw'] * table['h']) * lam * value
+
+  q = np.select([fbhp, rate, grad], [-J * (p_block - value), value, q_grad], 0.)
+  pwf = np.select([fbhp, rate, grad], [value, p_block + value / J, np.nan], p_block)
+  return q, pwf
@@ -0,0 +1,371 @@
+"""
+Benchmark suite of PyReSim
+
+Runs the benchmark decks of 'input/benchmarks', checks the pressure and well
+rates against a regression snapshot, and records the wall time of each
+phase (parse, assemble, solve, post-process). The snapshot is of the solutions
+of PyReSim itself (stored with --update-snapshot), so it finds the changes of 
+the solutions between versions, not the errors of the version that stored it. Scaled-up synthetic 2D reservoirs
+are run for timing only, and the stencil kernels are timed against the per-block
+functions. The results are stored as JSON, so the timing and accuracy of
+different versions can be compared
+
+Usage: python benchmark.py [output.json] [--sizes 100 300 1000] [--kernel-sizes 100 300] 
+       [--update-snapshot]
+
+@author: Yohanes Nuwara
+@email: ign.nuwara97@gmail.com
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, 'functions'))
+sys.path.append(os.path.join(ROOT, 'simulators'))
+
+BENCHMARK_DIR = os.path.join(ROOT, 'input', 'benchmarks')
+SNAPSHOT_FILE = os.path.join(BENCHMARK_DIR, 'snapshot.json')
+
+# benchmark decks and their run settings. The CPORE and CFLUID of the decks
+# are in microsips (1E-6 1/psi)
+BENCHMARK_CASES = [
+  {'name': 'benchmark1d_incomp', 'file': 'benchmark1d_incomp.txt',
+   'solver': 'incompressible', 'depth': 3000},
+  {'name': 'benchmark1d_slicomp', 'file': 'benchmark1d_slicomp.txt',
+   'solver': 'slicomp', 'depth': 3000, 'p_initial': 4000, 'timestep': 10, 'schedule': 3},
+  {'name': 'benchmark2d_2x2_incomp', 'file': 'benchmark2d_2x2_incomp.txt',
+   'solver': 'incompressible', 'depth': 3000},
+  {'name': 'benchmark2d_2x2_slicomp', 'file': 'benchmark2d_2x2_slicom.txt',
+   'solver': 'slicomp', 'depth': 3000, 'p_initial': 3000, 'timestep': 10, 'schedule': 3},
+  # irregular, the corner blocks without wells are inactive
+  {'name': 'benchmark2d_irregular', 'file': 'benchmark2d_irregular.txt',
+   'solver': 'incompressible', 'depth': 3000, 'xy_inactive': [(1,1), (3,3)]}]
+
+# tolerances of the pressure (psi) and the well rate (STB/D) and FBHP (psi)
+TOLERANCE = {'pressure': 1e-6, 'rate': 1e-6, 'fbhp': 1e-6}
+
+def _timer():
+  """
+  Wall clock (second)
+  """
+  import time
+  return time.perf_counter()
+
+def run_case(case):
+  """
+  Run a benchmark deck
+
+  Input:
+
+  case = benchmark case (as Python dictionary format, see BENCHMARK_CASES)
+
+  Output:
+
+  result = result of the case (as Python dictionary format), contains:
+  * pressure (pressure of the last timestep)
+  * wells (names of the wells), rate and fbhp (of the wells, last timestep)
+  * time (wall time of the phases: parse, assemble, solve, postprocess, total)
+  * profile (summary of the phases of the 2D simulation, see 'profile_summary')
+  """
+  import numpy as np
+
+  from input_output import read_input
+  from synthetics import constant_depth1d
+  from wellblock import well_table, well_rates
+  from simulators import run_simulation_1d, simulate_2d_steps
+  from profiling import profile_summary
+
+  time, profile = {}, []
+
+  t0 = _timer()
+  data = read_input(os.path.join(BENCHMARK_DIR, case['file']))
+  reservoir_input, wells = data[0], data[1]
+  reservoir_input['cpore'] = reservoir_input['cpore'] * 1e-6
+  reservoir_input['cfluid'] = reservoir_input['cfluid'] * 1e-6
+  time['parse'] = _timer() - t0
+
+  solver = case['solver']
+  timestep, schedule = case.get('timestep', 1), case.get('schedule', 1)
+
+  if len(data) == 4:
+    # 1D, the LHS is assembled and solved in one call
+    xi = reservoir_input['xi']
+    z_array = constant_depth1d(case['depth'], xi)
+    p_initial = np.full(xi, float(case.get('p_initial', 0)))
+
+    t0 = _timer()
+    p_sol = run_simulation_1d(reservoir_input, wells, data[2], data[3], z_array,
+                              p_initial=p_initial, timestep=timestep,
+                              schedule=schedule, solver=solver)
+    time['assemble'] = None
+    time['solve'] = _timer() - t0
+
+    t0 = _timer()
+    p_sol = np.asarray(p_sol).reshape(-1, xi)[-1]
+    table = well_table(wells, reservoir_input)
+    q_well, fbhp_well = well_rates(table, p_sol[table['loc']])
+
+  else:
+    # 2D, the setup of the first step (gridding, LHS) is the assembly
+    xi, yi = reservoir_input['xi'], reservoir_input['yi']
+    z_array = np.full((xi, yi), float(case['depth']))
+    p_initial = np.full((xi, yi), float(case.get('p_initial', 0)))
+
+    t0 = _timer()
+    steps = simulate_2d_steps(*data, z_array, p_initial=p_initial, timestep=timestep,
+                              schedule=schedule, solver=solver,
+                              xy_inactive=case.get('xy_inactive'), profile=profile)
+    t, p_sol, q_well, fbhp_well = next(steps)
+    time['assemble'] = _timer() - t0
+
+    t0 = _timer()
+    for t, p_sol, q_well, fbhp_well in steps:
+      pass
+    time['solve'] = _timer() - t0
+
+    t0 = _timer()
+    p_sol = np.asarray(p_sol).reshape(-1, order='F')
+
+  result = {'pressure': np.asarray(p_sol, dtype=float).tolist(),
+            'wells': np.atleast_1d(wells['well_name']).astype(str).tolist(),
+            'rate': np.asarray(q_well, dtype=float).tolist(),
+            'fbhp': np.asarray(fbhp_well, dtype=float).tolist()}
+  time['postprocess'] = _timer() - t0
+  time['total'] = sum(v for v in time.values() if v is not None)
+  result['time'] = time
+  result['profile'] = profile_summary(profile)
+
+  return result
+
+def compare_snapshot(result, snapshot, tolerance=TOLERANCE):
+  """
+  Compare the pressure and well rates of a case with its regression snapshot
+
+  Output:
+
+  error = maximum absolute error of pressure, rate, and fbhp, and 'passed'
+  """
+  import numpy as np
+
+  error = {}
+  for key in ('pressure', 'rate', 'fbhp'):
+    a = np.asarray(result[key], dtype=float)
+    b = np.asarray(snapshot[key], dtype=float)
+    if a.shape != b.shape:
+      error[key] = np.inf
+      continue
+    # NaN (inactive blocks, FBHP of a pressure gradient well) must match
+    if np.any(np.isnan(a) != np.isnan(b)):
+      error[key] = np.inf
+      continue
+    error[key] = float(np.max(np.abs(a - b), initial=0, where=~np.isnan(a)))
+
+  error['passed'] = all(error[key] <= tolerance[key] for key in tolerance)
+  return error
+
+def run_synthetic(n, solver='slicomp', timestep=1, schedule=10):
+  """
+  Run a scaled-up synthetic 2D reservoir of n x n blocks, for timing
+
+  The reservoir and wells of 'benchmark2d_2x2_slicom.txt' are used, with
+  the wells moved to the same relative locations in the larger grid
+
+  Output:
+
+  result = wall time of the phases, the profile summary, and the range of the pressure
+  """
+  import numpy as np
+
+  from input_output import read_input
+  from simulators import simulate_2d_steps
+  from profiling import profile_summary
+
+  time, profile = {}, []
+
+  t0 = _timer()
+  data = read_input(os.path.join(BENCHMARK_DIR, 'benchmark2d_2x2_slicom.txt'))
+  reservoir_input, wells = data[0], data[1]
+  reservoir_input['cpore'] = reservoir_input['cpore'] * 1e-6
+  reservoir_input['cfluid'] = reservoir_input['cfluid'] * 1e-6
+  reservoir_input['xi'], reservoir_input['yi'] = n, n
+  wells['well_loc'] = [[max(1, (x * n) // 2), max(1, (y * n) // 2)] for x, y in wells['well_loc']]
+  time['parse'] = _timer() - t0
+
+  z_array = np.full((n, n), 3000.)
+  p_initial = np.full((n, n), 3000.)
+
+  t0 = _timer()
+  steps = simulate_2d_steps(*data, z_array, p_initial=p_initial, timestep=timestep,
+                            schedule=schedule, solver=solver, profile=profile)
+  next(steps)
+  time['assemble'] = _timer() - t0
+
+  t0 = _timer()
+  for t, p_sol, q_well, fbhp_well in steps:
+    pass
+  time['solve'] = _timer() - t0
+
+  t0 = _timer()
+  result = {'blocks': n * n, 'timesteps': schedule,
+            'pressure_min': float(np.nanmin(p_sol)), 'pressure_max': float(np.nanmax(p_sol))}
+  time['postprocess'] = _timer() - t0
+  time['total'] = sum(time.values())
+  result['time'] = time
+  result['profile'] = profile_summary(profile)
+
+  return result
+
+def run_kernels(n, repeat=3):
+  """
+  Time the stencil kernels of an n x n heterogeneous grid (inter-block
+  transmissibilities, potential term, accumulation term) against the per-block
+  functions, and check that they give the same values (bit for bit)
+
+  Output:
+
+  result = best wall time of the per-block functions ('loop') and of each kernel 
+           backend, and whether the backend gives the same values ('equal')
+  """
+  import numpy as np
+
+  from transmissibility import transmissibility2d
+  from potential import potential_term2d
+  from kernels import kernel_backend, stencil_transmissibility2d, stencil_potential2d, accumulation_term
+
+  rng = np.random.default_rng(0)
+  dx, dy, dz, kx, ky = [rng.uniform(10., 100., (n, n)) for _ in range(5)]
+  poro, mu, B = rng.uniform(.1, .3, (n, n)), 1.5, 1.2
+  z_array = rng.uniform(3000., 3100., (n, n))
+  # boundary sides at the edge of the grid
+  sides = np.zeros((n, n, 4), dtype=bool)
+  sides[0,:,0], sides[-1,:,1], sides[:,0,2], sides[:,-1,3] = True, True, True, True
+
+  def best(function):
+    times = []
+    for _ in range(repeat):
+      t0 = _timer()
+      out = function()
+      times.append(_timer() - t0)
+    return min(times), out
+
+  def loop():
+    # per-block functions, as the block loops of the simulators
+    T_array = np.zeros((n, n, 4))
+    potential = np.zeros((n, n))
+    for i in range(n):
+      for j in range(n):
+        T_array[i,j] = transmissibility2d(dx[i,j], dy[i,j], dz[i,j], kx[i,j], ky[i,j], mu, B)
+    for i in range(n):
+      for j in range(n):
+        # the block itself at the boundary sides (no elevation)
+        potential[i,j] = potential_term2d(50., T_array[i,j], z_array[max(i-1,0),j], 
+                                          z_array[min(i+1,n-1),j], z_array[i,max(j-1,0)], 
+                                          z_array[i,min(j+1,n-1)], z_array[i,j])
+    acc = (dx * dy * dz * poro * 1e-5) / (5.614583 * B * 1.)
+    return T_array, potential, acc
+
+  def kernels(backend):
+    T_array = stencil_transmissibility2d((n, n), dx, dy, dz, kx, ky, mu, B, backend=backend)
+    potential = stencil_potential2d(50., T_array, z_array, sides, backend=backend)
+    acc = accumulation_term(dx * dy * dz, poro, 1e-5, B, 1., backend=backend)
+    return T_array, potential, acc
+
+  result = {'blocks': n * n}
+  result['loop'], reference = best(loop)
+
+  backends = ['numpy'] + (['numba'] if kernel_backend() == 'numba' else [])
+  for backend in backends:
+    # the first call compiles the Numba kernels
+    kernels(backend)
+    result[backend], out = best(lambda: kernels(backend))
+    result[backend + '_equal'] = all(np.array_equal(a, b) for a, b in zip(out, reference))
+
+  return result
+
+def run_benchmarks(output=None, sizes=(100, 300, 1000), update_snapshot=False, 
+                   kernel_sizes=(100, 300)):
+  """
+  Run the benchmark decks and the scaled-up synthetic reservoirs
+
+  Input:
+
+  output = JSON file where the results are stored, or None
+  sizes = number of blocks in x and y of the synthetic reservoirs
+  update_snapshot = True to store the solutions of the decks as the new
+                    regression snapshot (SNAPSHOT_FILE)
+  kernel_sizes = number of blocks in x and y of the grids of the stencil kernels
+
+  Output:
+
+  results = results (as Python dictionary format), contains:
+  * environment (versions of python, numpy, scipy, and the platform)
+  * cases (result and error of each deck)
+  * synthetic (result of each synthetic reservoir)
+  * kernels (timing of the stencil kernels, see 'run_kernels')
+  """
+  import json
+  import platform
+  import numpy as np
+  import scipy
+
+  snapshot = {}
+  if os.path.exists(SNAPSHOT_FILE) and not update_snapshot:
+    with open(SNAPSHOT_FILE) as f:
+      snapshot = json.load(f)
+
+  results = {'environment': {'python': platform.python_version(), 'numpy': np.__version__,
+                             'scipy': scipy.__version__, 'platform': platform.platform()},
+             'cases': {}, 'synthetic': {}, 'kernels': {}}
+
+  for case in BENCHMARK_CASES:
+    result = run_case(case)
+    if case['name'] in snapshot:
+      result['error'] = compare_snapshot(result, snapshot[case['name']])
+    results['cases'][case['name']] = result
+
+  for n in sizes:
+    results['synthetic'][str(n)] = run_synthetic(n)
+
+  for n in kernel_sizes:
+    results['kernels'][str(n)] = run_kernels(n)
+
+  if update_snapshot:
+    snapshot = {name: {key: result[key] for key in ('pressure', 'wells', 'rate', 'fbhp')}
+                 for name, result in results['cases'].items()}
+    with open(SNAPSHOT_FILE, 'w') as f:
+      json.dump(snapshot, f, indent=1)
+
+  if output is not None:
+    with open(output, 'w') as f:
+      json.dump(results, f, indent=1)
+
+  return results
+
+if __name__ == '__main__':
+  import argparse
+
+  parser = argparse.ArgumentParser(description='Run the PyReSim benchmark suite')
+  parser.add_argument('output', nargs='?', default=None, help='JSON file of the results')
+  parser.add_argument('--sizes', nargs='*', type=int, default=[100, 300, 1000],
+                      help='number of blocks in x and y of the synthetic reservoirs')
+  parser.add_argument('--kernel-sizes', nargs='*', type=int, default=[100, 300],
+                      help='number of blocks in x and y of the grids of the stencil kernels')
+  parser.add_argument('--update-snapshot', action='store_true',
+                      help='store the solutions of the decks as the regression snapshot')
+  args = parser.parse_args()
+
+  results = run_benchmarks(args.output, args.sizes, args.update_snapshot, args.kernel_sizes)
+
+  for name, result in results['cases'].items():
+    error = result.get('error', {'passed': None})
+    print('{:28s} {:>6s} {:8.4f} s'.format(name, {True: 'PASS', False: 'FAIL', None: '-'}[error['passed']],
+                                           result['time']['total']))
+  for n, result in results['synthetic'].items():
+    print('{:28s} {:>6s} {:8.4f} s'.format('synthetic {0}x{0}'.format(n), '', result['time']['total']))
+  for n, result in results['kernels'].items():
+    for backend in ('numpy', 'numba'):
+      if backend in result:
+        print('{:28s} {:>6s} {:8.4f} s  x{:.0f}'.format('kernels {0}x{0} {1}'.format(n, backend), 
+                                                       {True: 'PASS', False: 'FAIL'}[result[backend + '_equal']],
+                                                       result[backend], result['loop'] / result[backend]))
@@ -1,31 +1,27 @@
-def run_simulation_1d_cylindrical(xi, dz, poro, kx, rho, B, mu, cpore, cfluid, dw, re, 
+def simulate_1d_cylindrical_steps(xi, dz, poro, kx, rho, B, mu, cpore, cfluid, dw, re, 
                                   inner_boundary, outer_boundary, well_value,
-                                  p_initial, timestep, schedule,
-                                  plot_attributes = dict({"cmap": "plasma", "linewidths": 0,
-                                                          "xlim": None})):
+                                  p_initial, timestep, schedule):
   """
-  1D Reservoir Simulation in Cylindrical Grids
-  """
-  import numpy as np
-  import matplotlib.pyplot as plt
-  import pandas as pd
+  1D Reservoir Simulation in Cylindrical Grids, one timestep at a time
 
-  # from __future__ import print_function
-  from ipywidgets import interact, interactive, fixed, interact_manual, ToggleButtons
-  import ipywidgets as widgets  
+  The pressure of each timestep is yielded as soon as it is solved, so the 
+  history of the pressure is not kept in memory. The caller can keep, reduce, 
+  or write each timestep (see 'run_simulation_1d_cylindrical')
 
-  from cylindrical import boundary_floweq1d_cylindrical, calculate_bulk_cylindrical, horizontal_permeability, lhs_coeffs1d_cylindrical, rhs_constant1d_cylindrical, trans_r_min, trans_r_plus, transmissibility1d_boundary_cylindrical, transmissibility2d_boundary_cylindrical, transmissibility_inner_boundary1d
+  Input: as 'run_simulation_1d_cylindrical'
 
-  from input_output import read_input, read_depth
-  from boundary import boundary_floweq1d
+  Output:
+
+  generator of (t, p_sol, q_well) at each timestep, where t is the time (day), 
+  p_sol the pressure solution (1D array), and q_well the rate of the well 
+  (flow through the inner boundary, STB/D). The first is the initial pressure at t = 0
+  """
+  import numpy as np
+
+  from cylindrical import boundary_floweq1d_cylindrical, calculate_bulk_cylindrical, lhs_coeffs1d_cylindrical, rhs_constant1d_cylindrical, transmissibility1d_boundary_cylindrical
+  from kernels import stencil_transmissibility_radial
   from gridding import source1d
-  from solver import lhs_coeffs1d_welltype, rhs_constant1d_welltype
-  from transmissibility import transmissibility1d, transmissibility1d_boundary
-  from wellblock import fraction_wellblock_geometric_factor
-  from wellsimulation import solution_well1d
-  from potential import potential_term1d
-  from synthetics import constant_depth1d
-  from synthetics import synthetic_initial_pressure2d  
+  from solver import fill1d_lhs_band, solve_tridiagonal
 
   """""""""""
   INPUT PROCESSING
@@ -58,12 +54,13 @@ def run_simulation_1d_cylindrical(xi, dz, poro, kx, rho, B, mu, cpore, cfluid, d
   # permeability, here kh is kx (because of 1D)
   kh = kx
 
-  # assign all params to all blocks
-  dz = np.array([[dz / zi]*zi]*xi) # grid size in z-direction
-  kh = np.array([[kh]*zi]*xi) # horizontal permeability
-  B = np.array([[B]*zi]*xi)
-  mu = np.array([[mu]*zi]*xi)
-  rho = np.array([[rho]*zi]*xi)
+  # assign all params to all blocks (1D vectors, so the properties of a block 
+  # and the boundary flow and RHS computed from them are scalars)
+  dz = np.full(xi, dz / zi) # grid size in z-direction
+  kh = np.full(xi, kh) # horizontal permeability
+  B = np.full(xi, B)
+  mu = np.full(xi, mu)
+  rho = np.full(xi, rho)
   p_initial = np.full(xi, p_initial)
 
   # source block (production or injection well)
@@ -75,17 +72,20 @@ def run_simulation_1d_cylindrical(xi, dz, poro, kx, rho, B, mu, cpore, cfluid, d
 
   " Produce LHS matrix. In Slightly Compressible simulation, LHS can be assumed CONSTANT "
 
-  lhs_mat = np.array([[0.] * xi] * xi)
+  # LHS matrix is tridiagonal, only the three diagonals are stored
+  lhs_band = np.zeros((3, xi))
 
   # set up empty array for boundary flow rate, and two transmissibilities 
   # for later computation of RHS and pressure solve at each timestep
 
   qsc_b_array = []; T_min_array = []; T_plus_array = []
 
+  # transmissibilities in r- and r+ direction of all blocks
+  Tr_min_array, Tr_plus_array = stencil_transmissibility_radial(dz, kh, mu, B, alpha_tg)
+
   for i in range(xi):
 
-      Tr_min = trans_r_min(dz[i], dz[i], (2 * np.pi), alpha_tg, kh[i], kh[i], mu[i], B[i])
-      Tr_plus = trans_r_plus(dz[i], dz[i], (2 * np.pi), alpha_tg, kh[i], kh[i], mu[i], B[i])
+      Tr_min, Tr_plus = Tr_min_array[i], Tr_plus_array[i]
 
       if i == 0:
 
@@ -112,9 +112,8 @@ def run_simulation_1d_cylindrical(xi, dz, poro, kx, rho, B, mu, cpore, cfluid, d
           T_min_array.append(T_min)
           T_plus_array.append(T_plus)        
 
-          ## fill in LHS matrix (lhs_mat)
-          lhs_mat[i, i] = p
-          lhs_mat[i, i + 1] = p_plus
+          ## fill in LHS matrix (lhs_band)
+          lhs_band = fill1d_lhs_band('west', (i + 1), lhs_band, p_plus, p_min, p)
 
       elif i == xi - 1:
           # right boundary
@@ -138,9 +137,8 @@ def run_simulation_1d_cylindrical(xi, dz, poro, kx, rho, B, mu, cpore, cfluid, d
           T_min_array.append(T_min)
           T_plus_array.append(T_plus)  
 
-          ## fill in LHS matrix (lhs_mat)
-          lhs_mat[i, i - 1] = p_min
-          lhs_mat[i, i] = p
+          ## fill in LHS matrix (lhs_band)
+          lhs_band = fill1d_lhs_band('east', (i + 1), lhs_band, p_plus, p_min, p)
 
 
       else:
@@ -156,10 +154,8 @@ def run_simulation_1d_cylindrical(xi, dz, poro, kx, rho, B, mu, cpore, cfluid, d
           T_min_array.append(T_min)
           T_plus_array.append(T_plus)                                                           
 
-          ## fill in LHS matrix (lhs_mat)
-          lhs_mat[i, i - 1] = p_min
-          lhs_mat[i, i] = p
-          lhs_mat[i, i + 1] = p_plus
+          ## fill in LHS matrix (lhs_band)
+          lhs_band = fill1d_lhs_band(None, (i + 1), lhs_band, p_plus, p_min, p)
 
       
   " Timestep evolution of computing RHS and solving the pressure "
@@ -167,10 +163,20 @@ def run_simulation_1d_cylindrical(xi, dz, poro, kx, rho, B, mu, cpore, cfluid, d
   # initiate solution pressure with the initial pressure array (p_initial)
   p_sol = p_initial
 
-  p_sol_record = []
+  def rate(p_sol):
+    # rate of the well, the flow through the inner boundary
+    if west['type'] == 'constant_pressure':
+      return np.array([T_min_array[0] * (west['value'] - p_sol[0])])
+    if west['type'] == 'no_flow':
+      return np.array([0.])
+    return np.array([np.float64(qsc_b_array[0])])
+
+  # the initial pressure
+  yield 0, p_sol, rate(p_sol)
+
   for k in range(schedule):
 
-    rhs_mat = np.array([[0.] * 1] * xi)  
+    rhs_mat = np.zeros(xi)
     for i in range(xi):
       # the pressure in grid block. FIRST timestep, it equals 'p_initial'
       # the NEXT timesteps, it equals the solved and updated pressure   
@@ -192,7 +198,7 @@ def run_simulation_1d_cylindrical(xi, dz, poro, kx, rho, B, mu, cpore, cfluid, d
                                           timestep=timestep)
 
           ## fill in RHS matrix (rhs_mat)   
-          rhs_mat[i, 0] = rhs
+          rhs_mat[i] = rhs
 
       elif i == xi - 1:
           # right boundary                                               
@@ -210,7 +216,7 @@ def run_simulation_1d_cylindrical(xi, dz, poro, kx, rho, B, mu, cpore, cfluid, d
                                           timestep=timestep) 
 
           ## fill in RHS matrix (rhs_mat)    
-          rhs_mat[i, 0] = rhs
+          rhs_mat[i] = rhs
 
       else:   
           # interior blocks
@@ -227,37 +233,75 @@ def run_simulation_1d_cylindrical(xi, dz, poro, kx, rho, B, mu, cpore, cfluid, d
           rhs = (-qsc[i] + potential_term) - (rhs_term * p_sol[i])
 
           ## fill in RHS matrix (rhs_mat)    
-          rhs_mat[i, 0] = rhs 
+          rhs_mat[i] = rhs 
 
     """""""""""
     PRESSURE SOLVER
     """""""""""
-    p_sol = np.linalg.solve(lhs_mat, rhs_mat)  
-    p_sol_record.append(p_sol) 
+    p_sol = solve_tridiagonal(lhs_band, rhs_mat)
+    yield (k + 1) * timestep, p_sol, rate(p_sol)
 
-  """""""""""
-  OUTPUT
-  """""""""""
+def simulate_1d_cylindrical(xi, dz, poro, kx, rho, B, mu, cpore, cfluid, dw, re, 
+                            inner_boundary, outer_boundary, well_value,
+                            p_initial, timestep, schedule):
+  """
+  1D Reservoir Simulation in Cylindrical Grids, without display
 
-  p_sol_ = []
+  matplotlib and ipywidgets are not imported, so it can be run in batch or 
+  in worker processes without a Jupyter front end. The result can be displayed with 
+  'display_pressure_1d_cylindrical'
 
-  for i in range(len(p_sol_record)):
-    p_sol = p_sol_record[i].T.reshape(-1)
-    p_sol = np.expand_dims(p_sol, axis=0)
-    p_sol_.append(p_sol)  
+  Input: as 'simulate_1d_cylindrical_steps'
 
-  # merge the initial pressure to the solved pressure afterwards
-  p_initial_ = p_initial.reshape((1,1,xi))
-  p_sol_ = np.concatenate((p_initial_, p_sol_), axis=0)
-  
+  Output:
+
+  p_sol = pressure solution at each timestep including 'p_initial' (3D array, 
+          of shape (schedule + 1, 1, xi))
+  q_well = rate of the well at each timestep (STB/D)
+  rn = outer radius of the grid blocks (ft)
+  """
+  import numpy as np
+
+  from cylindrical import calculate_bulk_cylindrical
+
+  # the pressure of each timestep is filled in the output as soon as it is solved
+  p_sol_ = np.empty((schedule + 1, 1, xi))
+  q_well_ = np.empty(schedule + 1)
+
+  steps = simulate_1d_cylindrical_steps(xi, dz, poro, kx, rho, B, mu, cpore, cfluid, dw, re, 
+                                        inner_boundary, outer_boundary, well_value,
+                                        p_initial, timestep, schedule)
+  for k, (t, p_sol, q_well) in enumerate(steps):
+    p_sol_[k, 0] = p_sol
+    q_well_[k] = q_well[0]
+
+  # grid size in r-direction, for the display
+  alpha_tg, gridblock, rn, Vbulk = calculate_bulk_cylindrical(np.pi * (re**2), dw, dz, xi)
+
+  return p_sol_, q_well_, rn
+
+def display_pressure_1d_cylindrical(p_sol, rn, dz, 
+                                    plot_attributes = dict({"cmap": "plasma", "linewidths": 0,
+                                                            "xlim": None})):
   """
-  INTERACTIVE ANIMATION
+  Interactive display of the pressure of a 1D cylindrical simulation 
+  (from 'simulate_1d_cylindrical'), with a slider of the day
+
+  matplotlib and ipywidgets are only imported here
   """
+  import numpy as np
+  import matplotlib.pyplot as plt
+
+  from ipywidgets import interact
+  import ipywidgets as widgets  
+
+  p_sol_ = p_sol
+  schedule = len(p_sol_) - 1
 
   min, max = np.round(np.amin(p_sol_)), np.round(np.amax(p_sol_))
   cmap, linewidths, xlim = plot_attributes["cmap"], plot_attributes["linewidths"], plot_attributes["xlim"]
 
-  DZ = dz[0][0] # reservoir net thickness
+  DZ = dz # reservoir net thickness
   day = widgets.IntSlider(value=0, min=0, max=schedule)
 
   @interact
@@ -281,5 +325,1550 @@ def run_simulation_1d_cylindrical(xi, dz, poro, kx, rho, B, mu, cpore, cfluid, d
     # Colorbar handler
     cax = fig.add_axes([0.1, -0.2, 0.8, 0.05])
     fig.colorbar(im, cax=cax, orientation='horizontal')
+
+def run_simulation_1d_cylindrical(xi, dz, poro, kx, rho, B, mu, cpore, cfluid, dw, re, 
+                                  inner_boundary, outer_boundary, well_value,
+                                  p_initial, timestep, schedule,
+                                  plot_attributes = dict({"cmap": "plasma", "linewidths": 0,
+                                                          "xlim": None}), 
+                                  display=True):
+  """
+  1D Reservoir Simulation in Cylindrical Grids
+
+  The simulation ('simulate_1d_cylindrical') is followed by the interactive 
+  display ('display_pressure_1d_cylindrical'). With display=False, the 
+  simulation is run without importing matplotlib and ipywidgets
+  """
+  p_sol_, q_well_, rn = simulate_1d_cylindrical(xi, dz, poro, kx, rho, B, mu, cpore, cfluid, 
+                                                dw, re, inner_boundary, outer_boundary, 
+                                                well_value, p_initial, timestep, schedule)
+
+  if display:
+    display_pressure_1d_cylindrical(p_sol_, rn, dz, plot_attributes)
   
   return p_sol_
+
+def simulate_2d_cylindrical_steps(nr, nz, h, poro, kh, kz, rho, B, mu, cpore, cfluid, 
+                                  dw, re, outer_boundary, well, p_initial, timestep, 
+                                  schedule, top_boundary=None, bottom_boundary=None, 
+                                  depth=0):
+  """
+  2D (r-z) Reservoir Simulation in Cylindrical Grids, one timestep at a time
+
+  The rings of 'calculate_bulk_cylindrical' (logarithmic spacing in r) are 
+  split into nz layers of the same thickness, with the vertical transmissibility
+  from kz. The well can be completed in some of the layers (partial penetration). 
+  A 'constant_rate' well has its FBHP as an extra unknown, so the rate of each 
+  completed layer follows from the solution. The LHS matrix is sparse and 
+  block-tridiagonal (the radial tridiagonal blocks of each layer, coupled to 
+  the layers above and below), factorized once and reused at every timestep
+
+  Input:
+
+  nr, nz = number of grid blocks in r-direction and of layers
+  h = reservoir thickness (ft)
+  poro, kh, kz, rho, B, mu = porosity, horizontal and vertical permeability (md), 
+                             fluid density (lbm/ft3), FVF (RB/STB), viscosity (cp)
+  cpore, cfluid = pore and fluid compressibility (1E-5 1/psi, as 'run_simulation_1d_cylindrical')
+  dw, re = wellbore diameter and outer radius (ft)
+  outer_boundary = boundary at re (as Python dictionary format), type 'constant_pressure', 
+                   'constant_pressuregrad', 'constant_rate', or 'no_flow', and value
+  well = well at the inner boundary (as Python dictionary format), contains:
+  * condition ('constant_rate', 'constant_fbhp', or 'shutin') and value (STB/D or psi)
+  * layers (completed layers, 1 is the top layer. Default is all layers)
+  * skin (default is 0)
+  p_initial = initial pressure (float, or 2D array nz x nr)
+  timestep = time increment (day)
+  schedule = number of timesteps to be simulated
+  top_boundary, bottom_boundary = boundary at the top and bottom (as 'outer_boundary', 
+                                  'constant_pressure', 'constant_rate' or 'no_flow'), 
+                                  e.g. a gas cap or an aquifer. Default is no flow
+  depth = depth of the top of the reservoir (ft), positive downward
+
+  Output:
+
+  generator of (t, p_sol, q_well, fbhp_well) at each timestep, where t is the 
+  time (day), p_sol the pressure solution (2D array nz x nr, the top layer first), 
+  q_well the rate of the well (STB/D), and fbhp_well the FBHP of the well at the 
+  top completed layer (psi). The first is the initial pressure at t = 0
+  """
+  import numpy as np
+  from scipy.sparse import diags, coo_matrix
+
+  from cylindrical import calculate_bulk_cylindrical, trans_r_plus, trans_well_cylindrical
+  from cylindrical import transmissibility2d_boundary_cylindrical, boundary_floweq1d_cylindrical
+  from solver import factorize_lhs, solve_factorized
+
+  """""""""""
+  GRIDDING
+  """""""""""
+
+  # rings of the cylindrical grid, each split into nz layers
+  alpha_tg, gridblock, rn, Vbulk = calculate_bulk_cylindrical(np.pi * (re**2), dw, h, nr)
+  dz = h / nz
+  n = nr * nz
+
+  # block properties (nr x nz), blocks ordered r first, then z (block i + k * nr)
+  Vb = np.outer(Vbulk, np.full(nz, dz / h))
+  Z = np.broadcast_to(depth + (np.arange(nz) + 0.5) * dz, (nr, nz))
+  gamma = .21584E-3 * rho * 32.174
+
+  ct = (cpore + cfluid) * 1E-05
+  accumulation = (Vb * poro * ct) / (5.614583 * B * timestep)
+
+  """""""""""
+  TRANSMISSIBILITIES
+  """""""""""
+
+  # radial transmissibility is the same between all rings (logarithmic spacing)
+  Tr = trans_r_plus(dz, dz, (2 * np.pi), alpha_tg, kh, kh, mu, B)
+  Tz = .001127 * (kz * Vbulk / h) / (mu * B * dz)
+
+  T = np.zeros((nr, nz, 4)) # sides r-, r+, z- (up), z+ (down)
+  T[1:,:,0] = Tr
+  T[:-1,:,1] = Tr
+  T[:,1:,2] = Tz[:,np.newaxis]
+  T[:,:-1,3] = Tz[:,np.newaxis]
+
+  """""""""""
+  BOUNDARIES
+  """""""""""
+
+  no_flow = {'type': 'no_flow', 'value': 0}
+  top, bottom = top_boundary or no_flow, bottom_boundary or no_flow
+
+  # boundary transmissibility (constant pressure) and boundary flow of each block
+  T_b, T_b_pb, q_b = np.zeros((nr, nz)), np.zeros((nr, nz)), np.zeros((nr, nz))
+
+  if outer_boundary['type'] == 'constant_pressure':
+    T_ = transmissibility2d_boundary_cylindrical('constant_pressure', 'east', rn[-1], dz, 
+                                                 Vb[-1,0], kh, kz, mu, B)
+    T_b[-1] += T_
+    T_b_pb[-1] += T_ * outer_boundary['value']
+  elif outer_boundary['type'] == 'constant_rate':
+    q_b[-1] += outer_boundary['value'] / nz
+  elif outer_boundary['type'] == 'constant_pressuregrad':
+    q_b[-1] += np.float64(boundary_floweq1d_cylindrical('constant_pressuregrad', rn[-1], dz, 
+                                                        Vb[-1,0], kh, mu, B, outer_boundary['value']))
+
+  potential_b = np.zeros((nr, nz))
+  for k, bound, loc, dZ in [(0, top, 'upper', -0.5 * dz), (nz - 1, bottom, 'bottom', 0.5 * dz)]:
+    if bound['type'] == 'constant_pressure':
+      T_ = np.array([transmissibility2d_boundary_cylindrical('constant_pressure', loc, dz, dz, 
+                                                             Vb[i,k], kh, kz, mu, B) for i in range(nr)])
+      T_b[:,k] += T_
+      T_b_pb[:,k] += T_ * bound['value']
+      # the boundary is half a layer above or below the block
+      potential_b[:,k] += gamma * T_ * dZ
+    elif bound['type'] == 'constant_rate':
+      q_b[:,k] += bound['value'] * Vbulk / np.sum(Vbulk)
+
+  # potential term, depth positive downward (as 'run_simulation_1d')
+  dZ = np.zeros((nr, nz, 4))
+  dZ[:,1:,2] = Z[:,:-1] - Z[:,1:]
+  dZ[:,:-1,3] = Z[:,1:] - Z[:,:-1]
+  potential = gamma * np.sum(T * dZ, axis=2) + potential_b
+
+  """""""""""
+  WELL
+  """""""""""
+
+  condition, value = well['condition'], well['value']
+  layers = np.array(well.get('layers', np.arange(1, nz + 1))) - 1
+  completed = np.zeros(nz, dtype=bool)
+  completed[layers] = True
+
+  # well transmissibility of the completed layers (first ring), and the 
+  # hydrostatic pressure in the wellbore from the top completed layer
+  T_w = np.where(completed, trans_well_cylindrical(dz, (2 * np.pi), alpha_tg, kh, mu, B, 
+                                                   well.get('skin', 0)), 0)
+  if condition == 'shutin':
+    T_w = np.zeros(nz)
+  k_ref = layers.min()
+  dp_w = gamma * (Z[0] - Z[0,k_ref])
+
+  """""""""""
+  LHS MATRIX
+  """""""""""
+
+  def flat(a):
+    # block order (r first, then z)
+    return np.asarray(a, dtype='float64').reshape(-1, order='F')
+
+  A_w = np.zeros((nr, nz))
+  A_w[0] = T_w
+
+  diag = -(np.sum(T, axis=2) + T_b + A_w) - accumulation
+  diagonals = [flat(diag), flat(T[...,0])[1:], flat(T[...,1])[:-1]]
+  offsets = [0, -1, 1]
+  if nz > 1:
+    diagonals += [flat(T[...,2])[nr:], flat(T[...,3])[:-nr]]
+    offsets += [-nr, nr]
+  lhs_mat = diags(diagonals, offsets, shape=(n, n), format='csr')
+
+  rate_well = condition == 'constant_rate'
+  if rate_well:
+    # FBHP is the extra unknown n, with the well equation Σ T_w (pwf + dp_w - p) = q
+    block = np.arange(nz) * nr
+    rows = np.concatenate([block, np.full(nz, n), [n]])
+    cols = np.concatenate([np.full(nz, n), block, [n]])
+    vals = np.concatenate([T_w, -T_w, [np.sum(T_w)]])
+    lhs_mat = lhs_mat.tocoo()
+    lhs_mat = coo_matrix((np.concatenate([lhs_mat.data, vals]), 
+                          (np.concatenate([lhs_mat.row, rows]), np.concatenate([lhs_mat.col, cols]))), 
+                         shape=(n + 1, n + 1)).tocsr()
+
+  lu = factorize_lhs(lhs_mat)
+
+  """""""""""
+  RHS CONSTANTS
+  """""""""""
+
+  # well term of the RHS
+  rhs_w = np.zeros((nr, nz))
+  if condition == 'constant_fbhp':
+    rhs_w[0] = T_w * (value + dp_w)
+  elif rate_well:
+    rhs_w[0] = T_w * dp_w
+
+  rhs_constant = -(T_b_pb + q_b + rhs_w) + potential
+
+  def rates(p_sol):
+    # rate and FBHP of the well
+    p_1 = p_sol[:,0]
+    if rate_well:
+      return np.array([value]), np.array([pwf[0]])
+    if condition == 'constant_fbhp':
+      return np.array([np.sum(T_w * (value + dp_w - p_1))]), np.array([value])
+    return np.array([0.]), np.array([p_1[k_ref]])
+
+  " Timestep evolution of computing RHS and solving the pressure "
+
+  p_sol = np.array(np.broadcast_to(p_initial, (nz, nr)), dtype='float64')
+  pwf = [p_sol[k_ref,0]]
+
+  # the initial pressure
+  yield (0, p_sol) + rates(p_sol)
+
+  for t in range(schedule):
+    rhs = flat(rhs_constant - accumulation * p_sol.T)
+    if rate_well:
+      rhs = np.append(rhs, value - np.sum(T_w * dp_w))
+
+    p_new = solve_factorized(lu, rhs)
+    if rate_well:
+      pwf = [p_new[n]]
+    p_sol = p_new[:n].reshape((nr, nz), order='F').T
+    yield ((t + 1) * timestep, p_sol) + rates(p_sol)
+
+def run_simulation_2d_cylindrical(nr, nz, h, poro, kh, kz, rho, B, mu, cpore, cfluid, 
+                                  dw, re, outer_boundary, well, p_initial, timestep, 
+                                  schedule, top_boundary=None, bottom_boundary=None, 
+                                  depth=0):
+  """
+  2D (r-z) Reservoir Simulation in Cylindrical Grids, with partial penetration
+  (see 'simulate_2d_cylindrical_steps'), without display
+
+  Output:
+
+  p_sol = pressure solution at each timestep including 'p_initial' (3D array, 
+          of shape (schedule + 1, nz, nr), the top layer first)
+  q_well, fbhp_well = rate (STB/D) and FBHP (psi) of the well at each timestep
+  rn = radius of the grid blocks (ft)
+  """
+  import numpy as np
+
+  from cylindrical import calculate_bulk_cylindrical
+
+  # the pressure of each timestep is filled in the output as soon as it is solved
+  p_sol_ = np.empty((schedule + 1, nz, nr))
+  q_well_, fbhp_well_ = np.empty(schedule + 1), np.empty(schedule + 1)
+
+  steps = simulate_2d_cylindrical_steps(nr, nz, h, poro, kh, kz, rho, B, mu, cpore, cfluid, 
+                                        dw, re, outer_boundary, well, p_initial, timestep, 
+                                        schedule, top_boundary, bottom_boundary, depth)
+  for k, (t, p_sol, q_well, fbhp_well) in enumerate(steps):
+    p_sol_[k], q_well_[k], fbhp_well_[k] = p_sol, q_well[0], fbhp_well[0]
+
+  alpha_tg, gridblock, rn, Vbulk = calculate_bulk_cylindrical(np.pi * (re**2), dw, h, nr)
+
+  return p_sol_, q_well_, fbhp_well_, rn
+
+def simulate_1d_steps(reservoir_input, wells, west_boundary, east_boundary, z_array, 
+                      p_initial=None, timestep=1, schedule=1, solver='slicomp'):
+  """
+  1D Reservoir Simulation in Rectangular Grids, one timestep at a time
+  (as 'simulate_2d_steps')
+
+  Input: as 'run_simulation_1d'
+
+  Output:
+
+  generator of (t, p_sol, q_well, fbhp_well) at each timestep, where t is the 
+  time (day), p_sol the pressure solution (1D array), and q_well and fbhp_well 
+  the rate (STB/D) and FBHP (psi) of each well. The first is the initial 
+  pressure at t = 0. For 'incompressible', only one steady state solution at t = 0
+  """
+  import numpy as np
+
+  from boundary import boundary_floweq1d
+  from solver import solve_tridiagonal
+  from transmissibility import transmissibility1d, transmissibility1d_boundary
+  from wellblock import well_table, well_source_terms, well_rates
+  from potential import potential_term1d
+
+  """""""""""
+  INPUT PROCESSING
+  """""""""""
+
+  west, east = west_boundary, east_boundary
+
+  # number of blocks in x
+  xi = reservoir_input['xi']
+
+  # depth of the reservoir and of the boundaries
+  depth = z_array[1]
+  west_depth = west.get('depth', depth[0])
+  east_depth = east.get('depth', depth[-1])
+
+  # blocks are homogeneous and same in size
+  dx, dy, dz = reservoir_input['dx'], reservoir_input['dy'], reservoir_input['dz']
+  kx, B, mu, rho = reservoir_input['kx'], reservoir_input['B'], reservoir_input['mu'], reservoir_input['rho']
+
+  """""""""""
+  WELL INFORMATION PROCESSING
+  """""""""""
+
+  # well table, and the well terms of the LHS (A) and RHS (q) scattered to the blocks
+  well_tab = well_table(wells, reservoir_input)
+  well_A, well_q = well_source_terms(well_tab, xi)
+
+  """""""""""
+  SIMULATION
+  """""""""""
+
+  # transmissibilities. At the boundary sides, BOUNDARY transmissibilities
+  T_min, T_plus = transmissibility1d(dx, dy, dz, kx, mu, B)
+  T_min, T_plus = np.full(xi, T_min), np.full(xi, T_plus)
+  T_min[0] = transmissibility1d_boundary(west['type'], dx, dy, dz, kx, mu, B)
+  T_plus[-1] = transmissibility1d_boundary(east['type'], dx, dy, dz, kx, mu, B)
+
+  # potential term, with the depth of the boundaries at the boundary sides
+  depth_min = np.append(west_depth, depth[:-1])
+  depth_plus = np.append(depth[1:], east_depth)
+  potential = potential_term1d(rho, T_min, T_plus, depth_min, depth, depth_plus)
+
+  # flow from the boundaries
+  bound_term = np.zeros(xi)
+  for i, bound, T_b in [(0, west, T_min[0]), (xi - 1, east, T_plus[-1])]:
+    if bound['type'] == 'constant_pressure':
+      bound_term[i] = bound_term[i] - T_b * bound['value']
+    if bound['type'] == 'constant_pressuregrad' or bound['type'] == 'constant_rate':
+      qsc_b = boundary_floweq1d(bound['type'], dx, dy, dz, kx, mu, B, value=bound['value'], no_block=(i + 1))
+      bound_term[i] = bound_term[i] - np.float64(qsc_b)
+
+  if solver == 'incompressible':
+    accumulation = 0
+  if solver == 'slicomp':
+    Vb = dx * dy * dz
+    ct = reservoir_input['cpore'] + reservoir_input['cfluid']
+    accumulation = (Vb * reservoir_input['poro'] * ct) / (5.614583 * B * timestep)
+
+  " Produce LHS matrix. In Slightly Compressible simulation, LHS is CONSTANT "
+
+  # LHS matrix is tridiagonal, only the three diagonals are stored
+  # (upper diagonal p+, main diagonal p, lower diagonal p-)
+  lhs_band = np.zeros((3, xi))
+  lhs_band[0,1:] = T_plus[:-1]
+  lhs_band[1] = -(well_A + T_min + T_plus) - accumulation
+  lhs_band[2,:-1] = T_min[1:]
+
+  def rates(p_sol):
+    """
+    Rate and FBHP of the wells from the pressure of the wellblocks
+    """
+    return well_rates(well_tab, np.asarray(p_sol, dtype='float64')[well_tab['loc']])
+
+  def solve_timestep(p_sol):
+    """
+    Solve the pressure after a timestep from pressure p_sol
+    """
+    rhs = bound_term + potential - well_q
+    if solver == 'slicomp':
+      rhs = rhs - accumulation * np.asarray(p_sol, dtype='float64')
+    rhs_mat = rhs.reshape((-1, 1))
+
+    """""""""""
+    PRESSURE SOLVER
+    """""""""""
+    return solve_tridiagonal(lhs_band, rhs_mat)
+
+  " Timestep evolution of computing RHS and solving the pressure "
+
+  # initiate solution pressure with the initial pressure array (p_initial)
+  p_sol = p_initial
+
+  if solver == 'incompressible':
+    # steady state, solved once
+    p_sol = solve_timestep(p_sol)
+    yield (0, p_sol) + rates(p_sol)
+    return
+
+  # the initial pressure
+  p_sol = np.array(p_initial, dtype='float64').reshape(xi)
+  yield (0, p_sol) + rates(p_sol)
+
+  for k in range(schedule):
+    p_sol = solve_timestep(p_sol)
+    yield ((k + 1) * timestep, p_sol) + rates(p_sol)
+
+def run_simulation_1d(reservoir_input, wells, west_boundary, east_boundary, z_array, 
+                      p_initial=None, timestep=1, schedule=1, solver='slicomp'):
+  """
+  1D Reservoir Simulation in Rectangular Grids
+
+  The LHS matrix is tridiagonal, so only its three diagonals are stored and 
+  solved ('solve_tridiagonal') in linear time
+
+  Input:
+
+  reservoir_input, wells, west_boundary, east_boundary = reservoir data as 
+  passed by 'read_input' (CPORE and CFLUID in 1/psi). The boundary depth can be
+  given as 'depth' in the boundary dictionary, otherwise equals the boundary block
+
+  z_array = grid block coordinates + depth (2D array, from 'read_depth' or 'constant_depth1d')
+  p_initial = initial pressure of grid blocks (1D array), for 'slicomp'
+  timestep = time increment (day)
+  schedule = number of timesteps to be simulated
+  solver = 'incompressible' or 'slicomp'
+
+  Output:
+
+  p_sol = pressure solution (1D array) for 'incompressible', or pressure 
+          solution at each timestep including 'p_initial' (3D array) for 'slicomp'
+  """
+  import numpy as np
+
+  xi = reservoir_input['xi']
+
+  steps = simulate_1d_steps(reservoir_input, wells, west_boundary, east_boundary, z_array, 
+                            p_initial=p_initial, timestep=timestep, schedule=schedule, 
+                            solver=solver)
+
+  if solver == 'incompressible':
+    t, p_sol, q_well, fbhp_well = next(steps)
+    return p_sol
+
+  # the pressure of each timestep is filled in the output as soon as it is solved
+  p_sol_ = np.empty((schedule + 1, 1, xi))
+  for k, (t, p_sol, q_well, fbhp_well) in enumerate(steps):
+    p_sol_[k, 0] = p_sol
+
+  return p_sol_
+
+def setup_simulation_2d(reservoir_input, wells, west_boundary, east_boundary, 
+                        south_boundary, north_boundary, z_array, p_initial=None,
+                        xy_inactive=None):
+  """
+  Set up the grid, the map of ACTIVE BLOCKS, the well table, the boundaries, 
+  the transmissibilities, and the potential term of a 2D simulation. These do 
+  not change over the timesteps, so they are calculated once before the simulation
+
+  Input:
+
+  reservoir_input, wells, west_boundary, east_boundary, south_boundary, north_boundary = 
+  reservoir data as passed by 'read_input'
+  z_array = depth of grid blocks, positive downward (2D array)
+  p_initial = initial pressure of grid blocks (2D array)
+  xy_inactive = list of inactive block coordinates (for IRREGULAR reservoir). Default 
+                is the inactive blocks of 'actnum' of the reservoir input, if given
+
+  Output:
+
+  sim = simulation set up (as Python dictionary format)
+  contains:
+  * x (mesh in x-direction, NaN for INACTIVE BLOCKS)
+  * bound_loc (boundary location codes, NaN for INACTIVE BLOCKS)
+  * active_index, block_active (map of ACTIVE BLOCKS, from 'active_cell_map')
+  * well_table (from 'well_table')
+  * boundary_grid (from 'boundary2d_grid', with the boundary transmissibilities 'T')
+  * T_array (from 'transmissibility2d_grid')
+  * potential (potential term of each block), and rho (fluid density of the potential term)
+  * p_initial (initial pressure, NaN for INACTIVE BLOCKS)
+  """
+  import numpy as np
+
+  from boundary import boundary2d_location, boundary2d_irreg, boundary2d_grid
+  from gridding import create_irregular_grid, maskout_inactive_blocks, active_cell_map
+  from transmissibility import transmissibility2d_grid
+  from wellblock import well_table
+  from kernels import stencil_potential2d
+
+  """""""""""
+  INPUT PROCESSING
+  """""""""""
+
+  # number of blocks in x and y
+  xi = reservoir_input['xi']
+  yi = reservoir_input['yi']
+
+  # blocks are homogeneous and same in size
+  dx, dy, dz = reservoir_input['dx'], reservoir_input['dy'], reservoir_input['dz']
+  kx, ky = reservoir_input['kx'], reservoir_input['ky']
+  B, mu, rho = reservoir_input['B'], reservoir_input['mu'], reservoir_input['rho']
+
+  """""""""""
+  GRIDDING
+  """""""""""
+
+  # meshgrid the original points
+  x, y = np.meshgrid(np.arange(1, xi + 1), np.arange(1, yi + 1), indexing='ij')
+  x, y = x.astype('float64'), y.astype('float64')
+
+  # classify the location of boundary with codes (1, 12, 13, etc)
+  bound_loc = boundary2d_location(x, y, xi, yi)
+
+  if xy_inactive is None and 'actnum' in reservoir_input:
+    # INACTIVE BLOCKS from the map of active blocks of the input
+    xy_inactive = (np.argwhere(np.asarray(reservoir_input['actnum']) == 0) + 1).tolist()
+    xy_inactive = xy_inactive if len(xy_inactive) > 0 else None
+
+  if xy_inactive is not None:
+    # mask out the INACTIVE BLOCKS, then classify the NEW location of boundary
+    x, y, x_inactive, y_inactive = create_irregular_grid(x, y, xy_inactive)
+    bound_loc = maskout_inactive_blocks(bound_loc.T, x_inactive, y_inactive, xi)
+    bound_loc = boundary2d_irreg(bound_loc, xi, yi)
+
+    if p_initial is not None:
+      p_initial = maskout_inactive_blocks(np.array(p_initial).T, x_inactive, y_inactive, xi)
+
+  # map of ACTIVE BLOCKS. The system is assembled and solved in the compressed
+  # numbering of ACTIVE BLOCKS, then scattered back to the whole grid
+  actnum, active_index, block_active = active_cell_map(x)
+
+  """""""""""
+  WELL INFORMATION PROCESSING
+  """""""""""
+
+  # well table (one record per well, with the index of the wellblock)
+  well_tab = well_table(wells, reservoir_input)
+
+  """""""""""
+  BOUNDARY PROCESSING
+  """""""""""
+
+  # boundary type and value at the sides of each block
+  boundary_grid = boundary2d_grid(bound_loc, west_boundary, east_boundary, 
+                                  south_boundary, north_boundary)
+
+  # INTER-BLOCK transmissibilities, and BOUNDARY transmissibilities at the sides
+  T_array = transmissibility2d_grid(boundary_grid, dx, dy, dz, kx, ky, mu, B)
+  boundary_grid['T'] = np.where(boundary_grid['type'] != '', T_array, 0)
+
+  # potential term, from the depth of the neighboring blocks (not at the 
+  # boundary sides)
+  potential = stencil_potential2d(rho, T_array, z_array, boundary_grid['type'] != '')
+
+  sim = {'x': x, 'bound_loc': bound_loc, 'active_index': active_index, 
+         'block_active': block_active, 'well_table': well_tab, 
+         'boundary_grid': boundary_grid, 'T_array': T_array, 
+         'potential': potential, 'rho': rho, 'p_initial': p_initial}
+  return sim
+
+def load_model_2d(filepath, z_array=None, p_initial=None, xy_inactive=None, 
+                  depth_file=None, cache_dir=None, max_size=None):
+  """
+  Read the input file and set up the 2D simulation ('read_input' and 
+  'setup_simulation_2d'), or load both from the model cache if the same 
+  input was set up before
+
+  The key of the cache is the hash of the input file (and depth file), the 
+  depth, initial pressure, and inactive blocks, and the source code of the 
+  modules of the set up (see 'model_cache_key'), so a model is set up again 
+  when the input or the code changes
+
+  Input:
+
+  filepath = path to the input file (TXT format, see 'read_input')
+  z_array, p_initial, xy_inactive = as 'setup_simulation_2d'. Default depth is 
+                                    DEPTH of the input file, or 0
+  depth_file = path to the depth data, hashed with the input file (optional). 
+               The binary files of the input file (see 'deck_array') are hashed too
+  cache_dir = cache directory (default is MODEL_CACHE_DIR), or False to not use the cache
+  max_size = size limit of the cache directory (byte, default is MODEL_CACHE_SIZE)
+
+  Output:
+
+  model = model (as Python dictionary format), contains:
+  * input (reservoir_input, wells, west_boundary, east_boundary, south_boundary, 
+    north_boundary, as passed by 'read_input')
+  * sim (from 'setup_simulation_2d')
+  * cached (True if loaded from the cache)
+
+  Use: 
+  > model = load_model_2d(filepath, z_array, p_initial)
+  > run_simulation_2d(*model['input'], z_array, p_initial, sim=model['sim'])
+  """
+  import numpy as np
+
+  from input_output import read_input, deck_files
+  from model_cache import model_cache_key, model_cache_load, model_cache_save
+  from model_cache import MODEL_CACHE_DIR, MODEL_CACHE_SIZE
+
+  if cache_dir is None:
+    cache_dir = MODEL_CACHE_DIR
+  if max_size is None:
+    max_size = MODEL_CACHE_SIZE
+
+  filepaths = [filepath] + deck_files(filepath) + ([depth_file] if depth_file is not None else [])
+  modules = ['input_output', 'boundary', 'gridding', 'transmissibility', 'wellblock', 
+             'potential', 'kernels', 'simulators']
+  key = model_cache_key(filepaths, [z_array, p_initial, xy_inactive], modules)
+
+  if cache_dir is not False:
+    model = model_cache_load(key, cache_dir)
+    if model is not None:
+      model['cached'] = True
+      return model
+
+  data = read_input(filepath)
+  if z_array is None:
+    z_array = data[0].get('depth', np.zeros((data[0]['xi'], data[0]['yi'])))
+  sim = setup_simulation_2d(*data, z_array, p_initial=p_initial, xy_inactive=xy_inactive)
+  model = {'input': data, 'sim': sim}
+
+  if cache_dir is not False:
+    model_cache_save(key, model, cache_dir, max_size)
+
+  model['cached'] = False
+  return model
+
+def simulate_2d_steps(reservoir_input, wells, west_boundary, east_boundary, 
+                      south_boundary, north_boundary, z_array, p_initial=None, 
+                      timestep=1, schedule=1, solver='slicomp', xy_inactive=None,
+                      linear_solver=dict({"method": "direct", "preconditioner": "ilu",
+                                          "tol": 1e-8, "maxiter": None}),
+                      solver_report=None, pvt=None,
+                      newton=dict({"tol": 1e-6, "maxiter": 20, "dp_max": 1000}),
+                      report_times=None, timestep_control=None, profile=None,
+                      sim=None):
+  """
+  2D Reservoir Simulation in Rectangular Grids (regular or irregular), 
+  one timestep at a time
+
+  The pressure of each timestep is yielded as soon as it is solved, so the 
+  history of the pressure is not kept in memory. The caller can keep, reduce, 
+  or write each timestep (see 'run_simulation_2d')
+
+  Input: as 'run_simulation_2d'
+
+  Output:
+
+  generator of (t, p_sol, q_well, fbhp_well) at each timestep, where t is the 
+  time (day), p_sol the pressure solution (2D array), and q_well and fbhp_well 
+  the rate (STB/D) and FBHP (psi) of each well (in the order of 'wells'). The first is the initial pressure at t = 0, 
+  then each timestep (each accepted adaptive timestep with 'report_times'). 
+  For 'incompressible', only one steady state solution at t = 0
+  """
+  import numpy as np
+
+  from gridding import scatter_active_blocks
+  from solver import lhs_coeffs2d_grid, rhs_constant2d_grid, lhs_mat2d_sparse, solve_pressure_iterative2d
+  from solver import factorize_lhs, solve_factorized, lhs_fingerprint
+  from solver import newton_model2d, solve_pressure_newton2d, adaptive_timestep
+  from pvt_correlation import liquid_pvt_table, pvt_properties
+  from wellblock import well_rates
+  from profiling import profile_phase, array_nbytes
+  from kernels import stencil_potential2d, accumulation_term
+
+  """""""""""
+  INPUT PROCESSING
+  """""""""""
+
+  # number of blocks in x and y
+  xi = reservoir_input['xi']
+  yi = reservoir_input['yi']
+
+  # blocks are homogeneous and same in size
+  dx, dy, dz = reservoir_input['dx'], reservoir_input['dy'], reservoir_input['dz']
+  kx, ky = reservoir_input['kx'], reservoir_input['ky']
+  B, mu, rho = reservoir_input['B'], reservoir_input['mu'], reservoir_input['rho']
+
+  """""""""""
+  GRIDDING, WELL, AND BOUNDARY PROCESSING
+  """""""""""
+
+  with profile_phase(profile, 'setup') as phase:
+    if sim is None:
+      sim = setup_simulation_2d(reservoir_input, wells, west_boundary, east_boundary, 
+                                south_boundary, north_boundary, z_array, 
+                                p_initial=p_initial, xy_inactive=xy_inactive)
+    phase['nbytes'] = array_nbytes(sim['T_array'], sim['potential'], sim['active_index'])
+
+  x, bound_loc, p_initial = sim['x'], sim['bound_loc'], sim['p_initial']
+  active_index, block_active = sim['active_index'], sim['block_active']
+  well_tab, boundary_grid = sim['well_table'], sim['boundary_grid']
+  T_array, potential = sim['T_array'], sim['potential']
+
+  if sim.get('rho', rho) != rho:
+    # set up with another fluid density, only the potential term changes
+    potential = stencil_potential2d(rho, T_array, z_array, boundary_grid['type'] != '')
+
+  """""""""""
+  SIMULATION
+  """""""""""
+
+  " Constant part of the RHS (boundaries, wells, potential), calculated once "
+
+  if solver != 'compressible':
+    with profile_phase(profile, 'rhs') as phase:
+      rhs_constant = rhs_constant2d_grid(boundary_grid, well_tab, potential, 
+                                         dx, dy, dz, kx, ky, mu, B, solver='incompressible')
+      rhs_constant = rhs_constant.reshape(-1, order='F')[block_active]
+      phase['nbytes'] = array_nbytes(rhs_constant)
+
+  " Produce LHS matrix. In Slightly Compressible simulation, LHS is CONSTANT "
+
+  if solver == 'incompressible':
+    schedule = 1
+
+  if solver == 'compressible':
+    # B, mu, and rho depend on pressure, the Jacobian is calculated at each 
+    # Newton iteration from the compressible model
+    if pvt is None:
+      # one fluid, B and mu of each block must be the same
+      fluid = [np.unique(np.asarray(value, dtype='float64')) for value in (B, mu)]
+      if len(fluid[0]) > 1 or len(fluid[1]) > 1:
+        raise ValueError("B and mu differ between blocks, give the PVT table of the fluid for 'compressible'")
+      pvt = liquid_pvt_table(fluid[0][0], fluid[1][0], rho, reservoir_input['cfluid'], np.nanmean(p_initial))
+    with profile_phase(profile, 'assemble') as phase:
+      model = newton_model2d(bound_loc, active_index, boundary_grid, well_tab, z_array, 
+                             reservoir_input, timestep=timestep, p_ref=p_initial)
+      phase['nbytes'] = array_nbytes(model)
+
+  # LHS matrix of the last timestep size. LHS matrix is factorized once, and 
+  # refactorized only if the grid, well conditions, or timestep change
+  lhs = {}
+  cache = {}
+
+  def assemble(dt):
+    """
+    LHS matrix (and accumulation term) of the ACTIVE BLOCKS for a timestep of size dt
+    """
+    with profile_phase(profile, 'assemble', dt=dt) as phase:
+      px_min, px_plus, py_min, py_plus, p = lhs_coeffs2d_grid(bound_loc, well_tab, T_array, mu, B,
+                                                              solver=solver, 
+                                                              reservoir_input=reservoir_input,
+                                                              timestep=dt)
+      lhs_dt = {'dt': dt}
+      lhs_dt['mat'] = lhs_mat2d_sparse(bound_loc, px_min, px_plus, py_min, py_plus, p, active_index)
+      if solver == 'slicomp':
+        # accumulation term of the ACTIVE BLOCKS, the coefficient of the previous pressure
+        Vb = dx * dy * dz
+        ct = reservoir_input['cpore'] + reservoir_input['cfluid']
+        accumulation = accumulation_term(Vb, reservoir_input['poro'], ct, B, dt)
+        lhs_dt['accumulation'] = np.broadcast_to(accumulation, (xi, yi)).reshape(-1, order='F')[block_active]
+      # fingerprint of the matrix for the cache, once per assembly
+      lhs_dt['fingerprint'] = lhs_fingerprint(lhs_dt['mat'])
+      phase['nbytes'] = array_nbytes(lhs_dt['mat'])
+    return lhs_dt
+
+  def solve_timestep(p_sol, dt, cached=True):
+    """
+    Solve the pressure after a timestep of size dt from pressure p_sol.
+    Returns the pressure and False if the Newton iterations did not converge.
+    With cached=False (a one-off timestep, e.g. shortened to a report time), 
+    the LHS matrix and its factorization or preconditioner are not kept
+    """
+    if solver == 'compressible':
+      # Newton-Raphson iterations of the timestep, in the compressed numbering
+      report = []
+      p_old = np.asarray(p_sol, dtype='float64').reshape(-1, order='F')[block_active]
+      with profile_phase(profile, 'newton', dt=dt) as phase:
+        p_new = solve_pressure_newton2d(p_old, dict(model, V=model['V'] * timestep / dt), pvt, 
+                                        tol=newton.get('tol', 1e-6),
+                                        maxiter=newton.get('maxiter', 20), 
+                                        dp_max=newton.get('dp_max', 1000),
+                                        report=report)
+        phase['iterations'] = report[-1]['iterations']
+      if solver_report is not None:
+        solver_report.extend(report)
+      return scatter_active_blocks(p_new, block_active, xi, yi), report[-1]['converged']
+
+    if not cached:
+      lhs_dt, cache_dt, key = assemble(dt), None, None
+    else:
+      if lhs.get('dt') != dt:
+        lhs.update(assemble(dt))
+      lhs_dt, cache_dt, key = lhs, cache, (xi, yi, tuple(well_tab['control']), dt)
+
+    with profile_phase(profile, 'rhs', dt=dt):
+      # RHS of the ACTIVE BLOCKS in the compressed numbering
+      rhs = rhs_constant
+      if solver == 'slicomp':
+        p_old = np.asarray(p_sol, dtype='float64').reshape(-1, order='F')[block_active]
+        rhs = rhs - (lhs_dt['accumulation'] * p_old)
+      rhs_mat = rhs.reshape((-1, 1))
+
+    """""""""""
+    PRESSURE SOLVER
+    """""""""""
+    if linear_solver['method'] == 'direct':
+      lu = cache_dt.get(key) if cache_dt is not None else None
+      if lu is None or lu['fingerprint'] != lhs_dt['fingerprint']:
+        with profile_phase(profile, 'factorize', dt=dt) as phase:
+          lu = factorize_lhs(lhs_dt['mat'], cache_dt, key, fingerprint=lhs_dt['fingerprint'])
+          phase['nbytes'] = array_nbytes(lu)
+      with profile_phase(profile, 'solve', dt=dt):
+        p_sol = scatter_active_blocks(solve_factorized(lu, rhs_mat), block_active, xi, yi)
+    else:
+      report = []
+      with profile_phase(profile, 'solve', dt=dt) as phase:
+        p_sol = solve_pressure_iterative2d(lhs_dt['mat'], rhs_mat, x, method=linear_solver['method'],
+                                           preconditioner=linear_solver.get('preconditioner', 'ilu'),
+                                           tol=linear_solver.get('tol', 1e-8), 
+                                           maxiter=linear_solver.get('maxiter', None),
+                                           p_guess=p_sol, report=report, 
+                                           cache=cache_dt, key=key, block_active=block_active,
+                                           fingerprint=lhs_dt['fingerprint'])
+        phase['iterations'] = report[-1]['iterations']
+      if solver_report is not None:
+        solver_report.extend(report)
+    return p_sol, True
+
+  def rates(p_sol):
+    """
+    Rate and FBHP of the wells from the pressure of the wellblocks
+    """
+    with profile_phase(profile, 'wells'):
+      p_block = np.asarray(p_sol, dtype='float64').reshape(-1, order='F')[well_tab['loc']]
+      lam = None
+      if solver == 'compressible':
+        B_, mu_ = pvt_properties(pvt, p_block)[:2]
+        lam = 1 / (mu_ * B_)
+      return well_rates(well_tab, p_block, lam)
+
+  " Timestep evolution of computing RHS and solving the pressure "
+
+  # initiate solution pressure with the initial pressure array (p_initial)
+  p_sol = p_initial
+
+  if solver == 'incompressible':
+    # steady state, solved once
+    p_sol, converged = solve_timestep(p_sol, timestep)
+    yield (0, p_sol) + rates(p_sol)
+    return
+
+  # the initial pressure
+  yield (0, p_sol) + rates(p_sol)
+
+  if report_times is None:
+    # fixed timestep
+    for t in range(schedule):
+      p_sol, converged = solve_timestep(p_sol, timestep)
+      yield ((t + 1) * timestep, p_sol) + rates(p_sol)
+
+  else:
+    # adaptive timestep, the timesteps end exactly at the report times
+    control = dict({"dt_initial": timestep, "dt_min": timestep / 64, "dt_max": np.inf,
+                    "dp_target": 50, "dp_max": 100, "lte_target": None, 
+                    "growth": 2, "cut": 0.25})
+    control.update(timestep_control or {})
+
+    time, dt = 0, control['dt_initial']
+    dt_old, dp_old = None, None
+
+    for t_report in report_times:
+      while t_report - time > 1e-9 * t_report:
+        # a timestep shortened to the report time is not of the size dt_initial * 2^k, 
+        # so its matrix and factorization are not kept in the cache
+        dt_step = min(dt, t_report - time)
+        p_new, converged = solve_timestep(p_sol, dt_step, cached=dt_step == dt)
+        dp = (np.asarray(p_new) - p_sol).reshape(-1, order='F')[block_active]
+
+        accept, dt_next = adaptive_timestep(dt_step, dp, control, dt_old, dp_old, converged)
+        if solver_report is not None:
+          solver_report.append({'method': 'timestep', 'time': time + dt_step, 'dt': dt_step, 
+                                'dp': np.max(np.abs(dp)), 'accepted': accept})
+
+        if accept:
+          time = t_report if dt_step == t_report - time else time + dt_step
+          p_sol = p_new
+          dt_old, dp_old = dt_step, dp
+          # a timestep shortened to the report time does not shrink the next one
+          dt = max(dt_next, dt) if dt_step < dt and dt_next >= dt_step else dt_next
+          yield (time, p_sol) + rates(p_sol)
+        else:
+          dt = dt_next
+
+def run_simulation_2d(reservoir_input, wells, west_boundary, east_boundary, 
+                      south_boundary, north_boundary, z_array, p_initial=None, 
+                      timestep=1, schedule=1, solver='slicomp', xy_inactive=None,
+                      linear_solver=dict({"method": "direct", "preconditioner": "ilu",
+                                          "tol": 1e-8, "maxiter": None}),
+                      solver_report=None, pvt=None,
+                      newton=dict({"tol": 1e-6, "maxiter": 20, "dp_max": 1000}),
+                      report_times=None, timestep_control=None, profile=None,
+                      sim=None):
+  """
+  2D Reservoir Simulation in Rectangular Grids (regular or irregular)
+
+  The LHS coefficients and RHS constants are computed for the whole grid at 
+  once ('lhs_coeffs2d_grid', 'rhs_constant2d_grid'). The LHS matrix is assembled 
+  once as a sparse pentadiagonal matrix ('lhs_mat2d_sparse'), then solved with 
+  a sparse solver at each timestep. In the 'compressible' simulation, the 
+  pressure of each timestep is solved with the Newton-Raphson method 
+  ('solve_pressure_newton2d')
+
+  Input:
+
+  reservoir_input, wells, west_boundary, east_boundary, south_boundary, north_boundary = 
+  reservoir data as passed by 'read_input' (CPORE and CFLUID in 1/psi).
+  The grid and rock properties (dx, dy, dz, kx, ky, poro) can be a 2D array of 
+  each block (xi x yi, heterogeneous reservoir), as can mu and B except for 'compressible'
+
+  z_array = depth of grid blocks, positive downward (2D array, e.g. from 'create_depth2d'),
+            as the 1D and 3D simulation
+  p_initial = initial pressure of grid blocks (2D array), for 'slicomp' and 'compressible'
+  timestep = time increment (day)
+  schedule = number of timesteps to be simulated
+  solver = 'incompressible', 'slicomp', or 'compressible'
+  xy_inactive = list of inactive block coordinates (for IRREGULAR reservoir)
+  e.g: [(1,1), (2,3), (3,4)]
+  linear_solver = pressure solver options
+  * method: 'direct' (sparse LU), or iterative 'cg', 'bicgstab', 'gmres'
+  * preconditioner, tol, maxiter: options of the iterative solvers 
+    (see 'solve_pressure_iterative2d'). The pressure of the previous timestep 
+    is the initial guess
+  solver_report = list where the iterations and residual of each timestep are 
+                  appended (iterative solvers and 'compressible' only), and the 
+                  size and pressure change of each adaptive timestep
+  pvt = PVT table of the fluid for 'compressible' (e.g. from 'gas_pvt_table'). 
+        Default is a liquid of constant compressibility CFLUID ('liquid_pvt_table'), 
+        with B and mu of the reservoir input (the same in all blocks)
+  newton = options of the Newton-Raphson iterations for 'compressible'
+  * tol: tolerance of the residual and of the pressure update
+  * maxiter: maximum number of iterations of each timestep
+  * dp_max: maximum pressure change of a Newton update (psi)
+  report_times = times (day) where the pressure is reported, for 'slicomp' and 
+                 'compressible' with ADAPTIVE timestep. 'timestep' is the initial 
+                 timestep, and 'schedule' is not used. A timestep shortened to 
+                 end at a report time is solved once, without keeping its matrix 
+                 and factorization in the cache
+  timestep_control = options of the adaptive timestep (see 'adaptive_timestep')
+  * dt_initial, dt_min, dt_max: initial, minimum, and maximum timestep (day)
+  * dp_target: target of the maximum pressure change of a timestep (psi)
+  * dp_max: timestep with larger maximum pressure change is repeated (psi)
+  * lte_target: target of the local truncation error (psi), or None
+  * growth, cut: maximum factor to grow and to cut the timestep
+  profile = list where the wall time of each phase (setup, assemble, rhs, factorize,
+            solve, newton, wells) is appended, with the iterations and array 
+            sizes (see 'profile_phase', 'profile_summary', 'profile_chrome_trace')
+  sim = set up of the simulation of these inputs (from 'setup_simulation_2d', or 
+        'load_model_2d' from the model cache), so it is not calculated again
+
+  Output:
+
+  p_sol = pressure solution (2D array) for 'incompressible', or pressure 
+          solution at each timestep including 'p_initial' (3D array) for 'slicomp' 
+          and 'compressible'. With 'report_times', the pressure at each report time
+  """
+  import numpy as np
+
+  # number of blocks in x and y
+  xi = reservoir_input['xi']
+  yi = reservoir_input['yi']
+
+  steps = simulate_2d_steps(reservoir_input, wells, west_boundary, east_boundary, 
+                            south_boundary, north_boundary, z_array, p_initial=p_initial, 
+                            timestep=timestep, schedule=schedule, solver=solver, 
+                            xy_inactive=xy_inactive, linear_solver=linear_solver, 
+                            solver_report=solver_report, pvt=pvt, newton=newton,
+                            report_times=report_times, timestep_control=timestep_control,
+                            profile=profile, sim=sim)
+
+  if solver == 'incompressible':
+    t, p_sol, q_well, fbhp_well = next(steps)
+    return p_sol
+
+  # times where the pressure is recorded
+  if report_times is None:
+    report_times = timestep * np.arange(1, schedule + 1)
+
+  # the pressure of each report time is filled in the output as soon as it is solved
+  p_sol_ = np.full((len(report_times) + 1, xi, yi), np.nan)
+
+  t, p_sol_[0], q_well, fbhp_well = next(steps)
+
+  k = 0
+  for t, p_sol, q_well, fbhp_well in steps:
+    if k < len(report_times) and abs(t - report_times[k]) <= 1e-9 * abs(report_times[k]):
+      p_sol_[k + 1] = p_sol
+      k = k + 1
+
+  return p_sol_
+
+def write_simulation_2d(path, reservoir_input, wells, west_boundary, east_boundary, 
+                        south_boundary, north_boundary, z_array, chunk=64, **options):
+  """
+  2D Reservoir Simulation where the pressure of each timestep and the rate 
+  and FBHP of the wells are written to an on-disk results store, so the 
+  pressure history is not kept in memory
+
+  Input:
+
+  path = directory of the results store (see 'results_create')
+  reservoir_input, wells, west_boundary, east_boundary, south_boundary, north_boundary, 
+  z_array = as 'run_simulation_2d'
+  chunk = number of timesteps of each chunk of the results store
+  options = other options of 'run_simulation_2d' (timestep, schedule, solver, etc.)
+
+  Output:
+
+  results = the results store opened for reading (see 'results_open', 
+            'results_pressure', and 'results_well')
+  """
+  from input_output import results_create, results_append, results_close, results_open
+
+  steps = simulate_2d_steps(reservoir_input, wells, west_boundary, east_boundary, 
+                            south_boundary, north_boundary, z_array, **options)
+
+  store = results_create(path, (reservoir_input['xi'], reservoir_input['yi']), 
+                         wells['well_name'], chunk=chunk)
+  try:
+    for t, p_sol, q_well, fbhp_well in steps:
+      results_append(store, t, p_sol, q_well, fbhp_well)
+  finally:
+    results_close(store)
+
+  return results_open(path)
+
+def run_ensemble_2d(reservoir_input, wells, west_boundary, east_boundary, 
+                    south_boundary, north_boundary, z_array, scenarios, 
+                    p_initial=None, timestep=1, schedule=1, solver='slicomp', 
+                    xy_inactive=None):
+  """
+  2D Reservoir Simulation of an ensemble of scenarios on the same grid 
+  (well rates / pressures or boundary values)
+
+  The scenarios differ only in the RHS constants, so the K scenarios are 
+  stacked as K columns of the RHS matrix, and solved from one LU factorization 
+  of the LHS matrix at each timestep
+
+  Input:
+
+  reservoir_input, wells, west_boundary, east_boundary, south_boundary, north_boundary, 
+  z_array, p_initial, timestep, schedule, xy_inactive = as 'run_simulation_2d'
+  scenarios = list of scenarios (as Python dictionary format), each may contain:
+  * well_value (values of the well operating conditions, in the order of 'wells')
+  * west_value, east_value, south_value, north_value (boundary values)
+  The well conditions and boundary types are the same in all scenarios
+  solver = 'incompressible' or 'slicomp'
+
+  Output:
+
+  p_sol = pressure solution of each scenario at each timestep including 
+          'p_initial' (4D array, K x T x xi x yi). T = 1 for 'incompressible'
+  """
+  import numpy as np
+
+  from boundary import boundary2d_grid
+  from solver import lhs_coeffs2d_grid, rhs_constant2d_grid, lhs_mat2d_sparse, factorize_lhs, solve_factorized
+  from kernels import accumulation_term
+
+  # number of blocks in x and y
+  xi = reservoir_input['xi']
+  yi = reservoir_input['yi']
+
+  # blocks are homogeneous and same in size
+  dx, dy, dz = reservoir_input['dx'], reservoir_input['dy'], reservoir_input['dz']
+  kx, ky = reservoir_input['kx'], reservoir_input['ky']
+  B, mu = reservoir_input['B'], reservoir_input['mu']
+
+  sim = setup_simulation_2d(reservoir_input, wells, west_boundary, east_boundary, 
+                            south_boundary, north_boundary, z_array, 
+                            p_initial=p_initial, xy_inactive=xy_inactive)
+
+  bound_loc, block_active = sim['bound_loc'], sim['block_active']
+  well_tab, T_array = sim['well_table'], sim['T_array']
+
+  " Produce LHS matrix, factorized once for all scenarios and timesteps "
+
+  px_min, px_plus, py_min, py_plus, p = lhs_coeffs2d_grid(bound_loc, well_tab, T_array, mu, B,
+                                                          solver=solver, 
+                                                          reservoir_input=reservoir_input,
+                                                          timestep=timestep)
+  lhs_mat = lhs_mat2d_sparse(bound_loc, px_min, px_plus, py_min, py_plus, p, sim['active_index'])
+  lu = factorize_lhs(lhs_mat)
+
+  " Constant part of the RHS of each scenario (boundaries, wells, potential) "
+
+  boundaries = {'west': west_boundary, 'east': east_boundary, 
+                'south': south_boundary, 'north': north_boundary}
+
+  rhs_constant = []
+  for scenario in scenarios:
+    bound = {side: dict(boundaries[side]) for side in boundaries}
+    for side in bound:
+      if side + '_value' in scenario:
+        bound[side]['value'] = scenario[side + '_value']
+
+    boundary_grid = boundary2d_grid(bound_loc, bound['west'], bound['east'], 
+                                    bound['south'], bound['north'])
+    boundary_grid['T'] = sim['boundary_grid']['T']
+
+    well_tab_ = well_tab.copy()
+    if 'well_value' in scenario:
+      well_tab_['value'] = scenario['well_value']
+
+    rhs = rhs_constant2d_grid(boundary_grid, well_tab_, sim['potential'], 
+                              dx, dy, dz, kx, ky, mu, B, solver='incompressible')
+    rhs_constant.append(rhs.reshape(-1, order='F')[block_active])
+
+  rhs_constant = np.array(rhs_constant).T  # N_active x K
+
+  " Timestep evolution of computing RHS and solving the pressure of all scenarios "
+
+  K, n = len(scenarios), len(block_active)
+
+  if solver == 'incompressible':
+    p_record = [solve_factorized(lu, rhs_constant).reshape((K, n))]
+
+  if solver == 'slicomp':
+    # accumulation term of the ACTIVE BLOCKS, the coefficient of the previous pressure
+    Vb = dx * dy * dz
+    ct = reservoir_input['cpore'] + reservoir_input['cfluid']
+    accumulation = accumulation_term(Vb, reservoir_input['poro'], ct, B, timestep)
+    accumulation = np.broadcast_to(accumulation, (xi, yi)).reshape(-1, order='F')[block_active][:, None]
+
+    p_active = np.asarray(sim['p_initial'], dtype='float64').reshape(-1, order='F')[block_active]
+    p_record = [np.tile(p_active, (K, 1))]
+    for t in range(schedule):
+      rhs_mat = rhs_constant - accumulation * p_record[-1].T
+      p_record.append(solve_factorized(lu, rhs_mat).reshape((K, n)))
+
+  " Scatter the pressure of ACTIVE BLOCKS back to the whole grid "
+
+  p_sol = np.full((K, len(p_record), xi * yi), np.nan)
+  p_sol[:,:,block_active] = np.stack(p_record, axis=1)
+  p_sol = p_sol.reshape((K, len(p_record), yi, xi)).transpose((0, 1, 3, 2))
+  return p_sol
+
+def _sweep_worker_init(memory_limit):
+  """
+  Initialize a worker process of the sweep: cap its memory (address space, bytes)
+  """
+  if memory_limit is not None:
+    import resource
+    resource.setrlimit(resource.RLIMIT_AS, (int(memory_limit), int(memory_limit)))
+
+def _sweep_case(shared, reservoir_input, wells, boundaries, case, options):
+  """
+  Run one case of the sweep in a worker process. The grid arrays are 
+  attached from shared memory instead of being copied to the worker
+  """
+  import numpy as np
+  from multiprocessing import shared_memory
+
+  blocks, arrays = [], {}
+  for name, (shm_name, shape, dtype) in shared.items():
+    shm = shared_memory.SharedMemory(name=shm_name)
+    blocks.append(shm)
+    arrays[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+  try:
+    # the array properties are not passed, only shared
+    reservoir_input = dict(reservoir_input)
+    for name, value in arrays.items():
+      if name.startswith('reservoir_input.'):
+        reservoir_input[name.split('.', 1)[1]] = value
+    reservoir_input.update(case.get('reservoir_input', {}))
+
+    wells = dict(wells)
+    wells.update(case.get('wells', {}))
+
+    p_sol = run_simulation_2d(reservoir_input, wells, *boundaries, arrays['z_array'], 
+                              p_initial=arrays.get('p_initial'), **options)
+    p_sol = np.array(p_sol)
+  finally:
+    for shm in blocks:
+      shm.close()
+
+  return p_sol
+
+def run_sweep_2d(reservoir_input, wells, west_boundary, east_boundary, 
+                 south_boundary, north_boundary, z_array, cases, p_initial=None, 
+                 max_workers=None, memory_limit=None, **options):
+  """
+  2D Reservoir Simulation of a parameter sweep, where the cases differ in 
+  the LHS matrix (e.g. permeability or skin), run in parallel processes
+
+  The grid arrays (depth, initial pressure, and the array properties of 
+  'reservoir_input') are put once in shared memory, so they are not copied 
+  to each case. The result of each case is returned as soon as it finishes
+
+  Input:
+
+  reservoir_input, wells, west_boundary, east_boundary, south_boundary, north_boundary, 
+  z_array, p_initial = as 'run_simulation_2d'
+  cases = list of cases (as Python dictionary format), each may contain:
+  * reservoir_input (values replacing those of 'reservoir_input', e.g. {'kx': 50})
+  * wells (values replacing those of 'wells', e.g. {'well_skin': np.array([0, 2])})
+  max_workers = maximum number of worker processes (default is the number of CPUs)
+  memory_limit = maximum memory of each worker process (bytes), or None
+  options = other options of 'run_simulation_2d' (timestep, schedule, solver, etc.)
+
+  Output:
+
+  generator of (i, p_sol), where i is the index of the case in 'cases', and 
+  p_sol the pressure solution of the case (as 'run_simulation_2d'), in the 
+  order the cases finish
+  """
+  import numpy as np
+  from concurrent.futures import ProcessPoolExecutor, as_completed
+  from multiprocessing import shared_memory
+
+  # grid arrays to be shared
+  arrays = {'z_array': z_array}
+  if p_initial is not None:
+    arrays['p_initial'] = p_initial
+  for key, value in reservoir_input.items():
+    if isinstance(value, np.ndarray) and value.ndim > 0:
+      arrays['reservoir_input.' + key] = value
+
+  blocks, shared = [], {}
+  try:
+    for name, value in arrays.items():
+      value = np.ascontiguousarray(value, dtype='float64')
+      shm = shared_memory.SharedMemory(create=True, size=max(value.nbytes, 1))
+      blocks.append(shm)
+      np.ndarray(value.shape, dtype=value.dtype, buffer=shm.buf)[...] = value
+      shared[name] = (shm.name, value.shape, value.dtype.str)
+
+    boundaries = (west_boundary, east_boundary, south_boundary, north_boundary)
+    reservoir_input = {key: value for key, value in reservoir_input.items()
+                       if 'reservoir_input.' + key not in shared}
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_sweep_worker_init,
+                             initargs=(memory_limit,)) as executor:
+      futures = {executor.submit(_sweep_case, shared, reservoir_input, wells, 
+                                 boundaries, case, options): i 
+                 for i, case in enumerate(cases)}
+      for future in as_completed(futures):
+        yield futures[future], future.result()
+
+  finally:
+    for shm in blocks:
+      shm.close()
+      shm.unlink()
+
+def setup_simulation_3d(reservoir_input, wells, west_boundary, east_boundary, 
+                        south_boundary, north_boundary, z_array, 
+                        top_boundary=None, bottom_boundary=None):
+  """
+  Set up the well table, the boundaries, the transmissibilities, and the 
+  potential term of a 3D simulation (as 'setup_simulation_2d'). These do 
+  not change over the timesteps, so they are calculated once before the simulation
+
+  Input:
+
+  reservoir_input, wells, west_boundary, east_boundary, south_boundary, north_boundary = 
+  reservoir data as passed by 'read_input' (with zi and kz)
+  z_array = depth of grid blocks (3D array), or depth of the center of the top 
+            layer (2D array). The center of a layer below is the thickness of the 
+            layers above plus half its own dz below the top of the reservoir
+  top_boundary, bottom_boundary = boundary of the top and bottom of the reservoir
+                                  (see 'boundary3d_grid'). Default is no flow
+
+  Output:
+
+  sim = simulation set up (as Python dictionary format)
+  contains:
+  * z_array (depth of grid blocks, 3D array)
+  * well_table (from 'well_table', one record per completion)
+  * completion_well (index of the well of each completion, in the order of 'wells')
+  * boundary_grid (from 'boundary3d_grid', with the boundary transmissibilities 'T')
+  * T_array (from 'transmissibility3d_grid')
+  * potential (potential term of each block)
+  """
+  import numpy as np
+
+  from boundary import boundary3d_grid
+  from transmissibility import transmissibility3d_grid
+  from wellblock import well_table
+  from potential import potential_term3d
+
+  xi, yi, zi = reservoir_input['xi'], reservoir_input['yi'], reservoir_input['zi']
+  dx, dy, dz = reservoir_input['dx'], reservoir_input['dy'], reservoir_input['dz']
+  kx, ky, kz = reservoir_input['kx'], reservoir_input['ky'], reservoir_input['kz']
+  B, mu, rho = reservoir_input['B'], reservoir_input['mu'], reservoir_input['rho']
+
+  # depth of the center of each layer, from the thickness of the layers above
+  # (dz may vary per layer or per block)
+  z_array = np.asarray(z_array, dtype='float64')
+  if z_array.ndim < 3:
+    dz_grid = np.broadcast_to(dz, (xi, yi, zi))
+    above = np.cumsum(dz_grid, axis=2) - dz_grid
+    z_array = (np.broadcast_to(z_array, (xi, yi))[:,:,np.newaxis] + above 
+               + 0.5 * (dz_grid - dz_grid[:,:,:1]))
+
+  """""""""""
+  WELL INFORMATION PROCESSING
+  """""""""""
+
+  # a well at (x, y) is completed in all layers, a well at (x, y, z) in one layer.
+  # The rate of a 'constant_rate' well is allocated to its completions by kh
+  n_wells = len(np.atleast_1d(wells['well_name']))
+  well_loc = [list(loc) for loc in np.array(wells['well_loc']).astype(int).reshape(n_wells, -1)]
+  kh = np.broadcast_to(kx * dz, (xi, yi, zi))
+
+  completion_well, completion_loc, completion_fraction = [], [], []
+  for i in range(n_wells):
+    loc = [well_loc[i]] if len(well_loc[i]) == 3 else [well_loc[i] + [k] for k in range(1, zi + 1)]
+    kh_well = np.array([kh[x-1,y-1,z-1] for x, y, z in loc])
+    completion_well += [i] * len(loc)
+    completion_loc += loc
+    completion_fraction += list(kh_well / np.sum(kh_well))
+
+  completion_well, completion_fraction = np.array(completion_well), np.array(completion_fraction)
+  completions = {key: np.atleast_1d(wells[key])[completion_well] 
+                 for key in ['well_name', 'well_rw', 'well_skin', 'well_condition', 
+                             'well_value', 'well_config']}
+  completions['well_loc'] = completion_loc
+  rate = completions['well_condition'].astype(str) == 'constant_rate'
+  completions['well_value'] = np.where(rate, completions['well_value'] * completion_fraction,
+                                       completions['well_value'])
+
+  well_tab = well_table(completions, reservoir_input)
+
+  """""""""""
+  BOUNDARY PROCESSING
+  """""""""""
+
+  # boundary type and value at the sides of each block
+  boundary_grid = boundary3d_grid((xi, yi, zi), west_boundary, east_boundary, 
+                                  south_boundary, north_boundary, 
+                                  top_boundary, bottom_boundary)
+
+  # INTER-BLOCK transmissibilities, and BOUNDARY transmissibilities at the sides
+  T_array = transmissibility3d_grid(boundary_grid, dx, dy, dz, kx, ky, kz, mu, B)
+  boundary_grid['T'] = np.where(boundary_grid['type'] != '', T_array, 0)
+
+  # potential term, from the elevation of the neighboring blocks
+  potential = potential_term3d(rho, T_array, z_array, boundary_grid['type'] != '')
+
+  sim = {'z_array': z_array, 'well_table': well_tab, 'completion_well': completion_well, 
+         'boundary_grid': boundary_grid, 'T_array': T_array, 'potential': potential}
+  return sim
+
+def simulate_3d_steps(reservoir_input, wells, west_boundary, east_boundary, 
+                      south_boundary, north_boundary, z_array, p_initial=None, 
+                      timestep=1, schedule=1, solver='slicomp', 
+                      top_boundary=None, bottom_boundary=None,
+                      linear_solver=dict({"method": "cg", "preconditioner": "ilu",
+                                          "tol": 1e-8, "maxiter": None}),
+                      solver_report=None, profile=None):
+  """
+  3D Reservoir Simulation in Rectangular Grids, one timestep at a time
+  (as 'simulate_2d_steps')
+
+  Input: as 'run_simulation_3d'
+
+  Output:
+
+  generator of (t, p_sol, q_well, fbhp_well) at each timestep, where t is the 
+  time (day), p_sol the pressure solution (3D array), and q_well and fbhp_well 
+  the rate (STB/D) and FBHP (psi) of each well (in the order of 'wells'). 
+  The rate of a well is the sum of its completions, the FBHP the kh-weighted 
+  average. The first is the initial pressure at t = 0. For 'incompressible', 
+  only one steady state solution at t = 0
+  """
+  import numpy as np
+
+  from solver import lhs_coeffs3d_grid, rhs_constant3d_grid, lhs_mat3d_sparse
+  from solver import factorize_lhs, solve_factorized, solve_pressure_iterative2d, lhs_fingerprint
+  from wellblock import well_rates
+  from profiling import profile_phase, array_nbytes
+  from kernels import accumulation_term
+
+  xi, yi, zi = reservoir_input['xi'], reservoir_input['yi'], reservoir_input['zi']
+  dx, dy, dz = reservoir_input['dx'], reservoir_input['dy'], reservoir_input['dz']
+  kx, ky, kz = reservoir_input['kx'], reservoir_input['ky'], reservoir_input['kz']
+  B, mu = reservoir_input['B'], reservoir_input['mu']
+  n = xi * yi * zi
+
+  with profile_phase(profile, 'setup') as phase:
+    sim = setup_simulation_3d(reservoir_input, wells, west_boundary, east_boundary, 
+                              south_boundary, north_boundary, z_array, 
+                              top_boundary, bottom_boundary)
+    phase['nbytes'] = array_nbytes(sim['T_array'], sim['potential'])
+
+  well_tab, completion_well = sim['well_table'], sim['completion_well']
+  boundary_grid, T_array, potential = sim['boundary_grid'], sim['T_array'], sim['potential']
+  n_wells = len(np.atleast_1d(wells['well_name']))
+
+  # kh-weights of the completions of each well, for the FBHP
+  weight = well_tab['kh'] * well_tab['h']
+  weight = weight / np.bincount(completion_well, weight, n_wells)[completion_well]
+
+  # all blocks are active (mesh of the blocks for the iterative solver)
+  x = np.zeros((n, 1))
+
+  # constant part of the RHS (boundaries, wells, potential), calculated once
+  with profile_phase(profile, 'rhs') as phase:
+    rhs_constant = rhs_constant3d_grid(boundary_grid, well_tab, potential, 
+                                       dx, dy, dz, kx, ky, kz, mu, B, solver='incompressible')
+    rhs_constant = rhs_constant.reshape(-1, order='F')
+    phase['nbytes'] = array_nbytes(rhs_constant)
+
+  lhs = {}
+  cache = {}
+
+  def solve_timestep(p_sol, dt):
+    """
+    Solve the pressure after a timestep of size dt from pressure p_sol
+    """
+    if lhs.get('dt') != dt:
+      with profile_phase(profile, 'assemble', dt=dt) as phase:
+        coeffs, p = lhs_coeffs3d_grid(boundary_grid, well_tab, T_array, solver=solver, 
+                                      reservoir_input=reservoir_input, timestep=dt)
+        lhs['dt'] = dt
+        lhs['mat'] = lhs_mat3d_sparse(coeffs, p)
+        if solver == 'slicomp':
+          # accumulation term, the coefficient of the previous pressure
+          Vb = dx * dy * dz
+          ct = reservoir_input['cpore'] + reservoir_input['cfluid']
+          accumulation = accumulation_term(Vb, reservoir_input['poro'], ct, B, dt)
+          lhs['accumulation'] = np.broadcast_to(accumulation, (xi, yi, zi)).reshape(-1, order='F')
+        # fingerprint of the matrix for the cache, once per assembly
+        lhs['fingerprint'] = lhs_fingerprint(lhs['mat'])
+        phase['nbytes'] = array_nbytes(lhs['mat'])
+    key = (xi, yi, zi, tuple(well_tab['control']), dt)
+
+    with profile_phase(profile, 'rhs', dt=dt):
+      rhs = rhs_constant
+      if solver == 'slicomp':
+        rhs = rhs - (lhs['accumulation'] * np.asarray(p_sol, dtype='float64').reshape(-1, order='F'))
+      rhs_mat = rhs.reshape((-1, 1))
+
+    if linear_solver['method'] == 'direct':
+      lu = cache.get(key)
+      if lu is None or lu['fingerprint'] != lhs['fingerprint']:
+        with profile_phase(profile, 'factorize', dt=dt) as phase:
+          lu = factorize_lhs(lhs['mat'], cache, key, fingerprint=lhs['fingerprint'])
+          phase['nbytes'] = array_nbytes(lu)
+      with profile_phase(profile, 'solve', dt=dt):
+        p_new = solve_factorized(lu, rhs_mat)
+    else:
+      report = []
+      p_guess = None if p_sol is None else np.reshape(p_sol, (n, 1), order='F')
+      with profile_phase(profile, 'solve', dt=dt) as phase:
+        p_new = solve_pressure_iterative2d(lhs['mat'], rhs_mat, x, method=linear_solver['method'],
+                                           preconditioner=linear_solver.get('preconditioner', 'ilu'),
+                                           tol=linear_solver.get('tol', 1e-8), 
+                                           maxiter=linear_solver.get('maxiter', None),
+                                           p_guess=p_guess, report=report, 
+                                           cache=cache, key=key, fingerprint=lhs['fingerprint'])
+        phase['iterations'] = report[-1]['iterations']
+      if solver_report is not None:
+        solver_report.extend(report)
+
+    return np.reshape(p_new, (xi, yi, zi), order='F')
+
+  def rates(p_sol):
+    """
+    Rate and FBHP of the wells from the pressure of the completions
+    """
+    with profile_phase(profile, 'wells'):
+      p_block = np.asarray(p_sol, dtype='float64').reshape(-1, order='F')[well_tab['loc']]
+      q, pwf = well_rates(well_tab, p_block)
+      q_well = np.bincount(completion_well, q, n_wells)
+      fbhp_well = np.bincount(completion_well, weight * pwf, n_wells)
+      return q_well, fbhp_well
+
+  " Timestep evolution of computing RHS and solving the pressure "
+
+  # initiate solution pressure with the initial pressure array (p_initial).
+  # A 2D initial pressure (as the 2D simulation) is the same in all layers
+  p_sol = p_initial
+  if p_sol is not None:
+    p_sol = np.asarray(p_initial, dtype='float64')
+    if p_sol.ndim == 2:
+      p_sol = p_sol[:,:,np.newaxis]
+    p_sol = np.broadcast_to(p_sol, (xi, yi, zi))
+
+  if solver == 'incompressible':
+    # steady state, solved once (the initial pressure is the initial guess)
+    p_sol = solve_timestep(p_sol, timestep)
+    yield (0, p_sol) + rates(p_sol)
+    return
+
+  # the initial pressure
+  yield (0, p_sol) + rates(p_sol)
+
+  for t in range(schedule):
+    p_sol = solve_timestep(p_sol, timestep)
+    yield ((t + 1) * timestep, p_sol) + rates(p_sol)
+
+def run_simulation_3d(reservoir_input, wells, west_boundary, east_boundary, 
+                      south_boundary, north_boundary, z_array, p_initial=None, 
+                      timestep=1, schedule=1, solver='slicomp', 
+                      top_boundary=None, bottom_boundary=None,
+                      linear_solver=dict({"method": "cg", "preconditioner": "ilu",
+                                          "tol": 1e-8, "maxiter": None}),
+                      solver_report=None, profile=None):
+  """
+  3D Reservoir Simulation in Rectangular Grids (layered, regular)
+
+  The blocks communicate with 6 neighbors (7-point stencil), with the vertical 
+  transmissibility from KZ and the potential term from the depth of the layers.
+  The LHS matrix is assembled as a sparse 7-point matrix ('lhs_mat3d_sparse'). 
+  The default pressure solver is the conjugate gradient with ILU(0), because 
+  a direct (LU) solve of large 3D grids fills in much more memory
+
+  Input:
+
+  reservoir_input, wells, west_boundary, east_boundary, south_boundary, north_boundary = 
+  reservoir data as passed by 'read_input' (with zi and kz, CPORE and CFLUID in 1/psi).
+  A well at (x, y) is completed in all layers, a well at (x, y, z) in one layer
+
+  z_array = depth of grid blocks, positive downward (3D array), or depth of the center 
+            of the top layer (2D array, as 'run_simulation_2d'; see 'setup_simulation_3d')
+  p_initial = initial pressure of grid blocks (3D array, 2D array of the same 
+              pressure in all layers, or float), for 'slicomp'. For 'incompressible', 
+              the initial guess of the iterative pressure solver
+  timestep = time increment (day)
+  schedule = number of timesteps to be simulated
+  solver = 'incompressible' or 'slicomp'
+  top_boundary, bottom_boundary = boundary of the top and bottom of the reservoir,
+                                  as the other boundaries (default is no flow)
+  linear_solver = pressure solver options (as 'run_simulation_2d')
+  solver_report = list where the iterations and residual of each timestep are appended
+  profile = list where the wall time of each phase is appended (see 'profile_phase')
+
+  Output:
+
+  p_sol = pressure solution (3D array) for 'incompressible', or pressure 
+          solution at each timestep including 'p_initial' (4D array) for 'slicomp'
+  """
+  import numpy as np
+
+  xi, yi, zi = reservoir_input['xi'], reservoir_input['yi'], reservoir_input['zi']
+
+  steps = simulate_3d_steps(reservoir_input, wells, west_boundary, east_boundary, 
+                            south_boundary, north_boundary, z_array, p_initial=p_initial, 
+                            timestep=timestep, schedule=schedule, solver=solver, 
+                            top_boundary=top_boundary, bottom_boundary=bottom_boundary,
+                            linear_solver=linear_solver, solver_report=solver_report, 
+                            profile=profile)
+
+  if solver == 'incompressible':
+    t, p_sol, q_well, fbhp_well = next(steps)
+    return p_sol
+
+  # the pressure of each timestep is filled in the output as soon as it is solved
+  p_sol_ = np.empty((schedule + 1, xi, yi, zi))
+  for k, (t, p_sol, q_well, fbhp_well) in enumerate(steps):
+    p_sol_[k] = p_sol
+
+  return p_sol_
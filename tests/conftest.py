@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the modules of PyReSim are imported from 'functions' and 'simulators'
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in ['functions', 'simulators']:
+  sys.path.insert(0, os.path.join(root, folder))
@@ -0,0 +1,64 @@
+"""
+Tests of the whole-grid 2D coefficients ('lhs_coeffs2d_grid', 'rhs_constant2d_grid') 
+against the per-block functions of the notebooks, for a reservoir without elevation
+"""
+import numpy as np
+import pytest
+
+from simulators import setup_simulation_2d
+from solver import lhs_coeffs2d_welltype, rhs_constant2d_welltype, lhs_coeffs2d_grid, \
+                   rhs_constant2d_grid, fill2d_lhs_mat, lhs_mat2d_sparse
+from wellblock import WELL_CONTROL
+
+def reservoir():
+  reservoir_input = {'xi': 5, 'yi': 4, 'dx': 300., 'dy': 250., 'dz': 40., 'kx': 150., 'ky': 100., 
+                     'poro': .2, 'rho': 50., 'cpore': 1e-6, 'mu': 3.5, 'B': 1.2, 'cfluid': 1e-5}
+  wells = {'well_name': np.array(['A', 'B', 'C']), 'well_loc': [[2, 2], [4, 3], [5, 1]], 
+           'well_rw': np.array([3., 3., 3.]), 'well_skin': np.array([0., 1., 0.]), 
+           'well_condition': np.array(['constant_fbhp', 'constant_rate', 'shutin']), 
+           'well_value': np.array([2000., -600., 0.]), 'well_config': np.array([0., 0., 0.])}
+  boundaries = [{'type': 'constant_pressure', 'value': 3000., 'loc': 'all'}, 
+                {'type': 'no_flow', 'value': 0., 'loc': 'all'}, 
+                {'type': 'constant_rate', 'value': -100., 'loc': 'all'}, 
+                {'type': 'constant_pressuregrad', 'value': -.2, 'loc': 'all'}]
+  return reservoir_input, wells, boundaries
+
+@pytest.mark.parametrize('solver', ['incompressible', 'slicomp'])
+def test_grid_is_per_block(solver):
+  reservoir_input, wells, boundaries = reservoir()
+  xi, yi = 5, 4
+  p_initial = np.linspace(3000., 3500., xi * yi).reshape((xi, yi))
+  sim = setup_simulation_2d(reservoir_input, wells, *boundaries, np.full((xi, yi), 3000.), p_initial)
+  bound_loc, well_tab, boundary_grid, T_array = sim['bound_loc'], sim['well_table'], sim['boundary_grid'], sim['T_array']
+  grid = {key: reservoir_input[key] for key in ('dx', 'dy', 'dz', 'kx', 'ky', 'mu', 'B')}
+  condition = {code: name for name, code in WELL_CONTROL.items() if name != 'no_flow'}
+
+  # per-block, as the loops of the notebooks
+  lhs_mat, rhs_mat = np.zeros((xi * yi, xi * yi)), np.zeros(xi * yi)
+  for j in range(yi):
+    for i in range(xi):
+      k = i + j * xi
+      well = {'condition': np.nan, 'value': np.nan, 'rw': np.nan, 'Gw': np.nan}
+      for record in well_tab[well_tab['loc'] == k]:
+        well = {'condition': condition[record['control']], 'value': record['value'], 
+                'rw': record['rw'], 'Gw': record['Gw']}
+      sides = np.where(boundary_grid['type'][i,j] != '')[0]
+      boundary = {'loc': None, 'type': None, 'value': None, 'T': None}
+      if len(sides) > 0:
+        boundary = {'loc': sides + 1, 'type': boundary_grid['type'][i,j,sides], 
+                    'value': boundary_grid['value'][i,j,sides], 'T': list(boundary_grid['T'][i,j,sides])}
+
+      coeffs = lhs_coeffs2d_welltype(bound_loc[i,j], well, T_array[i,j], reservoir_input['mu'], 
+                                     reservoir_input['B'], solver, reservoir_input, timestep=5)
+      fill2d_lhs_mat(bound_loc[i,j], k + 1, xi, lhs_mat, *coeffs)
+      rhs_mat[k] = rhs_constant2d_welltype(boundary, well, 0., **grid, solver=solver, p_initial=p_initial[i,j], 
+                                           reservoir_input=reservoir_input, timestep=5)
+
+  # whole grid
+  coeffs = lhs_coeffs2d_grid(bound_loc, well_tab, T_array, reservoir_input['mu'], reservoir_input['B'], 
+                             solver, reservoir_input, timestep=5)
+  rhs = rhs_constant2d_grid(boundary_grid, well_tab, np.zeros((xi, yi)), **grid, solver=solver, 
+                            p_initial=p_initial, reservoir_input=reservoir_input, timestep=5)
+
+  np.testing.assert_allclose(lhs_mat2d_sparse(bound_loc, *coeffs).toarray(), lhs_mat, rtol=1e-12)
+  np.testing.assert_allclose(rhs.reshape(-1, order='F'), rhs_mat, rtol=1e-12)
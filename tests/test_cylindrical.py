@@ -0,0 +1,53 @@
+"""
+Tests of the cylindrical simulators, the 1D (r) and the 2D (r-z) simulation
+"""
+import numpy as np
+import pytest
+
+from simulators import simulate_1d_cylindrical, simulate_1d_cylindrical_steps, run_simulation_2d_cylindrical
+
+outer_boundaries = [{'type': 'constant_pressure', 'value': 4000.}, 
+                    {'type': 'no_flow', 'value': 0.}, 
+                    {'type': 'constant_rate', 'value': 300.}, 
+                    {'type': 'constant_pressuregrad', 'value': -.1}]
+
+@pytest.mark.parametrize('outer', outer_boundaries, ids=lambda b: b['type'])
+def test_one_layer_is_1d(outer):
+  # r-z simulation with one layer against the 1D cylindrical simulation
+  inner = {'type': 'constant_rate', 'value': -1000.}
+  p_1d, q_1d, rn = simulate_1d_cylindrical(40, 30., .2, 100., 50., 1.2, 1.5, 5., 10., .5, 1000., 
+                                           inner, outer, -1000., 4000., 1, 20)
+  p_rz, q_rz, fbhp, rn_rz = run_simulation_2d_cylindrical(40, 1, 30., .2, 100., 100., 50., 1.2, 1.5, 
+                                                          5., 10., .5, 1000., outer, 
+                                                          {'condition': 'constant_rate', 'value': -1000.}, 
+                                                          4000., 1, 20)
+
+  assert p_1d.shape == (21, 1, 40)
+  np.testing.assert_allclose(p_rz, p_1d, rtol=0, atol=1e-6)
+  np.testing.assert_allclose(q_1d, -1000.)
+
+def test_layers_without_gravity_are_1d():
+  # with the well in all layers and no density, there is no vertical flow,
+  # and each layer is the 1D cylindrical simulation
+  inner = {'type': 'constant_rate', 'value': -1000.}
+  p_1d, q_1d, rn = simulate_1d_cylindrical(40, 30., .2, 100., 50., 1.2, 1.5, 5., 10., .5, 1000., 
+                                           inner, outer_boundaries[0], -1000., 4000., 1, 20)
+  p_rz, q_rz, fbhp, rn_rz = run_simulation_2d_cylindrical(40, 3, 30., .2, 100., 100., 0., 1.2, 1.5, 
+                                                          5., 10., .5, 1000., outer_boundaries[0], 
+                                                          {'condition': 'constant_rate', 'value': -1000.}, 
+                                                          4000., 1, 20)
+
+  assert p_rz.shape == (21, 3, 40)
+  np.testing.assert_allclose(p_rz, np.repeat(p_1d, 3, axis=1), rtol=0, atol=1e-6)
+  np.testing.assert_allclose(q_rz, -1000.)
+
+def test_steps_are_the_run():
+  inner = {'type': 'constant_pressure', 'value': 2000.}
+  args = (20, 30., .2, 100., 50., 1.2, 1.5, 5., 10., .5, 1000., inner, outer_boundaries[0], 
+          -1000., 4000., 1, 5)
+  p_sol, q_well, rn = simulate_1d_cylindrical(*args)
+
+  steps = list(simulate_1d_cylindrical_steps(*args))
+  assert [t for t, p, q in steps] == [0, 1, 2, 3, 4, 5]
+  np.testing.assert_array_equal(np.array([p for t, p, q in steps]), p_sol[:,0])
+  np.testing.assert_array_equal(np.array([q[0] for t, p, q in steps]), q_well)
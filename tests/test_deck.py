@@ -0,0 +1,91 @@
+"""
+Tests of the reader of the input files (TXT format)
+"""
+import io
+import os
+
+import numpy as np
+import pytest
+
+from input_output import deck_values, read_input
+from simulators import run_simulation_2d
+
+benchmark = os.path.join(os.path.dirname(__file__), '..', 'input', 'benchmarks', 'benchmark2d_2x2_incomp.txt')
+irregular = os.path.join(os.path.dirname(__file__), '..', 'input', 'basic', 'irregular2d_slicomp.txt')
+
+def deck(tmp_path, keywords, filepath=benchmark):
+  # the deck with property keywords after the RESERVOIR INPUT table
+  lines = open(filepath).read().split('\n')
+  i = [n for n, line in enumerate(lines) if line.startswith('NX')][0] + 2
+  path = tmp_path / 'deck.txt'
+  path.write_text('\n'.join(lines[:i] + ['', keywords] + lines[i:]))
+  return str(path)
+
+@pytest.mark.parametrize('data', ['3000', '-0.2', '2,1', '3.5,2,1e3'])
+def test_values_as_loadtxt(data):
+  values = deck_values(data)
+  expected = np.loadtxt(io.StringIO(data), delimiter=',')
+
+  assert values.shape == expected.shape
+  np.testing.assert_array_equal(values, expected)
+
+def test_benchmark_deck():
+  reservoir_input, wells, west, east, south, north = read_input(benchmark)
+
+  assert (reservoir_input['xi'], reservoir_input['yi']) == (2, 2)
+  assert (reservoir_input['dx'], reservoir_input['dy'], reservoir_input['kx'], reservoir_input['mu']) == (350., 250., 150., 3.5)
+  assert wells['well_loc'] == [[2, 1], [1, 2]]
+  assert wells['well_condition'].tolist() == ['constant_fbhp', 'constant_rate']
+  np.testing.assert_array_equal(wells['well_value'], [2000., -600.])
+  assert (west['type'], west['value'], west['loc']) == ('constant_pressure', 3000., 'all')
+  assert (south['type'], south['value']) == ('constant_pressuregrad', -.2)
+  assert (north['type'], north['value']) == ('constant_rate', -100.)
+
+def test_property_of_each_block(tmp_path):
+  reservoir_input = read_input(deck(tmp_path, 'KX\n100 200\n300 400'))[0]
+  # x first, then y
+  np.testing.assert_array_equal(reservoir_input['kx'], [[100., 300.], [200., 400.]])
+  assert reservoir_input['ky'] == 100.
+
+def test_malformed_value(tmp_path):
+  with pytest.raises(ValueError):
+    deck_values('1 2 x 4')
+  with pytest.raises(ValueError):
+    read_input(deck(tmp_path, 'KX\n100 2o0\n300 400'))
+
+def test_binary_files_are_the_values(tmp_path):
+  # properties as binary files (NPY and raw), memory-mapped, against the same values in memory
+  xi, yi = 12, 9
+  rng = np.random.default_rng(0)
+  kx, poro = rng.uniform(50., 300., (xi, yi)), rng.uniform(.1, .3, (xi, yi)).astype('float32')
+  z_array = np.add.outer(np.linspace(9000., 9300., xi), np.zeros(yi))
+  xy_inactive = [(1,1), (1,6), (1,7), (12,9)]
+  actnum = np.ones((xi, yi), dtype='int8')
+  for i, j in xy_inactive:
+    actnum[i-1,j-1] = 0
+
+  np.save(tmp_path / 'kx.npy', kx)
+  poro.ravel(order='F').tofile(tmp_path / 'poro.bin')
+  actnum.ravel(order='F').tofile(tmp_path / 'actnum.bin')
+  np.save(tmp_path / 'depth.npy', z_array.ravel(order='F'))
+  files = 'KX\nFILE kx.npy\n\nPORO\nFILE poro.bin float32\n\nACTNUM\nFILE actnum.bin\n\nDEPTH\nFILE depth.npy'
+
+  data = read_input(deck(tmp_path, files, irregular))
+  reservoir_input = data[0]
+  assert all(isinstance(reservoir_input[key], np.memmap) for key in ('kx', 'poro', 'actnum', 'depth'))
+  np.testing.assert_array_equal(reservoir_input['kx'], kx)
+  np.testing.assert_array_equal(reservoir_input['actnum'], actnum)
+  np.testing.assert_array_equal(reservoir_input['depth'], z_array)
+
+  kw = dict(p_initial=np.full((xi, yi), 4000.), timestep=5, schedule=3)
+  reservoir_input = dict(reservoir_input, cpore=reservoir_input['cpore'] * 1e-6, cfluid=reservoir_input['cfluid'] * 1e-6)
+  p_sol = run_simulation_2d(reservoir_input, *data[1:], reservoir_input['depth'], **kw)
+
+  reservoir_memory = {key: value for key, value in reservoir_input.items() if key not in ('actnum', 'depth')}
+  reservoir_memory['kx'], reservoir_memory['poro'] = kx, poro.astype('float64')
+  np.testing.assert_array_equal(run_simulation_2d(reservoir_memory, *data[1:], z_array, xy_inactive=xy_inactive, **kw), 
+                                p_sol)
+
+  # a file of another grid
+  with pytest.raises(ValueError, match='kx.npy'):
+    read_input(deck(tmp_path, 'KX\nFILE kx.npy'))
@@ -0,0 +1,47 @@
+"""
+Tests of the ECLIPSE deck reader
+"""
+import os
+
+import numpy as np
+import pytest
+
+from input_output import read_eclipse
+
+template = os.path.join(os.path.dirname(__file__), '..', 'input', 'eclipse_template.DATA')
+
+def deck(tmp_path, grid):
+  path = tmp_path / 'deck.DATA'
+  path.write_text('DIMENS\n 3 2 2 /\nGRID\n' + grid + '\nEND\n')
+  return str(path)
+
+def test_template():
+  deck = read_eclipse(template)
+
+  assert deck['dimens'] == (10, 3, 3)
+  np.testing.assert_array_equal(deck['tops'][0,0], [5000., 5050., 5100.])
+  np.testing.assert_array_equal(deck['poro'][:,:,2], .18)
+  assert deck['welspecs'][0]['i'] == 10
+  assert [record['orat'] for record in deck['wconprod']] == [2000., 4000.]
+
+@pytest.mark.parametrize('chunk', [4, 2**20])
+def test_values_in_fortran_order(tmp_path, chunk):
+  # values parsed in chunks, with repeat counts, against the values in x, y, z order
+  values = np.arange(1., 13.)
+  deck_path = deck(tmp_path, 'PORO\n 1 2 3\n 4 5 6 7\n 2*8\n 10 11 12 /\n')
+  poro = read_eclipse(deck_path, chunk=chunk)['poro']
+
+  values[7:9] = 8.
+  np.testing.assert_array_equal(poro, values.reshape((3, 2, 2), order='F'))
+
+@pytest.mark.parametrize('grid', ['PERMX\n 11*100 /', 'PERMX\n 12*100 1 /', 'PERMX\n 1 2 3 /'])
+def test_wrong_number_of_values(tmp_path, grid):
+  with pytest.raises(ValueError, match='PERMX'):
+    read_eclipse(deck(tmp_path, grid))
+
+def test_tops_of_the_top_layer(tmp_path):
+  tops = read_eclipse(deck(tmp_path, 'DZ\n 6*10 6*20 /\nTOPS\n 6*1000 /'))['tops']
+  np.testing.assert_array_equal(tops[:,:,1], 1010.)
+
+  with pytest.raises(ValueError, match='DZ'):
+    read_eclipse(deck(tmp_path, 'TOPS\n 6*1000 /'))
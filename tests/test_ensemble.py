@@ -0,0 +1,70 @@
+"""
+Tests of the scenario ensemble and the parameter sweep, against the 2D 
+simulation of each scenario
+"""
+import numpy as np
+import pytest
+
+from simulators import run_simulation_2d, run_ensemble_2d, run_sweep_2d
+
+def reservoir():
+  # heterogeneous grid with inactive blocks at the corner
+  xi, yi = 7, 5
+  rng = np.random.default_rng(1)
+  reservoir_input = {'xi': xi, 'yi': yi, 'dx': 200. + 50. * rng.random((xi, yi)), 
+                     'dy': 250., 'dz': 30. + 20. * rng.random((xi, yi)), 
+                     'kx': 50. + 100. * rng.random((xi, yi)), 'ky': 80., 
+                     'poro': .1 + .2 * rng.random((xi, yi)), 'rho': 50., 
+                     'cpore': 1e-6, 'mu': 3.5, 'B': 1., 'cfluid': 1e-5}
+  wells = {'well_name': np.array(['A', 'B']), 'well_loc': [[2, 2], [5, 4]], 
+           'well_rw': np.array([3.5, 3.5]), 'well_skin': np.array([0., 0.]), 
+           'well_condition': np.array(['constant_rate', 'constant_fbhp']), 
+           'well_value': np.array([-300., 2500.]), 'well_config': np.array([0., 0.])}
+  x, y = np.meshgrid(np.arange(xi), np.arange(yi), indexing='ij')
+  z_array = 3000. + 20. * x + 10. * y
+  xy_inactive = [(7, 5), (7, 4), (6, 5)]
+  return reservoir_input, wells, z_array, xy_inactive
+
+def boundary(type, value=0.):
+  return {'type': type, 'value': value, 'loc': 'all'}
+
+@pytest.mark.parametrize('solver', ['incompressible', 'slicomp'])
+def test_ensemble_is_each_scenario(solver):
+  reservoir_input, wells, z_array, xy_inactive = reservoir()
+  bounds = [boundary('constant_pressure', 3000.), boundary('no_flow'), 
+            boundary('constant_pressuregrad', -.1), boundary('no_flow')]
+  scenarios = [{}, {'well_value': np.array([-500., 2000.])}, 
+               {'west_value': 3300., 'south_value': .2}]
+  kw = dict(timestep=5, schedule=3, solver=solver, xy_inactive=xy_inactive)
+  p_initial = np.full((7, 5), 3200.)
+
+  p_ensemble = run_ensemble_2d(reservoir_input, wells, *bounds, z_array, scenarios, 
+                               p_initial, **kw)
+
+  for k, scenario in enumerate(scenarios):
+    wells_ = dict(wells, well_value=scenario.get('well_value', wells['well_value']))
+    bounds_ = [dict(b, value=scenario.get(side + '_value', b['value'])) 
+               for side, b in zip(['west', 'east', 'south', 'north'], bounds)]
+    p_sol = run_simulation_2d(reservoir_input, wells_, *bounds_, z_array, p_initial, 
+                              linear_solver={'method': 'direct'}, **kw)
+    p_sol = p_sol.reshape((-1, 7, 5))
+    np.testing.assert_allclose(p_ensemble[k], p_sol, rtol=0, atol=1e-6)
+
+def test_sweep_is_each_case():
+  reservoir_input, wells, z_array, xy_inactive = reservoir()
+  bounds = [boundary('constant_pressure', 3000.), boundary('no_flow'), 
+            boundary('no_flow'), boundary('constant_rate', -50.)]
+  cases = [{}, {'reservoir_input': {'kx': reservoir_input['kx'] * 2}}, 
+           {'wells': {'well_skin': np.array([2., 0.])}}]
+  kw = dict(timestep=5, schedule=3, xy_inactive=xy_inactive)
+  p_initial = np.full((7, 5), 3200.)
+
+  p_sweep = dict(run_sweep_2d(reservoir_input, wells, *bounds, z_array, cases, p_initial, 
+                              max_workers=2, **kw))
+
+  assert sorted(p_sweep) == [0, 1, 2]
+  for k, case in enumerate(cases):
+    reservoir_input_ = dict(reservoir_input, **case.get('reservoir_input', {}))
+    wells_ = dict(wells, **case.get('wells', {}))
+    p_sol = run_simulation_2d(reservoir_input_, wells_, *bounds, z_array, p_initial, **kw)
+    np.testing.assert_array_equal(p_sweep[k], p_sol)
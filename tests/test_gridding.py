@@ -0,0 +1,52 @@
+"""
+Tests of the map of active blocks of irregular reservoirs
+"""
+import numpy as np
+import pytest
+
+from boundary import boundary2d_location, boundary2d_irreg
+from gridding import create_irregular_grid, maskout_inactive_blocks, fill_active_blocks, \
+                     active_cell_map, scatter_active_blocks
+from solver import fill2d_lhs_mat, lhs_mat2d_sparse, solve_pressure_irregular2d
+
+def irregular_grid(xi=7, yi=5, xy_inactive=[(1,1), (7,5), (7,4), (6,5), (4,3)]):
+  x, y = np.meshgrid(np.arange(1., xi + 1), np.arange(1., yi + 1), indexing='ij')
+  bound_loc = boundary2d_location(x, y, xi, yi)
+  x, y, x_inactive, y_inactive = create_irregular_grid(x, y, xy_inactive)
+  bound_loc = boundary2d_irreg(maskout_inactive_blocks(bound_loc.T, x_inactive, y_inactive, xi), xi, yi)
+  return x, bound_loc
+
+def test_scatter_is_fill():
+  x, bound_loc = irregular_grid()
+  actnum, active_index, block_active = active_cell_map(x)
+
+  assert actnum.sum() == len(block_active) == 30
+  np.testing.assert_array_equal(active_index.reshape(-1, order='F')[block_active], np.arange(30))
+  values = np.arange(30.) + 1
+  np.testing.assert_array_equal(scatter_active_blocks(values, block_active, 7, 5), fill_active_blocks(values, x))
+
+def test_compressed_lhs_is_dense():
+  # LHS matrix of the ACTIVE BLOCKS against the dense matrix of the notebooks, filled block by block
+  x, bound_loc = irregular_grid()
+  xi, yi = x.shape
+  actnum, active_index, block_active = active_cell_map(x)
+
+  rng = np.random.default_rng(0)
+  px_min, px_plus, py_min, py_plus = [rng.uniform(1., 10., (xi, yi)) for _ in range(4)]
+  p = -(px_min + px_plus + py_min + py_plus + 1)
+
+  lhs_mat = np.zeros((xi * yi, xi * yi))
+  for j in range(yi):
+    for i in range(xi):
+      if actnum[i,j] == 1:
+        fill2d_lhs_mat(bound_loc[i,j], i + j * xi + 1, xi, lhs_mat, px_min[i,j], px_plus[i,j], 
+                       py_min[i,j], py_plus[i,j], p[i,j])
+  lhs_active = lhs_mat2d_sparse(bound_loc, px_min, px_plus, py_min, py_plus, p, active_index=active_index)
+
+  assert lhs_active.shape == (30, 30)
+  np.testing.assert_array_equal(lhs_active.toarray(), lhs_mat[np.ix_(block_active, block_active)])
+
+  rhs_mat = rng.uniform(-1e4, 1e4, (xi * yi, 1)) * actnum.reshape(-1, 1, order='F')
+  p_dense = solve_pressure_irregular2d(lhs_mat, rhs_mat, x)
+  p_active = solve_pressure_irregular2d(lhs_active, rhs_mat[block_active], x, block_active=block_active)
+  np.testing.assert_allclose(p_active, p_dense, rtol=1e-12)
@@ -0,0 +1,59 @@
+"""
+Tests of the stencil kernels (NumPy and Numba backends) against the per-block 
+functions
+"""
+from importlib.util import find_spec
+
+import numpy as np
+import pytest
+
+from kernels import stencil_transmissibility2d, stencil_transmissibility_radial, \
+                    stencil_potential2d, accumulation_term
+from transmissibility import transmissibility2d
+from potential import potential_term2d
+from cylindrical import trans_r_min, trans_r_plus
+
+backends = ['numpy', pytest.param('numba', marks=pytest.mark.skipif(find_spec('numba') is None, 
+                                                                    reason='Numba is not installed'))]
+
+@pytest.mark.parametrize('backend', backends)
+def test_kernels_are_per_block(backend):
+  xi, yi = 9, 7
+  rng = np.random.default_rng(0)
+  dx, dy, dz, kx, ky = [rng.uniform(10., 100., (xi, yi)) for _ in range(5)]
+  poro, mu, B = rng.uniform(.1, .3, (xi, yi)), 1.5, 1.2
+  z_array = rng.uniform(3000., 3100., (xi, yi))
+  sides = np.zeros((xi, yi, 4), dtype=bool)
+  sides[0,:,0], sides[-1,:,1], sides[:,0,2], sides[:,-1,3] = True, True, True, True
+
+  T_array = np.zeros((xi, yi, 4))
+  potential = np.zeros((xi, yi))
+  for i in range(xi):
+    for j in range(yi):
+      T_array[i,j] = transmissibility2d(dx[i,j], dy[i,j], dz[i,j], kx[i,j], ky[i,j], mu, B)
+  for i in range(xi):
+    for j in range(yi):
+      # the block itself at the boundary sides (no elevation)
+      potential[i,j] = potential_term2d(50., T_array[i,j], z_array[max(i-1,0),j], z_array[min(i+1,xi-1),j], 
+                                        z_array[i,max(j-1,0)], z_array[i,min(j+1,yi-1)], z_array[i,j])
+
+  np.testing.assert_allclose(stencil_transmissibility2d((xi, yi), dx, dy, dz, kx, ky, mu, B, backend=backend), 
+                             T_array, rtol=1e-14)
+  np.testing.assert_allclose(stencil_potential2d(50., T_array, z_array, sides, backend=backend), 
+                             potential, rtol=1e-12, atol=1e-12)
+  np.testing.assert_allclose(accumulation_term(dx * dy * dz, poro, 1e-5, B, 3., backend=backend), 
+                             (dx * dy * dz * poro * 1e-5) / (5.614583 * B * 3.), rtol=1e-14)
+
+@pytest.mark.parametrize('backend', backends)
+def test_radial_kernel_is_per_ring(backend):
+  nr, alpha_tg = 20, 1.43
+  rng = np.random.default_rng(1)
+  dz, kh = np.full(nr, 5.), rng.uniform(10., 100., nr)
+  mu, B = rng.uniform(1., 2., nr), rng.uniform(1., 1.5, nr)
+
+  T_min, T_plus = stencil_transmissibility_radial(dz, kh, mu, B, alpha_tg, backend=backend)
+  prev, next = np.r_[0, :nr-1], np.r_[1:nr, nr-1]
+  np.testing.assert_allclose(T_min, [trans_r_min(dz[i], dz[prev[i]], 2*np.pi, alpha_tg, kh[i], kh[prev[i]], mu[i], B[i]) 
+                                     for i in range(nr)], rtol=1e-14)
+  np.testing.assert_allclose(T_plus, [trans_r_plus(dz[i], dz[next[i]], 2*np.pi, alpha_tg, kh[i], kh[next[i]], mu[i], B[i]) 
+                                      for i in range(nr)], rtol=1e-14)
@@ -0,0 +1,39 @@
+"""
+Tests of the model cache, against the model read and set up again
+"""
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from input_output import read_input
+from simulators import load_model_2d, run_simulation_2d
+
+deck = os.path.join(os.path.dirname(__file__), '..', 'input', 'basic', 'irregular2d_slicomp.txt')
+
+def run(data, z_array, p_initial, **kw):
+  reservoir_input = dict(data[0], cpore=data[0]['cpore'] * 1e-6, cfluid=data[0]['cfluid'] * 1e-6)
+  return run_simulation_2d(reservoir_input, *data[1:], z_array, p_initial, timestep=5, schedule=3, 
+                           xy_inactive=[(1,1), (1,6), (12,9)], **kw)
+
+def test_cached_model_is_the_model(tmp_path):
+  filepath = str(tmp_path / 'input.txt')
+  shutil.copy(deck, filepath)
+  cache_dir = str(tmp_path / 'cache')
+  z_array = np.add.outer(np.linspace(9000., 9300., 12), np.zeros(9))
+  p_initial = np.full((12, 9), 4000.)
+  xy_inactive = [(1,1), (1,6), (12,9)]
+
+  model = load_model_2d(filepath, z_array, p_initial, xy_inactive, cache_dir=cache_dir)
+  cached = load_model_2d(filepath, z_array, p_initial, xy_inactive, cache_dir=cache_dir)
+  assert (model['cached'], cached['cached']) == (False, True)
+
+  p_sol = run(read_input(filepath), z_array, p_initial)
+  np.testing.assert_array_equal(run(cached['input'], z_array, p_initial, sim=cached['sim']), p_sol)
+
+  # another initial pressure, or another input file, is set up again
+  assert not load_model_2d(filepath, z_array, p_initial + 1, xy_inactive, cache_dir=cache_dir)['cached']
+  with open(filepath, 'a') as f:
+    f.write('\n')
+  assert not load_model_2d(filepath, z_array, p_initial, xy_inactive, cache_dir=cache_dir)['cached']
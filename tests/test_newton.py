@@ -0,0 +1,83 @@
+"""
+Tests of the Newton-Raphson solver of the compressible simulation (gas)
+"""
+import numpy as np
+import pytest
+
+from boundary import boundary2d_location, boundary2d_grid
+from gridding import active_cell_map
+from wellblock import well_table
+import solver
+from solver import newton_model2d, newton_system2d, solve_pressure_newton2d
+from pvt_correlation import gas_pvt_table
+
+@pytest.fixture(scope='module')
+def gas_model():
+  xi, yi = 6, 5
+  reservoir_input = {'xi': xi, 'yi': yi, 'dx': 300., 'dy': 350., 'dz': 40., 
+                     'kx': 20., 'ky': 15., 'poro': .18, 'rho': 10., 
+                     'cpore': 1e-6, 'mu': .02, 'B': .001, 'cfluid': 1e-4}
+  wells = {'well_name': np.array(['A', 'B']), 'well_loc': [[2, 2], [5, 4]], 
+           'well_rw': np.array([3.5, 3.5]), 'well_skin': np.array([0., 0.]), 
+           'well_condition': np.array(['constant_fbhp', 'constant_rate']), 
+           'well_value': np.array([1500., -2e5]), 'well_config': np.array([0., 0.])}
+  west = {'type': 'constant_pressure', 'value': 3000., 'loc': 'all'}
+  north = {'type': 'constant_pressuregrad', 'value': .1, 'loc': 'all'}
+  no_flow = {'type': 'no_flow', 'value': 0., 'loc': 'all'}
+
+  x, y = np.meshgrid(np.arange(1, xi + 1), np.arange(1, yi + 1), indexing='ij')
+  x, y = x.astype('float64'), y.astype('float64')
+  bound_loc = boundary2d_location(x, y, xi, yi)
+  _, active_index, _ = active_cell_map(x)
+  boundary_grid = boundary2d_grid(bound_loc, west, no_flow, no_flow, north)
+  z_array = np.add.outer(np.linspace(5000, 5100, xi), np.linspace(0, 30, yi))
+
+  model = newton_model2d(bound_loc, active_index, boundary_grid, well_table(wells, reservoir_input), 
+                         z_array, reservoir_input, timestep=2, p_ref=3000.)
+  return model, gas_pvt_table(180, .7)
+
+def residual(p, p_old, model, pvt):
+  return np.linalg.norm(newton_system2d(p, p_old, model, pvt)[0], np.inf)
+
+def test_converged_residual(gas_model):
+  model, pvt = gas_model
+  p_old = np.full(model['n'], 3000.)
+  report = []
+  p = solve_pressure_newton2d(p_old, model, pvt, tol=1e-8, report=report)
+
+  norm0 = residual(p_old, p_old, model, pvt)
+  assert report[-1]['converged']
+  assert residual(p, p_old, model, pvt) <= 1e-8 * norm0
+  assert residual(p, p_old, model, pvt) / norm0 == pytest.approx(report[-1]['residual'])
+
+@pytest.mark.parametrize('maxiter', [3, 50])
+def test_reported_residual_is_of_returned_pressure(gas_model, maxiter):
+  # a tolerance below the round-off, the line search stalls or the iterations 
+  # run out, and the reported residual is still the residual of the returned p
+  model, pvt = gas_model
+  p_old = np.full(model['n'], 3000.)
+  report = []
+  p = solve_pressure_newton2d(p_old, model, pvt, tol=1e-30, maxiter=maxiter, report=report)
+
+  norm0 = residual(p_old, p_old, model, pvt)
+  assert not report[-1]['converged']
+  assert residual(p, p_old, model, pvt) / norm0 == pytest.approx(report[-1]['residual'], rel=1e-12)
+
+def test_failed_line_search(gas_model, monkeypatch):
+  # a Jacobian of the wrong sign, no trial of the line search decreases the 
+  # residual. The iterations stop without convergence at the last accepted p
+  model, pvt = gas_model
+  p_old = np.full(model['n'], 3000.)
+  p_guess = p_old - 50.
+
+  def ascent_system(p, p_old, model, pvt):
+    R, J = newton_system2d(p, p_old, model, pvt)
+    return R, -J
+  monkeypatch.setattr(solver, 'newton_system2d', ascent_system)
+
+  report = []
+  p = solve_pressure_newton2d(p_old, model, pvt, p_guess=p_guess, report=report)
+
+  assert not report[-1]['converged']
+  np.testing.assert_array_equal(p, p_guess)
+  assert report[-1]['residual'] == 1.
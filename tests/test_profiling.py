@@ -0,0 +1,43 @@
+"""
+Tests of the profile of the phases of the 2D simulation
+"""
+import json
+
+import numpy as np
+import pytest
+
+from profiling import profile_phase, profile_summary, profile_chrome_trace
+from simulators import run_simulation_2d
+
+def reservoir():
+  reservoir_input = {'xi': 6, 'yi': 4, 'dx': 300., 'dy': 250., 'dz': 40., 'kx': 150., 'ky': 100., 
+                     'poro': .2, 'rho': 50., 'cpore': 1e-6, 'mu': 3.5, 'B': 1., 'cfluid': 1e-5}
+  wells = {'well_name': np.array(['A']), 'well_loc': [[2, 2]], 'well_rw': np.array([3.]), 
+           'well_skin': np.array([0.]), 'well_condition': np.array(['constant_rate']), 
+           'well_value': np.array([-400.]), 'well_config': np.array([0.])}
+  bounds = [{'type': 'constant_pressure', 'value': 3000., 'loc': 'all'}] + \
+           [{'type': 'no_flow', 'value': 0., 'loc': 'all'}] * 3
+  return reservoir_input, wells, bounds
+
+@pytest.mark.parametrize('method', ['direct', 'cg'])
+def test_profile_is_the_run(tmp_path, method):
+  reservoir_input, wells, bounds = reservoir()
+  kw = dict(p_initial=np.full((6, 4), 3200.), timestep=2, schedule=5, linear_solver={'method': method})
+  z_array = np.full((6, 4), 3000.)
+
+  profile = []
+  with profile_phase(profile, 'run'):
+    p_profiled = run_simulation_2d(reservoir_input, wells, *bounds, z_array, profile=profile, **kw)
+  p_sol = run_simulation_2d(reservoir_input, wells, *bounds, z_array, **kw)
+  np.testing.assert_array_equal(p_profiled, p_sol)
+
+  summary = profile_summary(profile)
+  assert summary['setup']['count'] == summary['run']['count'] == 1
+  assert summary['solve']['count'] == 5
+  assert summary['run']['total'] >= summary['solve']['total']
+  if method == 'cg':
+    assert summary['solve']['iterations'] > 0
+
+  trace = profile_chrome_trace(profile, str(tmp_path / 'trace.json'))
+  assert len(trace['traceEvents']) == len(profile)
+  assert json.load(open(tmp_path / 'trace.json')) == trace
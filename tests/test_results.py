@@ -0,0 +1,42 @@
+"""
+Tests of the on-disk results store, against the pressure and well rates 
+kept in memory
+"""
+import numpy as np
+import pytest
+
+from input_output import results_open, results_pressure, results_well
+from simulators import run_simulation_2d, simulate_2d_steps, write_simulation_2d
+
+def reservoir():
+  reservoir_input = {'xi': 6, 'yi': 4, 'dx': 300., 'dy': 250., 'dz': 40., 'kx': 150., 'ky': 100., 
+                     'poro': .2, 'rho': 50., 'cpore': 1e-6, 'mu': 3.5, 'B': 1., 'cfluid': 1e-5}
+  wells = {'well_name': np.array(['A', 'B']), 'well_loc': [[2, 2], [5, 3]], 
+           'well_rw': np.array([3., 3.]), 'well_skin': np.array([0., 0.]), 
+           'well_condition': np.array(['constant_rate', 'constant_fbhp']), 
+           'well_value': np.array([-400., 2500.]), 'well_config': np.array([0., 0.])}
+  bounds = [{'type': 'constant_pressure', 'value': 3000., 'loc': 'all'}] + \
+           [{'type': 'no_flow', 'value': 0., 'loc': 'all'}] * 3
+  return reservoir_input, wells, bounds
+
+@pytest.mark.parametrize('chunk', [4, 64])
+def test_store_is_the_run(tmp_path, chunk):
+  reservoir_input, wells, bounds = reservoir()
+  kw = dict(p_initial=np.full((6, 4), 3200.), timestep=2, schedule=10, xy_inactive=[(6, 4)])
+  z_array = np.full((6, 4), 3000.)
+
+  results = write_simulation_2d(str(tmp_path), reservoir_input, wells, *bounds, z_array, chunk=chunk, **kw)
+  p_sol = run_simulation_2d(reservoir_input, wells, *bounds, z_array, **kw)
+  steps = list(simulate_2d_steps(reservoir_input, wells, *bounds, z_array, **kw))
+
+  assert results['n'] == 11 and results['wells'] == ['A', 'B']
+  np.testing.assert_array_equal(results['time'], np.arange(0., 21., 2.))
+  for k in range(11):
+    np.testing.assert_array_equal(results_pressure(results, k), p_sol[k])
+  # the timestep at or just before the time
+  np.testing.assert_array_equal(results_pressure(results, t=13.), p_sol[6])
+
+  results = results_open(str(tmp_path))
+  for column, i in (('rate', 2), ('fbhp', 3)):
+    t, value = results_well(results, 'A', column)
+    np.testing.assert_array_equal(value, [step[i][0] for step in steps])
@@ -0,0 +1,77 @@
+"""
+Tests of the 2D RHS constants: the per-block RHS of the notebooks 
+('rhs_constant2d_welltype'), the whole-grid RHS of the simulators 
+('rhs_constant2d_grid'), and its constant part assembled once
+"""
+import numpy as np
+import pytest
+from scipy.sparse.linalg import spsolve
+
+from simulators import setup_simulation_2d, run_simulation_2d
+from solver import rhs_constant2d_welltype, rhs_constant2d_grid, lhs_coeffs2d_grid, lhs_mat2d_sparse
+from gridding import scatter_active_blocks
+from wellblock import well_table
+
+grid = dict(dx=200., dy=250., dz=40., kx=150., ky=100., mu=3.5, B=1.)
+no_well = {'condition': np.nan, 'value': np.nan, 'rw': np.nan, 'Gw': np.nan}
+
+def test_per_block_rhs_subtracts_potential():
+  # the convention of the notebooks is kept: RHS = -(boundary + well + potential), 
+  # and the potential is in the flow of constant pressure gradient boundaries
+  interior = {'loc': None, 'type': None, 'value': None, 'T': None}
+  assert rhs_constant2d_welltype(interior, no_well, 12., **grid, solver='incompressible') == -12.
+
+  east = {'loc': np.array([2]), 'type': np.array(['constant_pressuregrad']), 
+          'value': np.array([.5]), 'T': [0.]}
+  T_grad = .001127 * 150. * 250. * 40. / 3.5
+  rhs = rhs_constant2d_welltype(east, no_well, 12., **grid, solver='incompressible')
+  np.testing.assert_allclose(rhs, -(T_grad * (.5 - 12.) + 12.))
+
+def test_grid_rhs_adds_potential():
+  # the simulators take the depth positive downward, the potential is added, 
+  # and a zero gradient boundary is no flow whatever the potential
+  xi, yi = 4, 3
+  bound_type = np.full((xi, yi, 4), '', dtype='<U21')
+  bound_type[-1,:,1] = 'constant_pressuregrad'
+  boundary_grid = {'type': bound_type, 'value': np.zeros((xi, yi, 4)), 'T': np.zeros((xi, yi, 4))}
+  wells = {'well_name': np.array(['A']), 'well_loc': [[2, 2]], 'well_rw': np.array([3.5]), 
+           'well_skin': np.array([0.]), 'well_condition': np.array(['shutin']), 
+           'well_value': np.array([0.]), 'well_config': np.array([0.])}
+  well_tab = well_table(wells, dict(grid, xi=xi, yi=yi))
+  potential = np.arange(xi * yi, dtype='float64').reshape((xi, yi))
+
+  rhs = rhs_constant2d_grid(boundary_grid, well_tab, potential, **grid, solver='incompressible')
+  np.testing.assert_allclose(rhs, potential)
+
+def test_constant_rhs_is_rhs_of_each_step():
+  # the whole RHS (boundaries, wells, potential, and accumulation) assembled 
+  # at each timestep, as before the constant part was assembled once
+  xi, yi = 6, 5
+  rng = np.random.default_rng(0)
+  reservoir_input = dict(grid, xi=xi, yi=yi, poro=rng.uniform(.1, .3, (xi, yi)), rho=50., 
+                         cpore=1e-6, cfluid=1e-5)
+  wells = {'well_name': np.array(['A', 'B']), 'well_loc': [[2, 2], [5, 4]], 'well_rw': np.array([3., 3.]), 
+           'well_skin': np.array([0., 0.]), 'well_condition': np.array(['constant_rate', 'constant_fbhp']), 
+           'well_value': np.array([-400., 2500.]), 'well_config': np.array([0., 0.])}
+  bounds = [{'type': 'constant_pressure', 'value': 3000., 'loc': 'all'}, 
+            {'type': 'constant_pressuregrad', 'value': -.1, 'loc': 'all'}, 
+            {'type': 'constant_rate', 'value': -50., 'loc': 'all'}, 
+            {'type': 'no_flow', 'value': 0., 'loc': 'all'}]
+  z_array = 3000. + 15. * np.arange(xi)[:,np.newaxis] + 5. * np.arange(yi)
+  p_initial, xy_inactive = np.full((xi, yi), 3200.), [(6, 5), (1, 5)]
+
+  p_sol = run_simulation_2d(reservoir_input, wells, *bounds, z_array, p_initial, timestep=5, schedule=4, 
+                            xy_inactive=xy_inactive)
+
+  sim = setup_simulation_2d(reservoir_input, wells, *bounds, z_array, p_initial, xy_inactive)
+  coeffs = lhs_coeffs2d_grid(sim['bound_loc'], sim['well_table'], sim['T_array'], grid['mu'], grid['B'], 
+                             'slicomp', reservoir_input, timestep=5)
+  lhs_mat = lhs_mat2d_sparse(sim['bound_loc'], *coeffs, active_index=sim['active_index'])
+  p_step = [sim['p_initial']]
+  for t in range(4):
+    rhs = rhs_constant2d_grid(sim['boundary_grid'], sim['well_table'], sim['potential'], **grid, solver='slicomp', 
+                              p_initial=p_step[-1], reservoir_input=reservoir_input, timestep=5)
+    p_active = spsolve(lhs_mat.tocsc(), rhs.reshape(-1, order='F')[sim['block_active']])
+    p_step.append(scatter_active_blocks(p_active, sim['block_active'], xi, yi))
+
+  np.testing.assert_allclose(p_sol, np.array(p_step), rtol=0, atol=1e-6)
@@ -0,0 +1,72 @@
+"""
+Tests of the 1D simulation in rectangular grids
+"""
+import os
+
+import numpy as np
+import pytest
+
+from input_output import read_input
+from simulators import run_simulation_1d, simulate_1d_steps
+from solver import fill1d_lhs_band, solve_tridiagonal
+
+def reservoir():
+  reservoir_input = {'xi': 6, 'dx': 300., 'dy': 350., 'dz': 40., 'kx': 270., 'poro': .27, 
+                     'rho': 50., 'cpore': 1e-6, 'mu': .5, 'B': 1., 'cfluid': 1e-5}
+  wells = {'well_name': np.array(['A', 'B']), 'well_loc': [5., 2.], 
+           'well_rw': np.array([3.5, 2.]), 'well_skin': np.array([1.5, 0.]), 
+           'well_condition': np.array(['constant_rate', 'constant_fbhp']), 
+           'well_value': np.array([-600., 2500.]), 'well_config': np.array([0., 0.])}
+  west = {'type': 'constant_pressure', 'value': 4000.}
+  east = {'type': 'no_flow', 'value': 0.}
+  z_array = np.vstack([np.arange(1, 7), 3000. + 20 * np.sin(np.arange(6))])
+  return reservoir_input, wells, west, east, z_array
+
+@pytest.mark.parametrize('solver', ['incompressible', 'slicomp'])
+def test_steps_are_the_run(solver):
+  args = reservoir()
+  p_sol = run_simulation_1d(*args, np.full(6, 3000.), timestep=2, schedule=4, solver=solver)
+
+  steps = list(simulate_1d_steps(*args, np.full(6, 3000.), timestep=2, schedule=4, solver=solver))
+  if solver == 'incompressible':
+    assert [t for t, p, q, fbhp in steps] == [0]
+    np.testing.assert_array_equal(steps[0][1], p_sol)
+  else:
+    assert [t for t, p, q, fbhp in steps] == [0, 2, 4, 6, 8]
+    np.testing.assert_array_equal(np.array([p for t, p, q, fbhp in steps]), p_sol[:,0])
+
+  # the constant rate well produces its rate, the constant FBHP well keeps its FBHP
+  t, p, q_well, fbhp_well = steps[-1]
+  np.testing.assert_allclose(q_well[0], -600.)
+  np.testing.assert_allclose(fbhp_well[1], 2500.)
+
+def test_tridiagonal_is_dense():
+  # the diagonals against the dense LHS matrix of the notebooks, filled block by block
+  xi = 30
+  rng = np.random.default_rng(0)
+  p_plus, p_min = rng.uniform(1., 10., xi), rng.uniform(1., 10., xi)
+  p = -(p_plus + p_min + rng.uniform(0., 1., xi))
+  rhs_mat = rng.uniform(-1e4, 1e4, (xi, 1))
+
+  lhs_mat, lhs_band = np.zeros((xi, xi)), np.zeros((3, xi))
+  for i in range(xi):
+    bound_loc = 'west' if i == 0 else 'east' if i == xi - 1 else None
+    lhs_mat[i, i] = p[i]
+    if bound_loc != 'east':
+      lhs_mat[i, i + 1] = p_plus[i]
+    if bound_loc != 'west':
+      lhs_mat[i, i - 1] = p_min[i]
+    fill1d_lhs_band(bound_loc, i + 1, lhs_band, p_plus[i], p_min[i], p[i])
+
+  p_sol = solve_tridiagonal(lhs_band, rhs_mat)
+  np.testing.assert_allclose(p_sol, np.linalg.solve(lhs_mat, rhs_mat)[:,0], rtol=1e-12)
+
+def test_benchmark_incompressible():
+  # pressure of 'benchmark1d_incomp.txt', as solved by the notebook 'PyReSim_benchmark1d.ipynb'
+  filepath = os.path.join(os.path.dirname(__file__), '..', 'input', 'benchmarks', 'benchmark1d_incomp.txt')
+  reservoir_input, wells, west, east = read_input(filepath)
+  z_array = np.vstack([np.arange(1, 5), np.full(4, 3000.)])
+
+  p_sol = run_simulation_1d(reservoir_input, wells, west, east, z_array, solver='incompressible')
+  np.testing.assert_allclose(np.squeeze(p_sol), [3989.4367685, 3968.31030549, 3947.18384248, 3926.05737947], 
+                             rtol=0, atol=1e-6)
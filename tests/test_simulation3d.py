@@ -0,0 +1,107 @@
+"""
+Tests of the 3D simulation, against the boundaries and the 2D simulation
+"""
+import numpy as np
+import pytest
+
+from simulators import run_simulation_2d, run_simulation_3d, setup_simulation_3d
+
+def reservoir(zi=4):
+  reservoir_input = {'xi': 8, 'yi': 6, 'zi': zi, 'dx': 200., 'dy': 250., 'dz': 40., 
+                     'kx': 150., 'ky': 100., 'kz': 15., 'poro': .2, 'rho': 50., 
+                     'cpore': 1e-6, 'mu': 3.5, 'B': 1., 'cfluid': 1e-5}
+  wells = {'well_name': np.array(['A', 'B']), 'well_loc': [[2, 2], [6, 4]], 
+           'well_rw': np.array([3.5, 3.5]), 'well_skin': np.array([0., 0.]), 
+           'well_condition': np.array(['constant_rate', 'constant_fbhp']), 
+           'well_value': np.array([-300., 2500.]), 'well_config': np.array([0., 0.])}
+  return reservoir_input, wells
+
+def boundary(type, value=0.):
+  return {'type': type, 'value': value, 'loc': 'all'}
+
+def test_zero_pressuregrad_is_no_flow():
+  reservoir_input, wells = reservoir(zi=4)
+  z_array = np.full((8, 6), 3000.)
+  west = boundary('constant_pressure', 3000.)
+  no_flow = boundary('no_flow')
+  kw = dict(p_initial=3000., timestep=5, schedule=3, linear_solver={'method': 'direct'})
+
+  p_no_flow = run_simulation_3d(reservoir_input, wells, west, no_flow, no_flow, no_flow, 
+                                z_array, **kw)
+  p_grad = run_simulation_3d(reservoir_input, wells, west, no_flow, no_flow, 
+                             boundary('constant_pressuregrad', 0.), z_array, **kw)
+
+  np.testing.assert_allclose(p_grad, p_no_flow, rtol=0, atol=1e-6)
+
+@pytest.mark.parametrize('p_initial', [None, 3000., np.full((8, 6), 3000.)])
+def test_incompressible_initial_guess(p_initial):
+  reservoir_input, wells = reservoir(zi=3)
+  z_array = np.full((8, 6), 3000.)
+  bounds = [boundary('constant_pressure', 3000.), boundary('no_flow'), 
+            boundary('no_flow'), boundary('no_flow')]
+
+  p_direct = run_simulation_3d(reservoir_input, wells, *bounds, z_array, 
+                               solver='incompressible', linear_solver={'method': 'direct'})
+  p_cg = run_simulation_3d(reservoir_input, wells, *bounds, z_array, p_initial, 
+                           solver='incompressible', 
+                           linear_solver={'method': 'cg', 'preconditioner': 'ilu', 'tol': 1e-12})
+
+  assert p_cg.shape == (8, 6, 3)
+  np.testing.assert_allclose(p_cg, p_direct, rtol=0, atol=1e-6)
+
+def tilted_depth():
+  # depth positive downward, deeper to the east, with a bump
+  x, y = np.meshgrid(np.arange(8), np.arange(6), indexing='ij')
+  return 3000. + 40. * x + 15. * y + 30. * np.sin(x * y)
+
+@pytest.mark.parametrize('tilted', [False, True])
+def test_one_layer_is_2d(tilted):
+  reservoir_input, wells = reservoir(zi=1)
+  z_array = tilted_depth() if tilted else np.full((8, 6), 3000.)
+  p_initial = np.full((8, 6), 3200.)
+  bounds = [boundary('constant_pressure', 3000.), boundary('no_flow'), 
+            boundary('constant_pressuregrad', -.2), boundary('constant_rate', -100.)]
+
+  p_2d = run_simulation_2d(reservoir_input, wells, *bounds, z_array, p_initial, 
+                           timestep=5, schedule=3)
+  p_3d = run_simulation_3d(reservoir_input, wells, *bounds, z_array, p_initial, 
+                           timestep=5, schedule=3, linear_solver={'method': 'direct'})
+
+  np.testing.assert_allclose(p_3d[...,0], p_2d, rtol=0, atol=1e-6)
+
+def test_hydrostatic_2d():
+  # no wells and no flow boundaries, the hydrostatic pressure (depth positive 
+  # downward) is at equilibrium
+  reservoir_input, wells = reservoir(zi=1)
+  wells['well_condition'] = np.array(['shutin', 'shutin'])
+  z_array = tilted_depth()
+  gamma = .21584E-3 * reservoir_input['rho'] * 32.174
+  p_initial = 3000. + gamma * (z_array - 3000.)
+  no_flow = boundary('no_flow')
+
+  p_sol = run_simulation_2d(reservoir_input, wells, no_flow, no_flow, no_flow, no_flow, 
+                            z_array, p_initial, timestep=5, schedule=3)
+
+  np.testing.assert_allclose(p_sol[-1], p_initial, rtol=0, atol=1e-6)
+
+def test_layer_depth_nonuniform_dz():
+  # layers of 20, 50, and 30 ft, the centers are 0, 35, and 75 ft below the 
+  # center of the top layer
+  reservoir_input, wells = reservoir(zi=3)
+  reservoir_input['dz'] = np.broadcast_to([20., 50., 30.], (8, 6, 3)).copy()
+  wells['well_condition'] = np.array(['shutin', 'shutin'])
+  no_flow = boundary('no_flow')
+
+  sim = setup_simulation_3d(reservoir_input, wells, no_flow, no_flow, no_flow, no_flow, 
+                            tilted_depth())
+  np.testing.assert_allclose(sim['z_array'] - tilted_depth()[:,:,np.newaxis], 
+                             np.broadcast_to([0., 35., 75.], (8, 6, 3)))
+
+  # the hydrostatic pressure of the layer centers is at equilibrium
+  gamma = .21584E-3 * reservoir_input['rho'] * 32.174
+  p_initial = 3000. + gamma * (sim['z_array'] - 3000.)
+  p_sol = run_simulation_3d(reservoir_input, wells, no_flow, no_flow, no_flow, no_flow, 
+                            tilted_depth(), p_initial, timestep=5, schedule=3, 
+                            linear_solver={'method': 'direct'})
+
+  np.testing.assert_allclose(p_sol[-1], p_initial, rtol=0, atol=1e-6)
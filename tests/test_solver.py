@@ -0,0 +1,76 @@
+"""
+Tests of the cache of the LHS factorization and preconditioner
+"""
+import numpy as np
+import scipy.sparse as sp
+import pytest
+
+from solver import factorize_lhs, solve_pressure_iterative2d
+
+def lhs(n, diag):
+  # negative definite, as the LHS matrix of the simulators
+  return sp.diags([np.ones(n - 1), -diag * np.ones(n), np.ones(n - 1)], 
+                  [-1, 0, 1], format='csr')
+
+def test_changed_matrix_is_refactorized():
+  cache, n = {}, 20
+  rhs = np.ones(n)
+  first = factorize_lhs(lhs(n, 4.), cache, key=(n, 1.))
+  assert factorize_lhs(lhs(n, 4.), cache, key=(n, 1.)) is first
+
+  # new matrix values under the same key
+  lu = factorize_lhs(lhs(n, 3.), cache, key=(n, 1.))
+  assert lu is not first and len(cache) == 1
+  np.testing.assert_allclose(lu['lu'].solve(rhs), 
+                             np.linalg.solve(lhs(n, 3.).toarray(), rhs))
+
+@pytest.mark.parametrize('preconditioner', ['ilu', 'jacobi'])
+def test_changed_matrix_rebuilds_preconditioner(preconditioner):
+  cache, n = {}, 20
+  rhs = np.ones(n)
+  for diag in (4., 3.):
+    p = solve_pressure_iterative2d(lhs(n, diag), rhs, np.ones((n, 1)), cache=cache, key=(n, 1.), 
+                                   preconditioner=preconditioner, tol=1e-12)
+    np.testing.assert_allclose(p.ravel(), np.linalg.solve(lhs(n, diag).toarray(), rhs), 
+                               rtol=1e-8)
+
+def test_cache_is_bounded():
+  # an adaptive run adds a factorization or preconditioner for each timestep size
+  cache, n = {}, 20
+  rhs = np.ones(n)
+  for dt in [1., 2., 4., .5, 8., 16.]:
+    factorize_lhs(lhs(n, 2. + dt), cache, key=(n, dt), cache_size=3)
+    solve_pressure_iterative2d(lhs(n, 2. + dt), rhs, np.ones((n, 1)), cache=cache, 
+                               key=(n, dt), cache_size=3)
+    assert len(cache) <= 3
+
+  # the newest entries are kept
+  assert list(cache) == [(n, 8.), ((n, 8.), 'ilu'), (n, 16.), ((n, 16.), 'ilu')][-3:]
+
+@pytest.mark.parametrize('method', ['direct', 'cg'])
+def test_fingerprint_once_per_assembly(monkeypatch, method):
+  # the LHS matrix is hashed when it is assembled, not at each timestep
+  import solver
+  from simulators import run_simulation_2d, run_simulation_3d
+
+  calls = []
+  fingerprint = solver.lhs_fingerprint
+  monkeypatch.setattr(solver, 'lhs_fingerprint', lambda mat: calls.append(1) or fingerprint(mat))
+
+  reservoir_input = {'xi': 6, 'yi': 5, 'zi': 2, 'dx': 200., 'dy': 250., 'dz': 40., 
+                     'kx': 150., 'ky': 100., 'kz': 15., 'poro': .2, 'rho': 50., 
+                     'cpore': 1e-6, 'mu': 3.5, 'B': 1., 'cfluid': 1e-5}
+  wells = {'well_name': np.array(['A']), 'well_loc': [[2, 2]], 'well_rw': np.array([3.5]), 
+           'well_skin': np.array([0.]), 'well_condition': np.array(['constant_rate']), 
+           'well_value': np.array([-300.]), 'well_config': np.array([0.])}
+  bounds = [{'type': 'constant_pressure', 'value': 3000., 'loc': 'all'}] + \
+           [{'type': 'no_flow', 'value': 0., 'loc': 'all'}] * 3
+
+  z_array, p_initial = np.full((6, 5), 3000.), np.full((6, 5), 3000.)
+
+  for run in (run_simulation_2d, run_simulation_3d):
+    calls.clear()
+    profile = []
+    run(reservoir_input, wells, *bounds, z_array, p_initial, timestep=5, schedule=6, 
+        linear_solver={'method': method}, profile=profile)
+    assert len(calls) == len([e for e in profile if e['name'] == 'assemble']) == 1
@@ -0,0 +1,55 @@
+"""
+Tests of the adaptive timestep control of the 2D simulation
+"""
+import numpy as np
+import pytest
+
+from simulators import run_simulation_2d
+
+def reservoir():
+  reservoir_input = {'xi': 9, 'yi': 7, 'dx': 200., 'dy': 250., 'dz': 40., 
+                     'kx': 150., 'ky': 100., 'poro': .2, 'rho': 50., 
+                     'cpore': 1e-6, 'mu': 3.5, 'B': 1., 'cfluid': 1e-5}
+  wells = {'well_name': np.array(['A', 'B']), 'well_loc': [[2, 2], [7, 5]], 
+           'well_rw': np.array([3.5, 3.5]), 'well_skin': np.array([0., 0.]), 
+           'well_condition': np.array(['constant_rate', 'constant_fbhp']), 
+           'well_value': np.array([-800., 2000.]), 'well_config': np.array([0., 0.])}
+  bounds = [{'type': 'constant_pressure', 'value': 3000., 'loc': 'all'}] + \
+           [{'type': 'no_flow', 'value': 0., 'loc': 'all'}] * 3
+  return reservoir_input, wells, bounds, np.full((9, 7), 3000.), np.full((9, 7), 3000.)
+
+def test_fixed_size_is_fixed_timestep():
+  reservoir_input, wells, bounds, z_array, p_initial = reservoir()
+  p_fixed = run_simulation_2d(reservoir_input, wells, *bounds, z_array, p_initial, 
+                              timestep=2, schedule=4)
+  p_adaptive = run_simulation_2d(reservoir_input, wells, *bounds, z_array, p_initial, 
+                                 timestep=2, report_times=[2, 4, 6, 8], 
+                                 timestep_control={'growth': 1, 'dp_target': np.inf, 'dp_max': np.inf})
+
+  np.testing.assert_allclose(p_adaptive, p_fixed, rtol=0, atol=1e-9)
+
+@pytest.mark.parametrize('method', ['direct', 'cg'])
+def test_shortened_timesteps_are_not_cached(method):
+  # report times that are not on the timesteps dt_initial * 2^k
+  reservoir_input, wells, bounds, z_array, p_initial = reservoir()
+  profile, report = [], []
+  run_simulation_2d(reservoir_input, wells, *bounds, z_array, p_initial, timestep=1, 
+                    report_times=[3.3, 7.1, 10, 23.7, 50], linear_solver={'method': method}, 
+                    timestep_control={'dp_target': 100, 'dp_max': 400}, 
+                    profile=profile, solver_report=report)
+
+  steps = [r['dt'] for r in report if r['method'] == 'timestep']
+  regular = [dt for dt in steps if np.log2(dt) % 1 == 0]
+  shortened = [dt for dt in steps if np.log2(dt) % 1 != 0]
+  assert len(shortened) == 5
+
+  # the matrix of the regular timesteps is assembled again only when their 
+  # size changes, not after a shortened timestep
+  changes = 1 + np.count_nonzero(np.diff(regular))
+  assemble = [e['args']['dt'] for e in profile if e['name'] == 'assemble']
+  assert len(assemble) == changes + len(shortened)
+
+  # each timestep size is factorized once
+  if method == 'direct':
+    factorize = [e['args']['dt'] for e in profile if e['name'] == 'factorize']
+    assert sorted(factorize) == sorted(set(steps))
@@ -0,0 +1,64 @@
+"""
+Tests of the heterogeneous grids: the harmonic average of the inter-block 
+transmissibilities, against the homogeneous grid and the flow in series
+"""
+import numpy as np
+import pytest
+
+from simulators import run_simulation_2d
+
+def reservoir():
+  reservoir_input = {'xi': 8, 'yi': 5, 'dx': 300., 'dy': 250., 'dz': 40., 'kx': 150., 'ky': 100., 
+                     'poro': .2, 'rho': 50., 'cpore': 1e-6, 'mu': 3.5, 'B': 1.2, 'cfluid': 1e-5}
+  wells = {'well_name': np.array(['A', 'B']), 'well_loc': [[2, 2], [6, 4]], 
+           'well_rw': np.array([3., 3.]), 'well_skin': np.array([0., 0.]), 
+           'well_condition': np.array(['constant_rate', 'constant_fbhp']), 
+           'well_value': np.array([-400., 2500.]), 'well_config': np.array([0., 0.])}
+  return reservoir_input, wells
+
+def boundary(type, value=0.):
+  return {'type': type, 'value': value, 'loc': 'all'}
+
+@pytest.mark.parametrize('solver', ['slicomp', 'compressible'])
+def test_uniform_arrays_are_scalars(solver):
+  reservoir_input, wells = reservoir()
+  bounds = [boundary('constant_pressure', 3000.), boundary('no_flow'), 
+            boundary('constant_pressuregrad', -.1), boundary('constant_rate', -50.)]
+  z_array = 3000. + 10. * np.arange(8)[:,np.newaxis] + np.zeros((8, 5))
+  kw = dict(p_initial=np.full((8, 5), 3200.), timestep=2, schedule=4, solver=solver, xy_inactive=[(8, 5)])
+
+  reservoir_arrays = dict(reservoir_input)
+  for key in ('dx', 'dy', 'dz', 'kx', 'ky', 'poro', 'mu', 'B'):
+    reservoir_arrays[key] = np.full((8, 5), reservoir_input[key])
+
+  p_sol = run_simulation_2d(reservoir_input, wells, *bounds, z_array, **kw)
+  np.testing.assert_array_equal(run_simulation_2d(reservoir_arrays, wells, *bounds, z_array, **kw), p_sol)
+
+def test_compressible_takes_one_fluid():
+  reservoir_input, wells = reservoir()
+  reservoir_input['B'] = np.linspace(1.1, 1.3, 40).reshape((8, 5))
+  bounds = [boundary('constant_pressure', 3000.)] + [boundary('no_flow')] * 3
+
+  with pytest.raises(ValueError, match='PVT'):
+    run_simulation_2d(reservoir_input, wells, *bounds, np.full((8, 5), 3000.), 
+                      p_initial=np.full((8, 5), 3200.), solver='compressible')
+
+def test_flow_in_series():
+  # flow in x only, through columns of different permeability and size: the 
+  # pressure drop of each half block is its resistance times the rate
+  reservoir_input, wells = reservoir()
+  wells['well_condition'] = np.array(['shutin', 'shutin'])
+  rng = np.random.default_rng(0)
+  kx, dx = rng.uniform(10., 300., 8), rng.uniform(50., 300., 8)
+  reservoir_input['kx'], reservoir_input['dx'] = np.repeat(kx[:,np.newaxis], 5, 1), np.repeat(dx[:,np.newaxis], 5, 1)
+  reservoir_input['ky'] = rng.uniform(10., 300., (8, 5))
+  bounds = [boundary('constant_pressure', 4000.), boundary('constant_pressure', 3000.), 
+            boundary('no_flow'), boundary('no_flow')]
+
+  p_sol = run_simulation_2d(reservoir_input, wells, *bounds, np.full((8, 5), 3000.), solver='incompressible')
+
+  R_half = dx / 2 / (.001127 * kx * 250. * 40.) * 3.5 * 1.2
+  R = np.concatenate([[R_half[0]], R_half[:-1] + R_half[1:], [R_half[-1]]])
+  q = 1000. / R.sum()
+  p_series = 4000. - q * np.cumsum(R)[:-1]
+  np.testing.assert_allclose(np.squeeze(p_sol), np.repeat(p_series[:,np.newaxis], 5, 1), rtol=0, atol=1e-6)